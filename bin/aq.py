@@ -31,6 +31,7 @@ import re
 import subprocess
 import socket
 import csv
+import json
 from threading import Thread
 
 # -- begin path_setup --
@@ -538,12 +539,57 @@ if __name__ == "__main__":
             print("Error: %s: %s" % (repr(e), msg), file=sys.stderr)
         sys.exit(1)
 
+    content_type = res.getheader('content-type') or ""
+    if res.status == httplib.OK and not transport.expect and \
+       content_type.startswith('application/x-ndjson'):
+        # Streamed output - copy it as it arrives, instead of collecting the
+        # whole response first. The last line is held back, since it may be
+        # an error record sent by the broker after the output has started.
+        pending = b""
+        while True:
+            chunk = res.read(65536)
+            if not chunk:
+                break
+            data = pending + chunk
+            pos = data.rfind(b"\n", 0, len(data) - 1) + 1
+            pending = data[pos:]
+            os.write(sys.stdout.fileno(), data[:pos])
+        if status_thread:
+            status_thread.join(5)
+        error = None
+        try:
+            record = json.loads(pending.decode("utf-8"))
+            if isinstance(record, dict) and list(record) == ["aquilon_error"]:
+                error = record["aquilon_error"]
+        except ValueError:
+            pass
+        if not error:
+            os.write(sys.stdout.fileno(), pending)
+        continuation = res.getheader('x-aquilon-continuation')
+        if continuation:
+            print("Continuation token: %s" % continuation, file=sys.stderr)
+        if error:
+            status = error["code"]
+            print("%s: %s" % (httplib.responses.get(status, status),
+                              error["message"]), file=sys.stderr)
+            if status == httplib.MULTI_STATUS and \
+               globalOptions.get('partialok'):
+                sys.exit(0)
+            sys.exit(status // 100)
+        sys.exit(0)
+
     pageData = res.read()
 
     # Wait for additional status messages to arrive, but not for long
     if status_thread:
         status_thread.join(5)
 
+    # Paged search results tell how to fetch the next page. Print the token
+    # to stderr, so the output itself is not affected.
+    continuation = res.getheader('x-aquilon-continuation')
+    if continuation:
+        print("Continuation token: %s" % continuation, file=sys.stderr)
+
     if res.status != httplib.OK:
         print("%s: %s" % (httplib.responses.get(res.status, res.status),
                           pageData), file=sys.stderr)
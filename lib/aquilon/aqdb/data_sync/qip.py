@@ -16,7 +16,8 @@
 # limitations under the License.
 """ Routines to query information from QIP """
 
-import heapq
+from collections import defaultdict, namedtuple
+from operator import attrgetter
 import re
 from ipaddress import IPv4Address, IPv4Network
 from six import text_type
@@ -24,23 +25,45 @@ from six import text_type
 from aquilon.exceptions_ import PartialError
 from aquilon.aqdb.model import (NetworkEnvironment, Network, RouterAddress,
                                 ARecord, AddressAssignment, Building, Bunker,
-                                NetworkCompartment)
+                                Location, NetworkCompartment)
 from aquilon.worker.dbwrappers.dns import delete_dns_record
 from aquilon.worker.dbwrappers.network import fix_foreign_links
 from aquilon.worker.templates import Plenary, PlenaryCollection
+from aquilon.aqdb.utils.bulk_lookup import key_chunks, in_keys
 from aquilon.config import Config
 
 from sqlalchemy.orm import subqueryload
 from sqlalchemy.sql import update, and_, or_
 
 
-# Add a wrapper around heapq.heappop because handling None is simpler than
-# adding try/except blocks everywhere
-def heap_pop(heap):
-    try:
-        return heapq.heappop(heap)
-    except IndexError:
-        return None
+# Compact representation of the attributes of an existing network, which is
+# enough to decide if the network needs to be changed or not
+NetworkSummary = namedtuple("NetworkSummary",
+                            ["id", "ip", "cidr", "name", "network_type",
+                             "location_id", "side", "network_compartment_id",
+                             "routers"])
+
+
+class SortedWalker(object):
+    """
+    Iterate over a sorted list, returning None at the end
+
+    Handling None is simpler than adding try/except blocks everywhere.
+    """
+    __slots__ = ("items", "pos")
+
+    def __init__(self, items):
+        self.items = items
+        self.pos = 0
+
+    def next(self):
+        if self.pos >= len(self.items):
+            return None
+        item = self.items[self.pos]
+        # Drop the reference, so processed objects can be garbage collected
+        self.items[self.pos] = None
+        self.pos += 1
+        return item
 
 
 class QIPInfo(object):
@@ -90,17 +113,32 @@ class QIPRefresh(object):
         self.ignored_compartments = set()
         self.missing_compartments = False
 
-        # Load existing networks. We have to load all, otherwise we won't be
-        # able to fix networks with wrong location
-        q = session.query(Network)
+        # Load a summary of the existing networks, ordered by address. We have
+        # to look at all of them, otherwise we won't be able to fix networks
+        # with wrong location, but full objects are loaded only for networks
+        # which need to be changed
+        routers = defaultdict(set)
+        q = session.query(RouterAddress.network_id, RouterAddress.ip)
+        q = q.join(Network)
+        q = q.filter(Network.network_environment == self.net_env)
+        for network_id, ip in q:
+            routers[network_id].add(ip)
+
+        q = session.query(Network.id, Network.ip, Network.cidr, Network.name,
+                          Network.network_type, Network.location_id,
+                          Network.side, Network.network_compartment_id)
         q = q.filter_by(network_environment=self.net_env)
-        q = q.options(subqueryload("routers"),
-                      subqueryload('network_compartment'))
-        self.aqnetworks = {item.network_address: item for item in q}
+        q = q.order_by(Network.ip)
+        self.aqnetworks = [NetworkSummary(*row,
+                                          routers=routers.get(row[0], set()))
+                           for row in q]
 
         # Save how many networks we had initially
         self.networks_before = len(self.aqnetworks)
 
+        # Building of the locations networks are bound to
+        self.location_buildings = {}
+
         # Plenaries that need to be updated
         self.plenaries = PlenaryCollection(logger=logger)
 
@@ -115,6 +153,78 @@ class QIPRefresh(object):
         self.logger.error(msg)
         self.errors.append(msg)
 
+    def location_building(self, location_id):
+        if location_id not in self.location_buildings:
+            dblocation = self.session.query(Location).get(location_id)
+            self.location_buildings[location_id] = dblocation.building
+        return self.location_buildings[location_id]
+
+    @staticmethod
+    def is_unchanged(summary, qipinfo):
+        """ Check if an existing network matches QIP, without loading it """
+        if qipinfo.compartment:
+            compartment_id = qipinfo.compartment.id
+        else:
+            compartment_id = None
+        return (summary.cidr == qipinfo.address.prefixlen and
+                summary.name == qipinfo.name and
+                summary.network_type == qipinfo.network_type and
+                summary.location_id == qipinfo.location.id and
+                summary.side == qipinfo.side and
+                summary.network_compartment_id == compartment_id and
+                summary.routers == set(qipinfo.routers))
+
+    def match_networks(self, qipnets):
+        """
+        Walk the existing networks and the sorted QIP networks together
+
+        Returns a dict of the QIP data of networks which exist at the same
+        address but need to be changed, keyed by the network ID, the IDs of the
+        existing networks not found in QIP, and the QIP networks which do not
+        exist yet. Networks which match QIP are skipped.
+        """
+        aq_left = []
+        qip_left = []
+        changed = {}
+        aqnets = SortedWalker(self.aqnetworks)
+        qipnets = SortedWalker(qipnets)
+        aqnet = aqnets.next()
+        qipinfo = qipnets.next()
+        while aqnet or qipinfo:
+            if aqnet and qipinfo and \
+                    aqnet.ip == qipinfo.address.network_address:
+                if not self.is_unchanged(aqnet, qipinfo):
+                    changed[aqnet.id] = qipinfo
+                aqnet = aqnets.next()
+                qipinfo = qipnets.next()
+            elif aqnet and (not qipinfo or
+                            aqnet.ip < qipinfo.address.network_address):
+                # "Forget" networks not inside the requested building to
+                # prevent them being deleted
+                if not self.building or \
+                        self.location_building(aqnet.location_id) == \
+                        self.building:
+                    aq_left.append(aqnet.id)
+                aqnet = aqnets.next()
+            else:
+                qip_left.append(qipinfo)
+                qipinfo = qipnets.next()
+        self.aqnetworks = None
+
+        return changed, aq_left, qip_left
+
+    def load_networks(self, ids):
+        """ Load the full network objects with the given IDs, sorted by IP """
+        networks = []
+        for id_chunk in key_chunks(self.session, ids):
+            q = self.session.query(Network)
+            q = q.filter(in_keys(self.session, Network.id, id_chunk))
+            q = q.options(subqueryload("routers"),
+                          subqueryload('network_compartment'))
+            networks.extend(q)
+        networks.sort(key=attrgetter("ip"))
+        return networks
+
     def commit_if_needed(self):
         try:
             if self.dryrun or self.incremental:
@@ -408,33 +518,35 @@ class QIPRefresh(object):
             except ValueError as err:
                 self.error("%s; skipping line %d: %s" % (err, linecnt, line))
 
-        # Check/update network attributes that do not affect other objects. Do
-        # this in a single transaction, even in incremental mode
-        ips = list(self.aqnetworks.keys())[:]
-        for ip in ips:
-            if ip not in qipnetworks:
-                # "Forget" networks not inside the requested building to prevent
-                # them being deleted
-                if self.building and self.aqnetworks[ip].location.building != self.building:
-                    del self.aqnetworks[ip]
-                continue
-            if self.update_network(self.aqnetworks[ip], qipnetworks[ip]):
-                # If the netmask did not change, then we're done with this
-                # network
-                del self.aqnetworks[ip]
-                del qipnetworks[ip]
+        # The dump is usually sorted already, which makes this cheap
+        qipnets = sorted(qipnetworks.values())
+        del qipnetworks
+
+        # Check/update network attributes that do not affect other objects.
+        # Networks which match QIP are skipped without loading them. Do this in
+        # a single transaction, even in incremental mode
+        changed, aq_left, qip_left = self.match_networks(qipnets)
+        del qipnets
+
+        for dbnetwork in self.load_networks(list(changed.keys())):
+            qipinfo = changed[dbnetwork.id]
+            if not self.update_network(dbnetwork, qipinfo):
+                # The netmask changed, so this needs to be handled together
+                # with additions, deletions, splits and merges
+                aq_left.append(dbnetwork.id)
+                qip_left.append(qipinfo)
+        del changed
         self.commit_if_needed()
 
         # What is left after this point is additions, deletions, splits and
         # merges
 
-        aqnets = list(self.aqnetworks.values())
-        heapq.heapify(aqnets)
-        qipnets = list(qipnetworks.values())
-        heapq.heapify(qipnets)
+        aqnets = SortedWalker(self.load_networks(aq_left))
+        qipnets = SortedWalker(sorted(qip_left))
+        del aq_left, qip_left
 
-        aqnet = heap_pop(aqnets)
-        qipinfo = heap_pop(qipnets)
+        aqnet = aqnets.next()
+        qipinfo = qipnets.next()
         while aqnet or qipinfo:
             if aqnet:
                 self.plenaries.add(aqnet)
@@ -485,7 +597,7 @@ class QIPRefresh(object):
                     if keep_aqnet:
                         # The first subnet was handled above by setting
                         # aqnet.cidr
-                        qipinfo = heap_pop(qipnets)
+                        qipinfo = qipnets.next()
                     else:
                         # The first subnet was deleted
                         pass
@@ -494,12 +606,12 @@ class QIPRefresh(object):
                         # Redirect addresses from the split network to the new
                         # subnet
                         fix_foreign_links(self.session, aqnet, newnet)
-                        qipinfo = heap_pop(qipnets)
+                        qipinfo = qipnets.next()
                     if keep_aqnet:
                         self.check_split_network(aqnet)
                     else:
                         self.del_network(aqnet)
-                    aqnet = heap_pop(aqnets)
+                    aqnet = aqnets.next()
                 else:
                     # Merge:
                     #  AQ:  --++**** (smaller networks, some may be missing)
@@ -508,7 +620,7 @@ class QIPRefresh(object):
                         # The first subnet was handled above by setting
                         # aqnet.cidr
                         newnet = aqnet
-                        aqnet = heap_pop(aqnets)
+                        aqnet = aqnets.next()
                     else:
                         # The first subnet was missing from AQDB before
                         newnet = self.add_network(qipinfo)
@@ -517,17 +629,17 @@ class QIPRefresh(object):
                         # network
                         fix_foreign_links(self.session, aqnet, newnet)
                         self.del_network(aqnet)
-                        aqnet = heap_pop(aqnets)
-                    qipinfo = heap_pop(qipnets)
+                        aqnet = aqnets.next()
+                    qipinfo = qipnets.next()
             elif aqnet and (not qipinfo or aqnet.network_address <
                             qipinfo.address.network_address):
                 # Network is deleted
                 self.del_network(aqnet)
-                aqnet = heap_pop(aqnets)
+                aqnet = aqnets.next()
             else:
                 # New network
                 self.add_network(qipinfo)
-                qipinfo = heap_pop(qipnets)
+                qipinfo = qipnets.next()
 
             self.commit_if_needed()
         self.session.flush()
@@ -27,6 +27,7 @@ import struct
 from aquilon.aqdb import depends  # pylint: disable=W0611
 from aquilon.config import Config
 from aquilon.exceptions_ import AquilonError
+from aquilon.aqdb.reference_cache import reference_cache
 
 from sqlalchemy.exc import DatabaseError
 from sqlalchemy import create_engine, text, event
@@ -327,6 +328,14 @@ class DbFactory(object):
         else:
             self.NLSession = self.Session
 
+        if config.getboolean("database", "reference_cache"):
+            if config.has_value("database", "reference_cache_ttl"):
+                ttl = config.getint("database", "reference_cache_ttl")
+            else:
+                ttl = None
+            log.info("Enabling the reference data cache, TTL %s", ttl)
+            reference_cache.enable(ttl)
+
     def login(self, config, raw_dsn, pool_options):
         # Default: no password
         passwords = [""]
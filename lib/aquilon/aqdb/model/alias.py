@@ -16,12 +16,17 @@
 # limitations under the License.
 """ DNS CNAME records """
 
+from collections import defaultdict
+
 from sqlalchemy import Column, ForeignKey
-from sqlalchemy.orm import relation, backref, column_property
+from sqlalchemy.orm import relation, backref, column_property, object_session
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.sql import select, func
 
-from aquilon.aqdb.model import DnsRecord, Fqdn, DnsRecordTargetMixin
+from aquilon.exceptions_ import ArgumentError
+from aquilon.aqdb.model import (DnsRecord, Fqdn, DnsRecordTargetMixin,
+                                AddressAlias)
+from aquilon.aqdb.utils.bulk_lookup import key_chunks, in_keys
 
 _TN = 'alias'
 
@@ -50,27 +55,28 @@ class Alias(DnsRecordTargetMixin, DnsRecord):
 
     @property
     def alias_depth(self):
-        depth = 0
-        for tgt in self.target_rrs:
-            if not isinstance(tgt, Alias):
-                continue
-            depth = max(depth, tgt.alias_depth)
-        return depth + 1
-
-    def get_alias_targets(self):
-        tlist = [self.target.fqdn]
-        for tgt in self.target_rrs:
-            if not isinstance(tgt, Alias):
-                continue
-            # this may end up with duplicates (ignore)
-            tlist.extend(tgt.get_alias_targets())
-        return tlist
+        graph = AliasGraph(object_session(self))
+        graph.load([self.target])
+        return graph.depth(self.target) + 1
 
     def __init__(self, fqdn, target, **kwargs):
+        session = object_session(target)
+        if session:
+            # The new record must not be flushed while it is incomplete
+            with session.no_autoflush:
+                graph = AliasGraph(session)
+                graph.load([target])
+                if graph.reaches(target, fqdn):
+                    raise ValueError("Alias loop detected.")
+                depth = graph.depth(target) + 1
+        else:
+            depth = 1
+
+        if depth > self.MAX_ALIAS_DEPTH:
+            raise ValueError("Maximum alias depth exceeded")
+
         self.target = target
         super(Alias, self).__init__(fqdn=fqdn, **kwargs)
-        if self.alias_depth > self.MAX_ALIAS_DEPTH:
-            raise ValueError("Maximum alias depth exceeded")
 
 # Most addresses will not have aliases. This bulk loadable property allows the
 # formatter to avoid querying the alias table for every displayed DNS record
@@ -78,3 +84,179 @@ class Alias(DnsRecordTargetMixin, DnsRecord):
 DnsRecord.alias_cnt = column_property(
     select([func.count()], DnsRecord.fqdn_id == Alias.__table__.alias().c.target_id)
     .label("alias_cnt"), deferred=True)
+
+
+class AliasGraph(object):
+    """
+    The alias and address alias chains around a set of names.
+
+    Walking alias chains through the relations of the DNS records needs a
+    query for every record on the way. This class loads the chains of many
+    names together, using one query for every level of the chains, and then
+    computes depths, final targets and loops in memory.
+
+    Names are identified by the IDs of their Fqdn objects. Names which are not
+    yet flushed to the database have no records as far as the graph is
+    concerned.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        # Names pointed to by the alias and address alias records of a name,
+        # as (target ID, is alias) pairs
+        self.targets = defaultdict(set)
+        # Names having an alias pointing to a name
+        self.sources = defaultdict(set)
+        # Names having records other than aliases and address aliases
+        self.resolved = set()
+        self._loaded_targets = set()
+        self._loaded_sources = set()
+
+    @staticmethod
+    def _ids(fqdns):
+        return set(dbfqdn.id for dbfqdn in fqdns if dbfqdn.id is not None)
+
+    def load(self, fqdns):
+        """ Load the chains starting at the given names. """
+        dns_record = DnsRecord.__table__
+        alias = Alias.__table__
+        address_alias = AddressAlias.__table__
+
+        frontier = self._ids(fqdns) - self._loaded_targets
+        while frontier:
+            self._loaded_targets |= frontier
+            found = set()
+            for id_chunk in key_chunks(self.session, frontier):
+                q = self.session.query(dns_record.c.fqdn_id,
+                                       alias.c.target_id,
+                                       address_alias.c.target_id)
+                q = q.select_from(dns_record
+                                  .outerjoin(alias, alias.c.dns_record_id ==
+                                             dns_record.c.id)
+                                  .outerjoin(address_alias,
+                                             address_alias.c.dns_record_id ==
+                                             dns_record.c.id))
+                q = q.filter(in_keys(self.session, dns_record.c.fqdn_id,
+                                     id_chunk))
+                for fqdn_id, alias_target_id, address_alias_target_id in q:
+                    if alias_target_id is not None:
+                        self.targets[fqdn_id].add((alias_target_id, True))
+                        found.add(alias_target_id)
+                    elif address_alias_target_id is not None:
+                        self.targets[fqdn_id].add((address_alias_target_id,
+                                                   False))
+                        found.add(address_alias_target_id)
+                    else:
+                        self.resolved.add(fqdn_id)
+            frontier = found - self._loaded_targets
+
+    def load_aliases(self, fqdns):
+        """ Load the aliases pointing to the given names, recursively. """
+        dns_record = DnsRecord.__table__
+        alias = Alias.__table__
+
+        frontier = self._ids(fqdns) - self._loaded_sources
+        while frontier:
+            self._loaded_sources |= frontier
+            found = set()
+            for id_chunk in key_chunks(self.session, frontier):
+                q = self.session.query(dns_record.c.fqdn_id, alias.c.target_id)
+                q = q.select_from(dns_record.join(alias,
+                                                  alias.c.dns_record_id ==
+                                                  dns_record.c.id))
+                q = q.filter(in_keys(self.session, alias.c.target_id,
+                                     id_chunk))
+                for fqdn_id, target_id in q:
+                    self.sources[target_id].add(fqdn_id)
+                    found.add(fqdn_id)
+            frontier = found - self._loaded_sources
+
+    def _loop_error(self, fqdn_id):
+        dbfqdn = self.session.query(Fqdn).get(fqdn_id)
+        return ArgumentError("Alias loop detected at {0!s}.".format(dbfqdn))
+
+    def _longest(self, fqdn_id, edges):
+        # Length of the longest chain starting at fqdn_id, using an explicit
+        # stack instead of recursion
+        lengths = {}
+        on_path = set([fqdn_id])
+        stack = [(fqdn_id, iter(edges(fqdn_id)))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child in on_path:
+                    raise self._loop_error(child)
+                if child not in lengths:
+                    on_path.add(child)
+                    stack.append((child, iter(edges(child))))
+                    break
+            else:
+                stack.pop()
+                on_path.discard(node)
+                lengths[node] = max([lengths[child] + 1
+                                     for child in edges(node)] or [0])
+        return lengths[fqdn_id]
+
+    def _alias_targets(self, fqdn_id):
+        return [target_id for target_id, is_alias in self.targets[fqdn_id]
+                if is_alias]
+
+    def depth(self, dbfqdn):
+        """
+        The number of aliases in the longest chain starting at the name.
+
+        It is 0 if the name is not an alias. Address aliases are not counted.
+        The chains must have been loaded by load().
+        """
+        if dbfqdn.id is None:
+            return 0
+        return self._longest(dbfqdn.id, self._alias_targets)
+
+    def height(self, dbfqdn):
+        """
+        The number of aliases in the longest chain ending at the name.
+
+        The aliases must have been loaded by load_aliases().
+        """
+        if dbfqdn.id is None:
+            return 0
+        return self._longest(dbfqdn.id, lambda fqdn_id: self.sources[fqdn_id])
+
+    def _reachable(self, fqdn_id):
+        found = set()
+        queue = [fqdn_id]
+        while queue:
+            node = queue.pop()
+            for target_id, _ in self.targets[node]:
+                if target_id not in found:
+                    found.add(target_id)
+                    queue.append(target_id)
+        return found
+
+    def reaches(self, dbfqdn, dbtarget):
+        """ Tell if a chain starting at dbfqdn leads to dbtarget. """
+        if dbfqdn.id is None or dbtarget.id is None:
+            return False
+        return dbtarget.id in self._reachable(dbfqdn.id)
+
+    def final_targets(self, dbfqdn):
+        """
+        Return the names at the end of the chains starting at the name.
+
+        These are the names having records other than aliases, or the name
+        itself if there are no such names. An error is raised if the chains
+        contain a loop.
+        """
+        if dbfqdn.id is None:
+            return [dbfqdn]
+
+        reachable = self._reachable(dbfqdn.id)
+        for fqdn_id in reachable | set([dbfqdn.id]):
+            if fqdn_id in self._reachable(fqdn_id):
+                raise self._loop_error(fqdn_id)
+
+        ids = sorted(fqdn_id for fqdn_id in reachable | set([dbfqdn.id])
+                     if fqdn_id in self.resolved)
+        if not ids:
+            return [dbfqdn]
+        return [self.session.query(Fqdn).get(fqdn_id) for fqdn_id in ids]
@@ -35,6 +35,7 @@ _TN = 'archetype'
 class Archetype(Base):
     """ Archetype names """
     __tablename__ = _TN
+    reference_data = True
 
     id = Column(Integer, Sequence('%s_id_seq' % _TN), primary_key=True)
 
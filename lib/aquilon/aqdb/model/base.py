@@ -27,6 +27,7 @@ from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.inspection import inspect
 
 from aquilon.exceptions_ import InternalError, NotFoundException, ArgumentError
+from aquilon.aqdb.reference_cache import reference_cache
 from aquilon.aqdb.utils.constraints import (ref_constraint_name,
                                             multi_col_constraint_name)
 
@@ -44,6 +45,10 @@ class Base(object):
     # Populate const tables when created
     populate_table_on_create = True
 
+    # Slowly changing reference data, get_unique() may be served from the
+    # process-wide reference cache
+    reference_data = False
+
     def __init__(self, **kw):
         for k in kw:
             if not hasattr(type(self), k):  # pragma: no cover
@@ -262,6 +267,14 @@ class Base(object):
         preclude = kwargs.pop('preclude', False)
         options = kwargs.pop('query_options', None)
 
+        cache_key = None
+        if cls.reference_data and not preclude and not options:
+            cache_key = reference_cache.make_key(cls, args, kwargs)
+            if cache_key:
+                obj = reference_cache.get(session, cache_key)
+                if obj is not None:
+                    return obj
+
         query = session.query(cls)
         if options:
             query = query.options(*options)
@@ -282,6 +295,8 @@ class Base(object):
             # away
             for rel, value in attr_cache.items():
                 set_committed_value(obj, rel, value)
+            if cache_key:
+                reference_cache.store(session, cache_key, obj)
             return obj
         except NoResultFound:
             if not compel:
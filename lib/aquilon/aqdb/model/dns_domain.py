@@ -55,6 +55,7 @@ class DnsDomain(Base):
 
     __tablename__ = _TN
     _class_label = 'DNS Domain'
+    reference_data = True
 
     # RFC 1035, but loosing the restrction to allow the first character
     # to be digits.
@@ -34,6 +34,7 @@ from aquilon.exceptions_ import AquilonError
 class Location(Base):
     """ How we represent location data in Aquilon """
     __tablename__ = 'location'
+    reference_data = True
 
     valid_parents = []
 
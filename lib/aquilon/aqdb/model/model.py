@@ -34,6 +34,7 @@ class Model(Base):
     """ Vendor and Model are representations of the various manufacturers and
     the asset inventory of the kinds of machines we use in the plant """
     __tablename__ = 'model'
+    reference_data = True
 
     id = Column(Integer, Sequence('model_id_seq'), primary_key=True)
     name = Column(AqStr(64), nullable=False)
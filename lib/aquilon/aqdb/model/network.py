@@ -360,6 +360,19 @@ class Network(Base):
 
     @property
     def guest_count(self):
+        # The counter is maintained by the flush hooks in vlan.py
+        if not self.port_group:
+            return 0
+        return self.port_group.guest_count
+
+    def count_guests(self):
+        """
+        Count the addresses and port group users of this network.
+
+        This is the slow, authoritative version of guest_count, used for
+        maintaining and verifying the counter stored in the port group.
+        """
+
         # Avoid circular deps by doing the imports here
         from aquilon.aqdb.model import Interface, AddressAssignment
 
@@ -44,6 +44,7 @@ class NetworkEnvironment(Base):
 
     __tablename__ = _TN
     _class_label = 'Network Environment'
+    reference_data = True
 
     id = Column(Integer, Sequence('%s_id_seq' % _TN), primary_key=True)
     name = Column(AqStr(64), nullable=False, unique=True)
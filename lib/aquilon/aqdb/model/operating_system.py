@@ -31,6 +31,7 @@ class OperatingSystem(Base):
     """ Operating Systems """
     __tablename__ = _TN
     _class_label = 'Operating System'
+    reference_data = True
 
     id = Column(Integer, Sequence('%s_id_seq' % _TN), primary_key=True)
     name = Column(AqStr(32), nullable=False)
@@ -20,7 +20,7 @@ from datetime import datetime
 import json
 import re
 
-from jsonschema import validate, ValidationError, Draft4Validator
+from jsonschema import ValidationError
 
 from sqlalchemy import (Column, Integer, DateTime, Sequence, String, Boolean,
                         Text, ForeignKey, UniqueConstraint)
@@ -32,7 +32,7 @@ from aquilon.aqdb.column_types import AqStr, EmptyStr, Enum, JSONEncodedDict
 from aquilon.aqdb.model import Base, Archetype, Feature
 from aquilon.aqdb.model.feature import _ACTIVATION_TYPE
 from aquilon.utils import (force_json, force_int, force_float, force_boolean,
-                           validate_nlist_key)
+                           validate_nlist_key, get_schema_validator)
 
 _TN = 'param_definition'
 _PARAM_DEF_HOLDER = 'param_def_holder'
@@ -196,7 +196,7 @@ class ParamDefinition(Base):
         retval = self.parse_value("default for path=%s" % self.path, value)
         if self.schema:
             try:
-                validate(retval, self.schema)
+                get_schema_validator(self.schema).validate(retval)
             except ValidationError as err:
                 raise ArgumentError(err)
 
@@ -210,11 +210,11 @@ class ParamDefinition(Base):
     def validate_schema(self, key, value):  # pylint: disable=W0613
         if value is None:
             return value
-        Draft4Validator.check_schema(value)
+        validator = get_schema_validator(value)
 
         if self.default:
             try:
-                validate(json.loads(self.default), value)
+                validator.validate(json.loads(self.default))
             except ValidationError as err:
                 raise ArgumentError("The existing default value conflicts "
                                     "with the new schema: %s" % err)
@@ -50,6 +50,7 @@ _ALLOWED_STAGES = ('previous', 'current', 'next')
 class Personality(Base):
     """ Personality names """
     __tablename__ = _TN
+    reference_data = True
 
     id = Column(Integer, Sequence('%s_id_seq' % _TN), primary_key=True)
     name = Column(AqStr(64), nullable=False)
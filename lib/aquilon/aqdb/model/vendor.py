@@ -29,6 +29,7 @@ _TN = 'vendor'
 class Vendor(Base):
     """ Vendor names """
     __tablename__ = _TN
+    reference_data = True
 
     id = Column(Integer, Sequence('%s_id_seq' % _TN), primary_key=True)
     name = Column(AqStr(32), nullable=False, unique=True)
@@ -17,11 +17,14 @@
 """ The classes pertaining to VLAN info"""
 
 from datetime import datetime
+from itertools import chain
 import re
 
 from sqlalchemy import (Column, Integer, DateTime, ForeignKey, CheckConstraint,
-                        PrimaryKeyConstraint, Index, Sequence)
-from sqlalchemy.orm import relation, backref, deferred, foreign, remote
+                        PrimaryKeyConstraint, Index, Sequence, event)
+from sqlalchemy.orm import (relation, backref, deferred, foreign, remote,
+                            Session)
+from sqlalchemy.orm.attributes import get_history, set_committed_value
 from sqlalchemy.sql import and_
 
 from aquilon.exceptions_ import InternalError
@@ -86,6 +89,10 @@ class PortGroup(Base):
 
     usage = Column(AqStr(32), nullable=False)
 
+    # Number of addresses and interfaces using the network, see
+    # Network.count_guests(). Kept up to date by update_guest_counts().
+    guest_count = Column(Integer, nullable=False, default=0)
+
     creation_date = deferred(Column(DateTime, default=datetime.now,
                                     nullable=False))
 
@@ -118,6 +125,82 @@ class PortGroup(Base):
             return (None, None)
 
 
+_GUEST_COUNT_KEY = "guest_count_networks"
+
+
+def _has_changes(obj, *attrs):
+    return any(get_history(obj, attr).has_changes() for attr in attrs)
+
+
+def _collect_guest_count_changes(session, flush_context,
+                                 instances):  # pylint: disable=W0613
+    """ Remember the networks whose guest count may change by the flush """
+    # Avoid circular deps by doing the imports here
+    from aquilon.aqdb.model import Interface, AddressAssignment
+
+    networks = set()
+    for obj in chain(session.new, session.deleted):
+        if isinstance(obj, (AddressAssignment, PortGroup)):
+            networks.add(obj.network)
+        elif isinstance(obj, Interface) and obj.port_group:
+            networks.add(obj.port_group.network)
+
+    for obj in session.dirty:
+        if isinstance(obj, AddressAssignment):
+            if _has_changes(obj, "ip", "network", "interface"):
+                networks.update(get_history(obj, "network").sum())
+        elif isinstance(obj, Interface):
+            if _has_changes(obj, "port_group"):
+                networks.update(dbpg.network for dbpg in
+                                get_history(obj, "port_group").sum() if dbpg)
+        elif isinstance(obj, Network):
+            if _has_changes(obj, "ip", "cidr", "network_type"):
+                networks.add(obj)
+
+    networks.discard(None)
+    session.info[_GUEST_COUNT_KEY] = networks
+
+
+def update_guest_counts(session, networks):
+    """
+    Recalculate the guest counters of the given networks
+
+    The flush hooks call this automatically. Code changing address
+    assignments using bulk UPDATE statements has to call it explicitly.
+    """
+    port_groups = [net.port_group for net in networks
+                   if net not in session.deleted and net.port_group and
+                   net.port_group not in session.deleted]
+    if not port_groups:
+        return
+
+    # Serialize updates of the same counter, and make sure the queries below
+    # see everything committed by concurrent transactions
+    PortGroup.lock_rows(port_groups)
+
+    table = PortGroup.__table__
+    for dbpg in port_groups:
+        count = dbpg.network.count_guests()
+        if count == dbpg.guest_count:
+            continue
+
+        session.execute(table.update()
+                        .where(table.c.id == dbpg.id)
+                        .values(guest_count=count))
+        set_committed_value(dbpg, "guest_count", count)
+
+
+def _update_guest_counts(session, flush_context):  # pylint: disable=W0613
+    """ Recalculate the guest counters of the networks touched by the flush """
+    networks = session.info.pop(_GUEST_COUNT_KEY, None)
+    if networks:
+        update_guest_counts(session, networks)
+
+
+event.listen(Session, "before_flush", _collect_guest_count_changes)
+event.listen(Session, "after_flush", _update_guest_counts)
+
+
 class __ObservedVlan(Base):
     """ reports the observance of a vlan/network on a switch """
     __tablename__ = _TN
@@ -0,0 +1,203 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Process-wide cache of slowly changing reference data.
+
+Classes having the reference_data flag set may have the results of
+get_unique() served from this cache. The cache stores detached copies of the
+objects, which are merged into the session of the caller without touching the
+database.
+
+The cache is invalidated when a session commits changes to the cached tables.
+Results are only stored if no such commit has happened since the transaction
+of the storing session started, so a stale snapshot can never be cached.
+Changes made by other processes are only noticed after the entries expire.
+"""
+
+from itertools import chain
+from threading import Lock
+import time
+
+from six import string_types, integer_types
+
+from sqlalchemy import event
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+
+_SCALAR_TYPES = string_types + integer_types + (bool,)
+
+
+def _base_class(cls):
+    """Return the class changes are tracked by - the root of the hierarchy."""
+    return inspect(cls).base_mapper.class_
+
+
+def _detached_copy(obj):
+    state = inspect(obj)
+    mapper = state.mapper
+    copy = mapper.class_manager.new_instance()
+    for prop in mapper.column_attrs:
+        # Do not trigger loading deferred or expired attributes
+        if prop.key in state.dict:
+            set_committed_value(copy, prop.key, state.dict[prop.key])
+    make_transient_to_detached(copy)
+    return copy
+
+
+class ReferenceCache(object):
+    def __init__(self):
+        self.lock = Lock()
+        self.enabled = False
+        self.ttl = None
+        # Incremented every time a cached table is modified
+        self.version = 0
+        # Base class => version when the table was last modified
+        self.modified = {}
+        # Key => (detached object, time of insertion)
+        self.entries = {}
+
+    def _listeners(self):
+        return [("after_begin", self._after_begin),
+                ("after_flush", self._after_flush),
+                ("after_commit", self._after_commit),
+                ("after_transaction_end", self._after_transaction_end),
+                ("after_bulk_update", self._after_bulk),
+                ("after_bulk_delete", self._after_bulk)]
+
+    def enable(self, ttl=None):
+        if not self.enabled:
+            for name, listener in self._listeners():
+                event.listen(Session, name, listener)
+        self.enabled = True
+        self.ttl = ttl
+
+    def disable(self):
+        if self.enabled:
+            for name, listener in self._listeners():
+                event.remove(Session, name, listener)
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+
+    def make_key(self, cls, args, kwargs):
+        """Return the cache key for a get_unique() call, if it is cacheable."""
+        if not self.enabled:
+            return None
+
+        items = [(None, value) for value in args]
+        items.extend((name, value) for name, value in kwargs.items()
+                     if name != "compel")
+        key = [cls]
+        for name, value in sorted(items, key=lambda item: item[0] or ""):
+            if value is None or isinstance(value, _SCALAR_TYPES):
+                key.append((name, value))
+                continue
+
+            # Referenced objects are identified by their primary key
+            state = inspect(value, raiseerr=False)
+            if state is None or getattr(state, "key", None) is None:
+                return None
+            key.append((name, state.key))
+        return tuple(key)
+
+    def get(self, session, key):
+        base = _base_class(key[0])
+
+        # Let pending changes reach the database first, as the query would
+        session._autoflush()  # pylint: disable=W0212
+        if base in session.info.get("refcache_dirty", ()):
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                return None
+            if self.ttl is not None and entry[1] + self.ttl < time.time():
+                del self.entries[key]
+                return None
+            copy = entry[0]
+
+        # Do not overwrite the state of an object the session already knows
+        obj = session.identity_map.get(inspect(copy).key, None)
+        if obj is not None:
+            return obj
+        return session.merge(copy, load=False)
+
+    def store(self, session, key, obj):
+        base = _base_class(key[0])
+        if base in session.info.get("refcache_dirty", ()):
+            return
+        if inspect(obj).modified:
+            return
+        start = session.info.get("refcache_version", None)
+        if start is None:
+            return
+
+        copy = _detached_copy(obj)
+        with self.lock:
+            if self.modified.get(base, 0) > start:
+                return
+            self.entries[key] = (copy, time.time())
+
+    def invalidate(self, classes):
+        with self.lock:
+            self.version += 1
+            for base in classes:
+                self.modified[base] = self.version
+            for key in list(self.entries):
+                if _base_class(key[0]) in classes:
+                    del self.entries[key]
+
+    def _after_begin(self, session, transaction, connection):
+        # pylint: disable=W0613
+        session.info.setdefault("refcache_version", self.version)
+
+    def _after_flush(self, session, flush_context):
+        # pylint: disable=W0613
+        dirty = session.info.setdefault("refcache_dirty", set())
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if getattr(obj, "reference_data", False):
+                dirty.add(_base_class(type(obj)))
+
+    def _after_bulk(self, update_context):
+        session = update_context.session
+        mapper = getattr(update_context, "mapper", None)
+        if mapper is None:
+            self.clear()
+        elif getattr(mapper.class_, "reference_data", False):
+            dirty = session.info.setdefault("refcache_dirty", set())
+            dirty.add(mapper.base_mapper.class_)
+
+    def _after_commit(self, session):
+        dirty = session.info.pop("refcache_dirty", None)
+        if dirty:
+            self.invalidate(dirty)
+
+    def _after_transaction_end(self, session, transaction):
+        # SQLAlchemy 1.0 does not have the public "parent" attribute yet
+        if transaction._parent is None:  # pylint: disable=W0212
+            session.info.pop("refcache_version", None)
+            session.info.pop("refcache_dirty", None)
+
+
+# Single instance shared by all sessions
+reference_cache = ReferenceCache()
@@ -0,0 +1,104 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Looking up long lists of keys with as few statements as possible
+
+Oracle does not allow more than 1000 expressions in an IN (...) list
+(ORA-01795), and SQLite limits the number of bound variables per statement,
+so long key lists used to be split into chunks of 1000, each resulting in a
+separate query. The helpers here choose the chunk size and the form of the
+filter based on the database:
+
+- PostgreSQL: the whole key list is passed as a single array parameter, using
+  "column = ANY(:keys)".
+- Oracle: up to MAX_ORACLE_KEYS keys are looked up in a single statement, using
+  multiple IN lists joined by OR. The key list is padded to a fixed set of
+  sizes, so the number of distinct statements Oracle has to parse stays small.
+- Everything else (SQLite): chunks of MAX_DEFAULT_KEYS keys.
+
+Typical usage:
+
+    for id_chunk in key_chunks(session, ids):
+        q = session.query(Host)
+        q = q.filter(in_keys(session, Host.id, id_chunk))
+        ...
+"""
+
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func, literal, or_
+
+from aquilon.utils import chunk
+
+# Maximum number of elements in an IN list on Oracle
+ORACLE_IN_LIST_SIZE = 1000
+
+# Oracle allows at most 65535 bind variables in a statement
+MAX_ORACLE_KEYS = 32000
+
+# Statement sizes used for padding key lists on Oracle
+ORACLE_BUCKETS = (10, 100, 1000, 2000, 4000, 8000, 16000, 32000)
+
+# Default limit, which keeps us below SQLITE_MAX_VARIABLE_NUMBER even if the
+# query has other parameters
+MAX_DEFAULT_KEYS = 500
+
+
+def _dialect_name(session):
+    return session.bind.dialect.name
+
+
+def key_chunks(session, keys):
+    """
+    Split keys into chunks that can be looked up by a single statement.
+    """
+    keys = list(keys)
+    dialect = _dialect_name(session)
+    if dialect == "postgresql":
+        if keys:
+            yield keys
+        return
+
+    if dialect == "oracle":
+        size = MAX_ORACLE_KEYS
+    else:
+        size = MAX_DEFAULT_KEYS
+
+    for key_chunk in chunk(keys, size):
+        yield key_chunk
+
+
+def in_keys(session, column, keys):
+    """
+    Return a filter equivalent to column.in_(keys).
+
+    The keys should come from key_chunks().
+    """
+    keys = list(keys)
+    dialect = _dialect_name(session)
+    if dialect == "postgresql" and keys:
+        return column == func.any(literal(keys, type_=ARRAY(column.type)))
+
+    if dialect == "oracle" and keys:
+        # Repeating the last key does not change the result, but allows
+        # reusing the statements parsed earlier
+        for bucket in ORACLE_BUCKETS:
+            if bucket >= len(keys):
+                keys.extend(keys[-1:] * (bucket - len(keys)))
+                break
+        return or_(*[column.in_(key_chunk) for key_chunk
+                     in chunk(keys, ORACLE_IN_LIST_SIZE)])
+
+    return column.in_(keys)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from threading import Thread
+
+from six.moves.queue import Queue, Empty  # pylint: disable=F0401
+
+from sqlalchemy.inspection import inspect
+
+from aquilon.consistency.checker import ConsistencyChecker
+from aquilon.aqdb.model import Base
+from aquilon.aqdb.db_factory import DbFactory
+from aquilon.aqdb.utils.bulk_lookup import in_keys
+from aquilon.worker.templates import Plenary, PlenaryCollection
+from aquilon.utils import chunk
+
+# Number of objects checked by a single task of the worker threads
+CHUNK_SIZE = 500
+
+
+class PlenaryChecker(ConsistencyChecker):
+    """
+    Plenary Consistency Checker
+
+    This module regenerates the plenary templates of every object in the
+    database, and compares them to the files below plenarydir and cfgdir. The
+    check does not write anything; in repair mode, only the templates found to
+    be out of date are rewritten.
+    """
+
+    @staticmethod
+    def plenary_classes():
+        classes = set(cls for cls in Plenary.handlers if issubclass(cls, Base))
+        # Subclasses are returned by the query of the parent class
+        return sorted((cls for cls in classes
+                       if not any(issubclass(cls, other) and cls != other
+                                  for other in classes)),
+                      key=lambda cls: cls.__name__)
+
+    def check(self, repair=False):
+        tasks = Queue()
+        for cls in self.plenary_classes():
+            pk = inspect(cls).primary_key
+            if len(pk) != 1:  # pragma: no cover
+                tasks.put((cls, None))
+                continue
+
+            ids = [id for id, in self.session.query(pk[0]).order_by(pk[0])]
+            for id_chunk in chunk(ids, CHUNK_SIZE):
+                tasks.put((cls, id_chunk))
+
+        results = []
+        threads = [Thread(target=self._check_worker,
+                          args=(tasks, results, repair))
+                   for _ in range(self.config.getint("broker",
+                                                     "plenary_check_threads"))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # The problem already includes the path of the template
+        for item, problem in results:
+            self.failure(item, item, problem)
+
+    def _check_worker(self, tasks, results, repair):
+        # Every thread needs its own session, and its own plenary cache
+        db = DbFactory()
+        session = db.Session()
+        try:
+            while True:
+                try:
+                    cls, ids = tasks.get_nowait()
+                except Empty:
+                    break
+
+                q = session.query(cls)
+                if ids is not None:
+                    q = q.filter(in_keys(session, inspect(cls).primary_key[0],
+                                         ids))
+                handler = Plenary.handlers[cls]
+                if hasattr(handler, "query_options"):
+                    q = q.options(*handler.query_options())
+
+                for dbobj in q:
+                    self._check_object(dbobj, results, repair)
+
+                # Do not keep every object loaded
+                session.expunge_all()
+        finally:
+            session.rollback()
+            db.Session.remove()
+
+    def _check_object(self, dbobj, results, repair):
+        if dbobj.__class__ not in Plenary.handlers:
+            return
+
+        try:
+            plenary = Plenary.get_plenary(dbobj, logger=self.logger)
+            drifted = plenary.check_drift()
+            if drifted and repair:
+                self.logger.info("Rewriting the plenaries of %s",
+                                 format(dbobj))
+                # Take the same locks as the broker, which may be writing the
+                # same files
+                plenaries = PlenaryCollection(logger=self.logger)
+                plenaries.append(plenary)
+                plenaries.write(remove_profile=False)
+                return
+        except Exception as err:  # pylint: disable=W0703
+            results.append((format(dbobj), "failed: %s" % err))
+            return
+
+        for _, problem in drifted:
+            results.append((format(dbobj), problem))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from sqlalchemy.orm import joinedload
+
+from aquilon.consistency.checker import ConsistencyChecker
+from aquilon.aqdb.model import PortGroup
+
+
+class PortGroupChecker(ConsistencyChecker):
+    """
+    Port Group Consistency Checker
+
+    This module verifies that the guest counters stored in the port groups
+    match the addresses and interfaces actually using the networks.
+    """
+
+    def check(self, repair=False):
+        q = self.session.query(PortGroup)
+        q = q.options(joinedload('network'))
+        for dbpg in q:
+            count = dbpg.network.count_guests()
+            if count == dbpg.guest_count:
+                continue
+
+            if repair:
+                self.logger.info("Setting the guest count of %s to %d",
+                                 format(dbpg), count)
+                dbpg.guest_count = count
+            else:
+                self.failure(dbpg.name, format(dbpg),
+                             "has guest count %d, but %d was expected" %
+                             (dbpg.guest_count, count))
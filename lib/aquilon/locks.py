@@ -17,6 +17,7 @@
 
 import logging
 from threading import Condition
+from time import time
 from collections import defaultdict
 from itertools import chain
 from six import iteritems, itervalues, string_types
@@ -26,6 +27,36 @@ from aquilon.exceptions_ import InternalError
 LOGGER = logging.getLogger('aquilon.locks')
 
 
+class LockStats(object):
+    """Aggregated wait and hold times of a single lock component."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.released = 0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def add_wait(self, waited, contended):
+        self.acquired += 1
+        if contended:
+            self.contended += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def add_hold(self, held):
+        self.released += 1
+        self.hold_total += held
+        self.hold_max = max(self.hold_max, held)
+
+    def copy(self):
+        stats = LockStats()
+        stats.__dict__.update(self.__dict__)
+        return stats
+
+
 class LockQueue(object):
     """Provide a layered (namespaced?) locking mechanism.
 
@@ -43,6 +74,8 @@ class LockQueue(object):
     def __init__(self):
         self.queue_condition = Condition()
         self.queue = []
+        # Lock component (e.g. "domain", "profile") => LockStats
+        self.stats = defaultdict(LockStats)
 
     def acquire(self, key):
         key.transition("acquiring")
@@ -51,10 +84,16 @@ class LockQueue(object):
                 raise InternalError("Duplicate attempt to aquire %s with the "
                                     "same key." % key)
             self.queue.append(key)
+            contended = False
             while self.blocked(key):  # pragma: no cover
+                contended = True
                 self.queue_condition.wait()
             key.transition("acquired")
 
+            waited = key.waited()
+            for component in key.components():
+                self.stats[component].add_wait(waited, contended)
+
     def blocked(self, key):
         """Indicate whether the lock for this key can be acquired.
 
@@ -62,26 +101,37 @@ class LockQueue(object):
         blockers and let it know if it is in line.
 
         """
-        blocker_count = 0
+        blocked_by = []
         for k in self.queue:
             if k == key:
                 break
             blockers = k.blocks(key)
             if blockers:
-                blocker_count += 1
+                blocked_by.append(k)
                 key.log("Blocking on %s" % ", ".join(sorted(list(blockers))))
+        key.blocked_by = blocked_by
         # Can only get here if the key is not in the queue - seems
         # like a valid theoretical question to ask - in which case
         # the method is "would queued keys block this one?"
-        return blocker_count > 0
+        return len(blocked_by) > 0
 
     def release(self, key):
         key.transition("releasing")
         with self.queue_condition:
             self.queue.remove(key)
             self.queue_condition.notifyAll()
+
+            held = key.held()
+            for component in key.components():
+                self.stats[component].add_hold(held)
         key.transition("released")
 
+    def statistics(self):
+        """Return a consistent copy of the per-component statistics."""
+        with self.queue_condition:
+            return dict((component, stats.copy())
+                        for component, stats in iteritems(self.stats))
+
 
 class LockKey(object):
     """Create a key composed of a bunch of unrelated items.
@@ -98,6 +148,11 @@ class LockKey(object):
         self.loglevel = loglevel
         self.lock_queue = lock_queue
         self.state = None
+        # State => time of the last transition into that state
+        self.timestamps = {}
+        # Keys preceding this one in the queue which prevent it from being
+        # acquired
+        self.blocked_by = []
 
     def __str__(self):
         exc_items = []
@@ -138,9 +193,36 @@ class LockKey(object):
                     if not isinstance(key, string_types):
                         raise ValueError("Lock key contains %r" % key)
 
+        if state == "acquiring":
+            # The key may be reused - forget about the previous cycle
+            for old_state in ("acquired", "releasing", "released"):
+                self.timestamps.pop(old_state, None)
+        self.timestamps[state] = time()
         self.state = state
         self.logger.debug('%s %s', state, self)
 
+    def components(self):
+        """Return the names of the lock components this key refers to."""
+        return set(name for name, items in chain(iteritems(self.exclusive),
+                                                 iteritems(self.shared))
+                   if items)
+
+    def waited(self, now=None):
+        """Time spent waiting for the lock, or None if not requested yet."""
+        start = self.timestamps.get("acquiring")
+        if start is None:
+            return None
+        end = self.timestamps.get("acquired", now or time())
+        return end - start
+
+    def held(self, now=None):
+        """Time the lock has been held, or None if not acquired yet."""
+        start = self.timestamps.get("acquired")
+        if start is None:
+            return None
+        end = self.timestamps.get("releasing", now or time())
+        return end - start
+
     def blocks(self, key):
         """Determine if this key blocks another.
 
@@ -20,8 +20,10 @@
 
 from __future__ import print_function
 
+from copy import deepcopy
 import errno
 import gzip
+import hashlib
 import json
 import logging
 import os
@@ -30,6 +32,7 @@ import signal
 import time
 from itertools import islice
 from tempfile import mkstemp
+from threading import Lock
 from uuid import UUID
 
 from ipaddress import IPv6Address, ip_address
@@ -372,22 +375,93 @@ class ProgressReport(object):
                                     (self.item_name, self.count, self.total))
 
 
-def validate_json(config, data, schema_name, msg):
+# Registry of checked JSON schemas. Checking a schema against the meta-schema
+# is the expensive part of validation, so it is done only once. Schemas loaded
+# from files are keyed by the file name, and are reloaded if the file changes;
+# schemas stored in the database are keyed by their digest. Validator objects
+# themselves are cheap, but the RefResolver they use is not thread-safe, so a
+# new validator is returned to every caller.
+_schema_lock = Lock()
+_file_schemas = {}
+_db_schemas = {}
+_MAX_DB_SCHEMAS = 1024
+
+
+def get_schema_validator(schema):
+    """Return a validator for a schema stored in the database.
+
+    Raises jsonschema.SchemaError if the schema is not valid.
+    """
+    digest = hashlib.sha1(json.dumps(schema, sort_keys=True)
+                          .encode("utf-8")).hexdigest()
+    with _schema_lock:
+        entry = _db_schemas.get(digest, None)
+
+    if not entry:
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        # Protect against the caller modifying the schema later
+        entry = (cls, deepcopy(schema))
+        with _schema_lock:
+            if len(_db_schemas) >= _MAX_DB_SCHEMAS:
+                _db_schemas.clear()
+            _db_schemas[digest] = entry
+
+    cls, schema = entry
+    return cls(schema)
+
+
+def get_file_validator(config, schema_name):
+    """Return a validator for one of the schemas in etc/schema."""
     srcdir = config.get("broker", "srcdir")
     schema_dir = os.path.join(srcdir, "etc", "schema")
     schema_file = os.path.join(schema_dir, schema_name + ".json")
-    resolver = jsonschema.RefResolver("file://" + schema_file, schema_name + ".json")
-    format_checker = jsonschema.FormatChecker()
 
     try:
-        with open(schema_file) as fp:
-            schema = json.load(fp)
-        jsonschema.Draft4Validator.check_schema(schema)
-    except Exception as err:
+        mtime = os.stat(schema_file).st_mtime
+    except OSError as err:
         raise AquilonError("Failed to load %s: %s" % (schema_file, err))
 
+    with _schema_lock:
+        entry = _file_schemas.get(schema_file, None)
+
+    if not entry or entry[0] != mtime:
+        try:
+            with open(schema_file) as fp:
+                schema = json.load(fp)
+            cls = jsonschema.validators.validator_for(schema)
+            cls.check_schema(schema)
+        except Exception as err:
+            raise AquilonError("Failed to load %s: %s" % (schema_file, err))
+
+        entry = (mtime, cls, schema)
+        with _schema_lock:
+            _file_schemas[schema_file] = entry
+
+    _, cls, schema = entry
+    resolver = jsonschema.RefResolver("file://" + schema_file, schema)
+    return cls(schema, resolver=resolver,
+               format_checker=jsonschema.FormatChecker())
+
+
+def validate_json(config, data, schema_name, msg):
+    validator = get_file_validator(config, schema_name)
     try:
-        jsonschema.validate(data, schema, resolver=resolver,
-                            format_checker=format_checker)
+        validator.validate(data)
     except jsonschema.ValidationError as err:
         raise ArgumentError("Failed to validate %s: %s" % (msg, err))
+
+
+def validate_json_values(validator, items):
+    """Validate multiple values against the same schema.
+
+    The items are (label, value) pairs. Returns the list of (label, error
+    message) pairs for every value which fails the validation.
+    """
+    failed = []
+    for label, value in items:
+        # Report the same error validate() would raise
+        for error in validator.iter_errors(value):
+            failed.append((label, error.message))
+            break
+    return failed
@@ -0,0 +1,150 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Admission control and thread pool partitioning for broker commands.
+
+Commands are classified by their expected resource usage:
+
+    - lockfree: commands using the NLSession pool and never taking a lock
+    - readonly: read-only commands that may still have to take a lock
+    - write: commands modifying the database and usually writing plenaries
+    - compile: commands running the template compiler
+
+Every class is served by its own thread pool, so a burst of long running
+commands of one class cannot starve the others. The number of commands
+waiting for a thread and the number of concurrent commands of a user can be
+limited; requests exceeding the limits are rejected with a TransientError,
+which the client sees as "503 Service Unavailable".
+"""
+
+from collections import defaultdict
+
+from six import iteritems
+
+from twisted.internet import reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+from aquilon.config import Config
+from aquilon.exceptions_ import TransientError
+from aquilon.worker.metrics import registry
+
+ADMISSION_CLASSES = ("lockfree", "readonly", "write", "compile")
+
+
+def classify(broker_command):
+    """Return the admission class of a broker command."""
+    if broker_command.admission_class:
+        return broker_command.admission_class
+    if broker_command.is_lock_free:
+        return "lockfree"
+    if broker_command.requires_readonly:
+        return "readonly"
+    return "write"
+
+
+class AdmissionController(object):
+    """Dispatch commands to the thread pool of their admission class.
+
+    All methods must be called from the reactor thread, so the bookkeeping does
+    not need any locking.
+    """
+
+    def __init__(self):
+        self.pools = {}
+        # Admission class => number of commands running or queued
+        self.admitted = defaultdict(int)
+        # User => number of commands running or queued
+        self.users = defaultdict(int)
+
+    def _limit(self, option):
+        config = Config()
+        if config.has_value("admission", option):
+            return config.getint("admission", option)
+        return None
+
+    def get_pool(self, admission_class):
+        config = Config()
+        if not config.getboolean("admission", "enabled"):
+            return reactor.getThreadPool()
+
+        pool = self.pools.get(admission_class, None)
+        if not pool:
+            size = config.getint("admission", admission_class + "_threads")
+            pool = ThreadPool(minthreads=0, maxthreads=size,
+                              name="aqd-" + admission_class)
+            pool.start()
+            reactor.addSystemEventTrigger("during", "shutdown", pool.stop)
+            self.pools[admission_class] = pool
+        return pool
+
+    def admit(self, admission_class, user):
+        pool = self.get_pool(admission_class)
+
+        if admission_class in self.pools:
+            queue_limit = self._limit(admission_class + "_queue")
+            if queue_limit is not None and \
+               self.admitted[admission_class] >= pool.max + queue_limit:
+                raise TransientError("The broker is too busy to accept more "
+                                     "%s commands, please try again later." %
+                                     admission_class)
+
+        user_limit = self._limit("user_limit")
+        if user_limit is not None and self.users[user] >= user_limit:
+            raise TransientError("User %s already has %d commands in "
+                                 "progress, please try again later." %
+                                 (user, self.users[user]))
+
+        self.admitted[admission_class] += 1
+        self.users[user] += 1
+        return pool
+
+    def release(self, result, admission_class, user):
+        self.admitted[admission_class] -= 1
+        self.users[user] -= 1
+        if not self.users[user]:
+            del self.users[user]
+
+        # Pass through
+        return result
+
+    def run(self, broker_command, user, func, **kwargs):
+        """Execute func(**kwargs) on behalf of broker_command.
+
+        Returns a Deferred, or raises TransientError if the command is not
+        admitted.
+        """
+        admission_class = classify(broker_command)
+        pool = self.admit(admission_class, user)
+        d = threads.deferToThreadPool(reactor, pool, func, **kwargs)
+        d.addBoth(self.release, admission_class, user)
+        return d
+
+    def statistics(self):
+        stats = []
+        for admission_class, pool in sorted(iteritems(self.pools)):
+            stats.append(((admission_class, "max"), pool.max))
+            stats.append(((admission_class, "busy"), len(pool.working)))
+            stats.append(((admission_class, "queued"), pool.q.qsize()))
+            stats.append(((admission_class, "admitted"),
+                          self.admitted[admission_class]))
+        return stats
+
+
+# Single instance used by the broker
+admission_controller = AdmissionController()
+
+registry.gauge("aqd_admission", "Occupancy of the per-class thread pools.",
+               admission_controller.statistics, ["class", "state"])
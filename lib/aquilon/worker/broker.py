@@ -34,6 +34,7 @@ from aquilon.worker.authorization import AuthorizationBroker
 from aquilon.aqdb.db_factory import DbFactory
 from aquilon.aqdb.model.xtn import start_xtn, end_xtn
 from aquilon.worker.formats.formatters import ResponseFormatter
+from aquilon.worker.metrics import command_timer, phase_timer
 from aquilon.worker.dbwrappers.user_principal import (
     get_or_create_user_principal)
 from aquilon.locks import LockKey
@@ -41,6 +42,7 @@ from aquilon.worker.templates.base import Plenary, PlenaryCollection
 from aquilon.worker.templates.domain import TemplateDomain
 from aquilon.worker.services import Chooser
 from aquilon.worker.dbwrappers.branch import sync_domain
+from aquilon.worker.dbwrappers.pagination import CONTINUATION_HEADER, paginate
 
 # Things we don't need cluttering up the transaction details table
 _IGNORED_AUDIT_ARGS = ('requestid', 'bundle', 'debug', 'session', 'dbuser')
@@ -132,6 +134,11 @@ class BrokerCommand(object):
     # to True if requires_transaction.
     defer_to_thread = True
 
+    # Admission class selecting the thread pool the command runs on, see
+    # aquilon.worker.admission.  If set to None (the default), it is derived
+    # from is_lock_free and requires_readonly.
+    admission_class = None
+
     def __init__(self):
         """ Provides some convenient variables for commands.
 
@@ -181,6 +188,28 @@ class BrokerCommand(object):
 
         request._audit_result.append((key, value))
 
+    def paginate(self, request, query, columns, page_size, continuation,
+                 descending=False):
+        """
+        Return one page of the result of a search query.
+
+        If there are more results, the continuation token of the next page is
+        returned to the client in a response header.
+        """
+        if page_size is None:
+            page_size = self.config.getint("broker", "default_page_size")
+        max_page_size = self.config.getint("broker", "max_page_size")
+        if page_size > max_page_size:
+            raise ArgumentError("Cannot set the page size higher than %d." %
+                                max_page_size)
+
+        items, token = paginate(query, columns, page_size,
+                                continuation=continuation, scope=self.command,
+                                descending=descending)
+        if token:
+            request.setHeader(CONTINUATION_HEADER, token)
+        return items
+
     def render(self, **_):  # pragma: no cover
         """ Implement this method to create a functional broker command.
 
@@ -194,8 +223,12 @@ class BrokerCommand(object):
         raise UnimplementedError("%s has not been implemented" %
                                  self.__class__.__module__)
 
-    def invoke_render(self, user=None, request=None, requestid=None,
-                      logger=None, **kwargs):
+    def invoke_render(self, **kwargs):
+        with command_timer(self.command):
+            return self._invoke_render(**kwargs)
+
+    def _invoke_render(self, user=None, request=None, requestid=None,
+                       logger=None, **kwargs):
         raising_exception = None
         rollback_failed = False
         dbuser = None
@@ -267,13 +300,16 @@ class BrokerCommand(object):
             else:
                 plenaries = None
 
-            retval = self.render(user=user, dbuser=dbuser, request=request,
-                                 requestid=requestid, logger=logger,
-                                 plenaries=plenaries, exporter=exporter,
-                                 session=session, **kwargs)
+            with phase_timer("render"):
+                retval = self.render(user=user, dbuser=dbuser,
+                                     request=request, requestid=requestid,
+                                     logger=logger, plenaries=plenaries,
+                                     exporter=exporter, session=session,
+                                     **kwargs)
             if self.requires_format:
                 style = kwargs.get("style", None)
-                retval = self.formatter.format(style, retval, request)
+                with phase_timer("format"):
+                    retval = self.formatter.format(style, retval, request)
             if session:
                 with exporter:
                     session.commit()
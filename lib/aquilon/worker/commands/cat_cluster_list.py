@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Contains the logic for `aq cat --cluster_list`."""
+
+from aquilon.exceptions_ import ArgumentError
+from aquilon.aqdb.model import Cluster
+from aquilon.aqdb.utils.bulk_lookup import key_chunks, in_keys
+from aquilon.worker.dbwrappers.host import check_hostlist_size
+from aquilon.worker.commands.cat_list import CommandCatList
+from aquilon.worker.templates import PlenaryCluster
+
+
+class CommandCatClusterList(CommandCatList):
+
+    required_parameters = ["cluster_list"]
+
+    def get_objects(self, session, cluster_list, **_):
+        check_hostlist_size(self.command, self.config, cluster_list)
+
+        names = set(name.strip().lower() for name in cluster_list)
+        dbclusters = []
+        for name_chunk in key_chunks(session, sorted(names)):
+            q = session.query(Cluster)
+            q = q.filter(in_keys(session, Cluster.name, name_chunk))
+            q = q.options(*PlenaryCluster.query_options())
+            dbclusters.extend(q)
+
+        missing = names.difference(dbcluster.name for dbcluster in dbclusters)
+        if missing:
+            raise ArgumentError("Cluster(s) not found: %s" %
+                                ", ".join(sorted(missing)))
+
+        return dbclusters
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Contains the logic for `aq cat --list`."""
+
+import json
+
+from aquilon.exceptions_ import IncompleteError, NotFoundException
+from aquilon.worker.broker import BrokerCommand
+from aquilon.worker.dbwrappers.host import (hostlist_to_hosts,
+                                            check_hostlist_size,
+                                            preload_hw_data)
+from aquilon.worker.templates import Plenary, PlenaryCollection, PlenaryHost
+
+
+def walk_plenaries(plenary):
+    if isinstance(plenary, PlenaryCollection):
+        for plen in plenary.plenaries:
+            for plen2 in walk_plenaries(plen):
+                yield plen2
+    else:
+        yield plenary
+
+
+class CommandCatList(BrokerCommand):
+
+    required_parameters = ["list"]
+
+    # We do not lock the plenaries while reading them
+    _is_lock_free = True
+
+    def get_objects(self, session, list, **_):
+        check_hostlist_size(self.command, self.config, list)
+        dbhosts = hostlist_to_hosts(session, list, PlenaryHost.query_options())
+        preload_hw_data(session, dbhosts)
+        return dbhosts
+
+    def render(self, session, logger, generate, json_map, **arguments):
+        dbobjs = self.get_objects(session, **arguments)
+
+        templates = {}
+        for dbobj in dbobjs:
+            plenary = Plenary.get_plenary(dbobj, logger=logger)
+            for plen in walk_plenaries(plenary):
+                name = plen.template_name(plen.dbobj)
+                try:
+                    if generate:
+                        templates[name] = plen._generate_content()
+                    else:
+                        templates[name] = plen.read()
+                except (IncompleteError, NotFoundException) as err:
+                    logger.client_info("Warning: %s", err)
+
+        if json_map:
+            return json.dumps(templates, sort_keys=True, indent=4)
+        else:
+            return "\n".join(templates[name] for name in sorted(templates))
@@ -25,25 +25,32 @@ from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.dbwrappers.branch import get_branch_and_author
 from aquilon.worker.locks import CompileKey
 from aquilon.worker.templates import PlenaryPersonalityBase
-from aquilon.worker.templates.domain import TemplateDomain
+from aquilon.worker.templates.domain import TemplateDomain, DomainSnapshot
 
 
 class CommandCompile(BrokerCommand):
     requires_plenaries = True
 
     required_parameters = []
+    admission_class = "compile"
     requires_readonly = True
 
     def render(self, session, logger, plenaries, domain, sandbox,
-               pancinclude, pancexclude, pancdebug, cleandeps, **_):
+               pancinclude, pancexclude, pancdebug, cleandeps, snapshot=False,
+               **_):
         template_domain = self._get_template_domain(
             session, logger, domain, plenaries, sandbox)
         if pancdebug:
             pancinclude = r'.*'
             pancexclude = r'components/spma/functions.*'
-        self._compile_template_domain(session, logger, template_domain,
-                                      plenaries,
-                                      pancexclude, pancinclude, cleandeps)
+        if snapshot:
+            self._compile_snapshot(session, logger, template_domain,
+                                   plenaries,
+                                   pancexclude, pancinclude, cleandeps)
+        else:
+            self._compile_template_domain(session, logger, template_domain,
+                                          plenaries,
+                                          pancexclude, pancinclude, cleandeps)
 
     @staticmethod
     def _get_template_domain(session, logger, domain, plenaries, sandbox):
@@ -88,3 +95,36 @@ class CommandCompile(BrokerCommand):
                                     panc_debug_include=pancinclude,
                                     panc_debug_exclude=pancexclude,
                                     cleandeps=cleandeps)
+
+    @staticmethod
+    def _compile_snapshot(session, logger, template_domain, plenaries,
+                          pancexclude, pancinclude, cleandeps):
+        # The lock is only held while taking the snapshot and while publishing
+        # the results, so other commands can modify the domain while the
+        # compiler is running
+        def domain_key():
+            return CompileKey.merge(
+                [CompileKey(domain=template_domain.domain.name,
+                            logger=logger),
+                 plenaries.get_key(exclusive=False)])
+
+        snapshot = DomainSnapshot(template_domain, logger=logger)
+        try:
+            with domain_key():
+                snapshot.take()
+
+            template_domain.compile(session,
+                                    panc_debug_include=pancinclude,
+                                    panc_debug_exclude=pancexclude,
+                                    cleandeps=cleandeps, snapshot=snapshot)
+
+            with domain_key():
+                changed = snapshot.publish()
+                if changed:
+                    logger.client_info("Recompiling %d profiles changed "
+                                       "since the snapshot." % len(changed))
+                    template_domain.compile(session, only=changed,
+                                            panc_debug_include=pancinclude,
+                                            panc_debug_exclude=pancexclude)
+        finally:
+            snapshot.discard()
@@ -25,6 +25,7 @@ class CommandCompileCluster(BrokerCommand):
     requires_plenaries = True
 
     required_parameters = ["cluster"]
+    admission_class = "compile"
     requires_readonly = True
 
     def render(self, session, logger, plenaries, cluster, metacluster,
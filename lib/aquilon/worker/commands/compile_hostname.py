@@ -24,6 +24,7 @@ from aquilon.worker.templates import Plenary, TemplateDomain
 class CommandCompileHostname(BrokerCommand):
 
     required_parameters = ["hostname"]
+    admission_class = "compile"
     requires_readonly = True
 
     def render_old(self, session, logger, hostname, pancinclude, pancexclude,
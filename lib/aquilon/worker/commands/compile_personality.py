@@ -29,6 +29,7 @@ class CommandCompilePersonality(BrokerCommand):
     requires_plenaries = True
 
     required_parameters = ["personality"]
+    admission_class = "compile"
     requires_readonly = True
 
     def render(self, session, logger, plenaries, domain, sandbox, archetype, personality,
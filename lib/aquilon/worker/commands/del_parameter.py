@@ -15,9 +15,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from jsonschema import validate, ValidationError
+from jsonschema import ValidationError
 
 from aquilon.exceptions_ import NotFoundException, ArgumentError
+from aquilon.utils import get_schema_validator
 from aquilon.worker.broker import BrokerCommand  # pylint: disable=W0611
 from aquilon.worker.commands.add_parameter import CommandAddParameter
 from aquilon.worker.dbwrappers.parameter import validate_rebuild_required
@@ -44,7 +45,8 @@ class CommandDelParameter(CommandAddParameter):
         elif db_paramdef.schema:
             new_value = parameter.get_path(db_paramdef.path, compel=False)
             if new_value is not None:
+                validator = get_schema_validator(db_paramdef.schema)
                 try:
-                    validate(new_value, db_paramdef.schema)
+                    validator.validate(new_value)
                 except ValidationError as err:
                     raise ArgumentError(err)
@@ -49,6 +49,7 @@ _git_strategies = {
 class CommandDeploy(BrokerCommand):
 
     required_parameters = ["source", "target"]
+    admission_class = "compile"
 
     def render(self, session, logger, source, target, sync, dryrun,
                merge_strategy, strategy_options, justification, reason, user,
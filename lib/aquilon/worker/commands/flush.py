@@ -80,6 +80,7 @@ from aquilon.utils import ProgressReport
 
 
 class CommandFlush(BrokerCommand):
+    admission_class = "compile"
 
     def preload_resources(self, session, res_cache, holder_cache, classes=None):
         # Load the most common resource types. Using
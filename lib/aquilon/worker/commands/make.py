@@ -31,6 +31,7 @@ class CommandMake(BrokerCommand):
     requires_plenaries = True
 
     required_parameters = ["hostname"]
+    admission_class = "compile"
 
     def render(self, session, logger, plenaries, hostname, osname, osversion, archetype,
                personality, personality_stage, buildstatus, keepbindings, grn,
@@ -28,6 +28,7 @@ class CommandMakeClusterCluster(BrokerCommand):
     requires_plenaries = True
 
     required_parameters = ["cluster"]
+    admission_class = "compile"
 
     def render(self, session, logger, plenaries, cluster, metacluster, keepbindings,
                justification, reason, user, **arguments):
@@ -103,6 +103,7 @@ class CommandManageList(BrokerCommand):
     requires_plenaries = True
 
     required_parameters = ["list"]
+    admission_class = "compile"
 
     def get_objects(self, session, list, **_):
         check_hostlist_size(self.command, self.config, list)
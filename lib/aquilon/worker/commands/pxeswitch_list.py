@@ -17,9 +17,14 @@
 
 from tempfile import NamedTemporaryFile
 from collections import defaultdict
+from threading import Thread
 import os.path
 
-from aquilon.exceptions_ import ArgumentError
+from six.moves.queue import Queue, Empty  # pylint: disable=F0401
+from twisted.python import context
+from twisted.python.log import callWithContext, ILogContext
+
+from aquilon.exceptions_ import ArgumentError, PartialError
 from aquilon.aqdb.model import Service
 from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.dbwrappers.host import (hostlist_to_hosts,
@@ -99,34 +104,88 @@ class CommandPXESwitchList(BrokerCommand):
             raise ArgumentError("Invalid hosts in list:\n%s" %
                                 "\n".join(failed))
 
-        for (si, hostlist) in hosts_per_instance.items():
-            # create temporary file, point aii-installfe at that file.
-            groupargs = args[:]
-            with NamedTemporaryFile() as tmpfile:
-                tmpfile.writelines(x.fqdn + "\n" for x in hostlist)
-                tmpfile.flush()
-
-                for (option, mapped) in self._option_map.items():
-                    if arguments[option]:
-                        groupargs.append(mapped)
-                        groupargs.append(tmpfile.name)
-
-                servers = []
-                for srv in si.servers:
-                    # The primary name is the address to be used for delivering
-                    # configuration to a host, so we should use that even if the
-                    # service itself is bound to a different IP address
-                    if srv.host:
-                        servers.append(srv.host.fqdn)
-                    else:
-                        servers.append(srv.fqdn)
-
-                groupargs.append("--servers")
-                groupargs.append(" ".join("%s@%s" % (install_user, s) for s in servers))
-
-                # It would be nice to connect to connect to the servers of
-                # different instances in parallel, however, we need to avoid
-                # calling AII for the same host simultaneously due to
-                # concurrency issues in AII
-                with ExternalKey("pxeswitch", hostlist, logger=logger):
-                    run_command(groupargs, logger=logger, stream_level=CLIENT_INFO)
+        jobs = []
+        for (si, hostlist) in sorted(hosts_per_instance.items(),
+                                     key=lambda item: item[0].name):
+            servers = []
+            for srv in si.servers:
+                # The primary name is the address to be used for delivering
+                # configuration to a host, so we should use that even if the
+                # service itself is bound to a different IP address
+                if srv.host:
+                    servers.append(srv.host.fqdn)
+                else:
+                    servers.append(srv.fqdn)
+
+            # Everything the worker threads need is computed here, so they do
+            # not have to touch the session
+            jobs.append((str(si.name), [str(dbhost) for dbhost in hostlist],
+                         [dbhost.fqdn for dbhost in hostlist], servers))
+
+        # Every host is bound to a single bootserver instance, so the batches
+        # of different instances never share a host, and they can run in
+        # parallel. The lock still protects against other requests touching
+        # the same hosts, because AII cannot handle that.
+        results = {}
+        ctx = (context.get(ILogContext) or {}).copy()
+        queue = Queue()
+        for job in jobs:
+            queue.put(job)
+
+        def worker():
+            while True:
+                try:
+                    name, keys, fqdns, servers = queue.get_nowait()
+                except Empty:
+                    return
+                try:
+                    callWithContext(ctx, self._run_instance, logger, args,
+                                    install_user, keys, fqdns, servers,
+                                    arguments)
+                    results[name] = None
+                except Exception as err:
+                    results[name] = err
+
+        parallel = self.config.getint("broker", "pxeswitch_parallel_instances")
+        threads = [Thread(target=worker)
+                   for _ in range(min(max(parallel, 1), len(jobs)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if len(jobs) == 1 and results[jobs[0][0]]:
+            raise results[jobs[0][0]]
+
+        success = []
+        failed = []
+        for name, _, fqdns, _ in jobs:
+            if results[name]:
+                failed.append("Bootserver instance %s: %d hosts, failed: %s" %
+                              (name, len(fqdns), results[name]))
+            else:
+                msg = "Bootserver instance %s: %d hosts" % (name, len(fqdns))
+                logger.client_info(msg + ", succeeded.")
+                success.append(msg)
+        if failed:
+            raise PartialError(success, failed)
+
+    def _run_instance(self, logger, args, install_user, keys, fqdns, servers,
+                      arguments):
+        # create temporary file, point aii-installfe at that file.
+        groupargs = args[:]
+        with NamedTemporaryFile() as tmpfile:
+            tmpfile.writelines(fqdn + "\n" for fqdn in fqdns)
+            tmpfile.flush()
+
+            for (option, mapped) in self._option_map.items():
+                if arguments[option]:
+                    groupargs.append(mapped)
+                    groupargs.append(tmpfile.name)
+
+            groupargs.append("--servers")
+            groupargs.append(" ".join("%s@%s" % (install_user, s)
+                                      for s in servers))
+
+            with ExternalKey("pxeswitch", keys, logger=logger):
+                run_command(groupargs, logger=logger, stream_level=CLIENT_INFO)
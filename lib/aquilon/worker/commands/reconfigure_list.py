@@ -72,6 +72,7 @@ class CommandReconfigureList(BrokerCommand):
     requires_plenaries = True
 
     required_parameters = ["list"]
+    admission_class = "compile"
 
     def get_hostlist(self, session, list, **arguments):   # pylint: disable=W0613
         check_hostlist_size(self.command, self.config, list)
@@ -24,10 +24,11 @@ from aquilon.worker.locks import SyncKey
 class CommandRefreshUser(BrokerCommand):
     requires_plenaries = True
 
-    def render(self, session, logger, plenaries, incremental, ignore_delete_limit, **_):
+    def render(self, session, logger, plenaries, incremental,
+               ignore_delete_limit, bulk, **_):
         with SyncKey(data="user", logger=logger):
             sync = UserSync(self.config, session, logger, plenaries,
-                            incremental, ignore_delete_limit)
+                            incremental, ignore_delete_limit, bulk)
             sync.refresh_user()
 
         return
@@ -39,7 +39,8 @@ class CommandSearchAudit(BrokerCommand):
     required_parameters = []
 
     def render(self, session, logger, keyword, argument, username, command,
-               before, after, forever, return_code, limit, reverse_order, **_):
+               before, after, forever, return_code, limit, reverse_order,
+               page_size, continuation, request, **_):
         """Render the search_audit command.
 
         Please see the abstract method defined in the superclass of this
@@ -68,6 +69,10 @@ class CommandSearchAudit(BrokerCommand):
                               oldest records and not the newest.
                               (a flag, any value that evaluates to True or
                               False)
+        :param page_size: Return the results in pages of this size, instead of
+                          applying the limit (None or int)
+        :param continuation: The continuation token of the page to return
+                             (None or str)
 
         :return: a list of all results represented by the computed SQLAlchemy
                  Query object
@@ -163,6 +168,19 @@ class CommandSearchAudit(BrokerCommand):
                 q = q.filter_by(name=str(argument))
             q = q.reset_joinpoint()
 
+        if page_size or continuation:
+            if limit is not None:
+                raise ArgumentError("The limit option cannot be used "
+                                    "together with paging.")
+            # Pages follow each other the same way as the records selected by
+            # the limit below, and the records within a page are presented
+            # the same way too
+            xtns = self.paginate(request, q, [Xtn.start_time, Xtn.id],
+                                 page_size, continuation,
+                                 descending=not reverse_order)
+            xtns.reverse()
+            return xtns
+
         # Set an order by when searching for the records, this controls
         # which records are selected by the limit.
         if reverse_order:
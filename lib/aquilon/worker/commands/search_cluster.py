@@ -21,7 +21,7 @@ from sqlalchemy.sql import or_
 
 from aquilon.exceptions_ import NotFoundException
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 from aquilon.aqdb.model import (Cluster, MetaCluster, ClusterGroup, Archetype,
                                 Personality, PersonalityStage, Machine, Host,
                                 NetworkDevice, HardwareEntity, ClusterLifecycle,
@@ -272,4 +272,4 @@ class CommandSearchCluster(BrokerCommand):
 
         if fullinfo or style != "raw":
             return q.all()
-        return StringAttributeList(q.all(), "name")
+        return StringAttributeStream(q, "name")
@@ -35,7 +35,8 @@ from aquilon.aqdb.model import (
 from aquilon.aqdb.model.dns_domain import parse_fqdn
 from aquilon.aqdb.model.network_environment import get_net_dns_envs
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import (StringAttributeList,
+                                         StringAttributeStream)
 from aquilon.worker.formats.dns_record import DnsDump
 
 from sqlalchemy.orm import (contains_eager, undefer, subqueryload, lazyload,
@@ -77,8 +78,8 @@ class CommandSearchDns(BrokerCommand):
     def render(self, session, fqdn, dns_domain, shortname,
                record_type, ip, network, network_environment, target,
                target_domain, target_environment, primary_name, used,
-               reverse_override, reverse_ptr, fullinfo, style,
-               **kwargs):
+               reverse_override, reverse_ptr, fullinfo, style, page_size,
+               continuation, request, **kwargs):
 
         # Figure out if we can restrict the types of DNS records based on the
         # options
@@ -263,12 +264,23 @@ class CommandSearchDns(BrokerCommand):
 
             q = q.reset_joinpoint()
 
+        # Paging needs a unique sort key, so add the primary key to the
+        # ordering used above
+        paged = page_size or continuation
+        sort_key = [Fqdn.name, DnsDomain.name, DnsRecord.id]
+
         if fullinfo or style != "raw":
             q = q.options(undefer('comments'),
                           subqueryload('hardware_entity'),
                           lazyload('hardware_entity.primary_name'),
                           undefer('alias_cnt'),
                           undefer('address_alias_cnt'))
+            if paged:
+                dbdns_recs = self.paginate(request, q, sort_key, page_size,
+                                           continuation)
+            else:
+                dbdns_recs = q.all()
+
             if style == 'proto':
                 if target_domain:
                     dns_domains = [dbdns_domain]
@@ -277,7 +289,11 @@ class CommandSearchDns(BrokerCommand):
                     # them being evicted from the session's cache
                     dns_domains = session.query(DnsDomain).all()
 
-                return DnsDump(q.all(), dns_domains)
-            return q.all()
+                return DnsDump(dbdns_recs, dns_domains)
+            return dbdns_recs
+        elif paged:
+            dbdns_recs = self.paginate(request, q, sort_key, page_size,
+                                       continuation)
+            return StringAttributeList(dbdns_recs, 'fqdn')
         else:
-            return StringAttributeList(q.all(), 'fqdn')
+            return StringAttributeStream(q, 'fqdn')
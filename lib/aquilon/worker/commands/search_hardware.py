@@ -22,7 +22,7 @@ from aquilon.aqdb.model import HardwareEntity
 from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.dbwrappers.hardware_entity import (
     search_hardware_entity_query)
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandSearchHardware(BrokerCommand):
@@ -43,4 +43,4 @@ class CommandSearchHardware(BrokerCommand):
             return q.all()
         else:
             q = search_hardware_entity_query(session, HardwareEntity.label, **arguments)
-            return StringAttributeList(q.all(), "label")
+            return StringAttributeStream(q, "label")
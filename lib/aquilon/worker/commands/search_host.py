@@ -31,8 +31,7 @@
 # limitations under the License.
 """Contains the logic for `aq search host`."""
 
-from sqlalchemy.orm import (aliased, contains_eager, joinedload, subqueryload,
-                            undefer)
+from sqlalchemy.orm import aliased, contains_eager
 from sqlalchemy.sql import and_, or_, null
 
 from aquilon.exceptions_ import NotFoundException
@@ -47,7 +46,9 @@ from aquilon.aqdb.model import (Host, Cluster, Archetype, Personality,
                                 HostEnvironment, User, Branch)
 from aquilon.aqdb.model.dns_domain import parse_fqdn
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.formatters import ObjectFormatter
+from aquilon.worker.formats.list import (StringAttributeList,
+                                         StringAttributeStream)
 from aquilon.worker.dbwrappers.branch import get_branch_and_author
 from aquilon.worker.dbwrappers.grn import lookup_grn
 from aquilon.worker.dbwrappers.host import preload_hw_data
@@ -67,7 +68,8 @@ class CommandSearchHost(BrokerCommand):
                sandbox, branch, sandbox_author, dns_domain, shortname, mac, ip,
                networkip, network_environment, exact_location, metacluster,
                server_of_service, server_of_instance, grn, eon_id, fullinfo,
-               orphaned, style, **arguments):
+               orphaned, style, page_size, continuation, request,
+               **arguments):
         dbnet_env = NetworkEnvironment.get_unique_or_default(session,
                                                              network_environment)
 
@@ -320,27 +322,23 @@ class CommandSearchHost(BrokerCommand):
                              Host.personality_stage_id.in_(persq.subquery())))
             q = q.reset_joinpoint()
 
+        # Paging needs a unique sort key, so add the primary key to the
+        # ordering used above
+        paged = page_size or continuation
+        sort_key = [PriFqdn.name, PriDomain.name, Host.hardware_entity_id]
+
         if fullinfo or style != "raw":
-            q = q.options(joinedload('personality_stage'),
-                          joinedload('personality_stage.personality'),
-                          undefer('personality_stage.personality.archetype.comments'),
-                          subqueryload('personality_stage.grns'),
-                          subqueryload('grns'),
-                          subqueryload('services_used'),
-                          subqueryload('services_provided'),
-                          joinedload('resholder'),
-                          subqueryload('resholder.resources'),
-                          joinedload('_cluster'),
-                          subqueryload('_cluster.cluster'),
-                          joinedload('hardware_entity.model'),
-                          subqueryload('hardware_entity.interfaces'),
-                          subqueryload('hardware_entity.interfaces.assignments'),
-                          subqueryload('hardware_entity.interfaces.assignments.dns_records'),
-                          joinedload('hardware_entity.interfaces.assignments.network'),
-                          joinedload('hardware_entity.location'),
-                          subqueryload('hardware_entity.location.parents'))
-            dbhosts = q.all()
+            q = q.options(*ObjectFormatter.redirect_query_options(Host, style))
+            if paged:
+                dbhosts = self.paginate(request, q, sort_key, page_size,
+                                        continuation)
+            else:
+                dbhosts = q.all()
             preload_hw_data(session, dbhosts)
             return dbhosts
+        elif paged:
+            dbhosts = self.paginate(request, q, sort_key, page_size,
+                                    continuation)
+            return StringAttributeList(dbhosts, "fqdn")
 
-        return StringAttributeList(q.all(), "fqdn")
+        return StringAttributeStream(q, "fqdn")
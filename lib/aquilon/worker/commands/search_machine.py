@@ -29,7 +29,7 @@ from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.dbwrappers.hardware_entity import (
     search_hardware_entity_query)
 from aquilon.worker.dbwrappers.host import hostname_to_host
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandSearchMachine(BrokerCommand):
@@ -159,4 +159,4 @@ class CommandSearchMachine(BrokerCommand):
                           subqueryload('host._cluster'),
                           joinedload('host._cluster.cluster'))
             return q.all()
-        return StringAttributeList(q.all(), "label")
+        return StringAttributeStream(q, "label")
@@ -21,7 +21,7 @@ from sqlalchemy.sql import or_
 
 from aquilon.exceptions_ import NotFoundException
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 from aquilon.aqdb.model import (Cluster, MetaCluster, Archetype, Personality,
                                 PersonalityStage, ClusterLifecycle, Service,
                                 ServiceInstance, Share, ClusterResource,
@@ -209,4 +209,4 @@ class CommandSearchMetaCluster(BrokerCommand):
 
         if fullinfo or style != "raw":
             return q.all()
-        return StringAttributeList(q.all(), "name")
+        return StringAttributeStream(q, "name")
@@ -22,7 +22,7 @@ from aquilon.aqdb.model import (NetworkDevice, DnsRecord, Fqdn, DnsDomain,
                                 NetworkDeviceChassisSlot, Chassis)
 from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.dbwrappers.hardware_entity import search_hardware_entity_query
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandSearchNetworkDevice(BrokerCommand):
@@ -84,4 +84,4 @@ class CommandSearchNetworkDevice(BrokerCommand):
                           # checks for their existence anyway
                           joinedload('model.machine_specs'))
             return q.all()
-        return StringAttributeList(q.all(), "printable_name")
+        return StringAttributeStream(q, "printable_name")
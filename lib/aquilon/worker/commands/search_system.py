@@ -18,7 +18,7 @@
 
 from aquilon.aqdb.model import DnsRecord
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 from aquilon.worker.dbwrappers.system import search_system_query
 
 
@@ -33,4 +33,4 @@ class CommandSearchSystem(BrokerCommand):
         q = search_system_query(session, DnsRecord, **arguments)
         if fullinfo or style != "raw":
             return q.all()
-        return StringAttributeList(q.all(), 'fqdn')
+        return StringAttributeStream(q, 'fqdn')
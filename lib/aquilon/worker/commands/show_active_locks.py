@@ -16,10 +16,21 @@
 # limitations under the License.
 """Contains the logic for `aq show active locks`."""
 
+from time import time
+
 from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.locks import lock_queue
 
 
+def _describe(key):
+    description = "Defunct lock: "
+    if hasattr(key.logger, "get_status"):
+        status = key.logger.get_status()
+        if status and status.description:
+            description = status.description + ' '
+    return "%s%s %s" % (description, key.state, key)
+
+
 class CommandShowActiveLocks(BrokerCommand):
 
     requires_transaction = False
@@ -27,13 +38,27 @@ class CommandShowActiveLocks(BrokerCommand):
     # Even though this class imports lock_queue, it doesn't take any locks!
     _is_lock_free = True
 
-    def render(self, **_):
+    def render(self, stats=False, **_):
         retval = []
+        now = time()
         for key in lock_queue.queue[:]:
-            description = "Defunct lock: "
-            if hasattr(key.logger, "get_status"):
-                status = key.logger.get_status()
-                if status and status.description:
-                    description = status.description + ' '
-            retval.append("%s%s %s" % (description, key.state, key))
+            held = key.held(now)
+            if held is None:
+                timing = "waiting %.2fs" % (key.waited(now) or 0)
+            else:
+                timing = "held %.2fs, waited %.2fs" % (held, key.waited(now))
+            retval.append("%s (%s)" % (_describe(key), timing))
+            if held is None:
+                for blocker in key.blocked_by:
+                    retval.append("    Blocked by: %s" % _describe(blocker))
+
+        if stats:
+            retval.append("Lock statistics:")
+            for component, data in sorted(lock_queue.statistics().items()):
+                retval.append("    %s: acquired %d times (%d contended), "
+                              "wait total %.2fs max %.2fs, "
+                              "hold total %.2fs max %.2fs" %
+                              (component, data.acquired, data.contended,
+                               data.wait_total, data.wait_max,
+                               data.hold_total, data.hold_max))
         return retval
@@ -20,7 +20,7 @@ from sqlalchemy.orm import contains_eager
 
 from aquilon.aqdb.model import Chassis, DnsRecord, DnsDomain, Fqdn
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandShowChassisAll(BrokerCommand):
@@ -41,4 +41,4 @@ class CommandShowChassisAll(BrokerCommand):
         if style == 'proto':
             return q.all()
         else:
-            return StringAttributeList(q.all(), "fqdn")
+            return StringAttributeStream(q, "fqdn")
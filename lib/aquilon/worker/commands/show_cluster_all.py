@@ -18,7 +18,7 @@
 
 from aquilon.aqdb.model import Cluster
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandShowClusterAll(BrokerCommand):
@@ -29,4 +29,4 @@ class CommandShowClusterAll(BrokerCommand):
         q = session.query(self.query_class.name).order_by(self.query_class.name)
         if self.query_class == Cluster:
             q = q.filter(Cluster.cluster_type != 'meta')
-        return StringAttributeList(q.all(), "name")
+        return StringAttributeStream(q, "name")
@@ -20,7 +20,7 @@ from sqlalchemy.orm import contains_eager
 
 from aquilon.aqdb.model import ConsoleServer, DnsRecord, DnsDomain, Fqdn
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandShowConsoleServerAll(BrokerCommand):
@@ -37,4 +37,4 @@ class CommandShowConsoleServerAll(BrokerCommand):
                       contains_eager('primary_name.fqdn'),
                       contains_eager('primary_name.fqdn.dns_domain'))
         q = q.order_by(Fqdn.name, DnsDomain.name, ConsoleServer.label)
-        return StringAttributeList(q.all(), "fqdn")
+        return StringAttributeStream(q, "fqdn")
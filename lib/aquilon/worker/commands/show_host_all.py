@@ -20,7 +20,7 @@ from sqlalchemy.orm import contains_eager, lazyload
 
 from aquilon.aqdb.model import Host, HardwareEntity, DnsRecord, DnsDomain, Fqdn
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandShowHostAll(BrokerCommand):
@@ -36,4 +36,4 @@ class CommandShowHostAll(BrokerCommand):
                       contains_eager('hardware_entity.primary_name.fqdn'),
                       contains_eager('hardware_entity.primary_name.fqdn.dns_domain'))
         q = q.order_by(Fqdn.name, DnsDomain.name)
-        return StringAttributeList(q.all(), "fqdn")
+        return StringAttributeStream(q, "fqdn")
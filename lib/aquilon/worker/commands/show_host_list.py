@@ -16,35 +16,17 @@
 # limitations under the License.
 """Contains the logic for `aq show host --list`."""
 
-from sqlalchemy.orm import joinedload, subqueryload, undefer
-
+from aquilon.aqdb.model import Host
 from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.dbwrappers.host import (hostlist_to_hosts,
                                             preload_hw_data)
+from aquilon.worker.formats.formatters import ObjectFormatter
 
 
 class CommandShowHostList(BrokerCommand):
 
-    def render(self, session, list, **_):
-        options = [undefer('comments'),
-                   joinedload('personality_stage'),
-                   joinedload('personality_stage.personality'),
-                   undefer('personality_stage.personality.archetype.comments'),
-                   subqueryload('personality_stage.grns'),
-                   subqueryload('grns'),
-                   subqueryload('services_used'),
-                   subqueryload('services_provided'),
-                   joinedload('resholder'),
-                   subqueryload('resholder.resources'),
-                   joinedload('_cluster'),
-                   subqueryload('_cluster.cluster'),
-                   joinedload('hardware_entity.model'),
-                   subqueryload('hardware_entity.interfaces'),
-                   subqueryload('hardware_entity.interfaces.assignments'),
-                   subqueryload('hardware_entity.interfaces.assignments.dns_records'),
-                   joinedload('hardware_entity.interfaces.assignments.network'),
-                   joinedload('hardware_entity.location'),
-                   subqueryload('hardware_entity.location.parents')]
+    def render(self, session, list, style, **_):
+        options = ObjectFormatter.redirect_query_options(Host, style)
         dbhosts = hostlist_to_hosts(session, list, options)
         preload_hw_data(session, dbhosts)
 
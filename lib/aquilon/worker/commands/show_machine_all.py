@@ -18,7 +18,7 @@
 
 from aquilon.aqdb.model import Machine
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandShowMachineAll(BrokerCommand):
@@ -26,4 +26,4 @@ class CommandShowMachineAll(BrokerCommand):
     def render(self, session, **_):
         q = session.query(Machine.label)
         q = q.order_by(Machine.label)
-        return StringAttributeList(q.all(), "label")
+        return StringAttributeStream(q, "label")
@@ -18,11 +18,11 @@
 
 from aquilon.aqdb.model import MetaCluster
 from aquilon.worker.broker import BrokerCommand
-from aquilon.worker.formats.list import StringAttributeList
+from aquilon.worker.formats.list import StringAttributeStream
 
 
 class CommandShowMetaClusterAll(BrokerCommand):
 
     def render(self, session, **_):
         q = session.query(MetaCluster.name).order_by(MetaCluster.name)
-        return StringAttributeList(q.all(), "name")
+        return StringAttributeStream(q, "name")
@@ -16,8 +16,9 @@
 # limitations under the License.
 """Contains the logic for `aq update alias`."""
 
-from aquilon.exceptions_ import ArgumentError, NotFoundException
+from aquilon.exceptions_ import ArgumentError
 from aquilon.aqdb.model import Alias, DnsEnvironment
+from aquilon.aqdb.model.alias import AliasGraph
 from aquilon.worker.broker import BrokerCommand
 from aquilon.worker.dbwrappers.dns import (create_target_if_needed,
                                            delete_target_if_needed)
@@ -66,29 +67,24 @@ class CommandUpdateAlias(BrokerCommand):
                                     .format(fqdn))
 
             old_target = dbalias.target
-
-            # see if the new target is an alias: if so, check we're not
-            # creating a loop
-            try:
-                ntalias = Alias.get_unique(session, fqdn=target,
-                                           dns_environment=dbdns_env, compel=True)
-            except NotFoundException:
-                ntalias = None
-
-            if ntalias is not None:
-                if fqdn in ntalias.get_alias_targets():
-                    raise ArgumentError("Cannot alias {0} to {1}, as that "
-                                        "is an alias of {0}"
-                                        .format(fqdn, target))
-                # Ensure max alias depth requirement not breached
-                if ntalias.alias_depth + 1 > Alias.MAX_ALIAS_DEPTH:
-                    raise ArgumentError("Maximum alias depth would be exceeded - "
-                                        "new target is an alias.")
-                if any([al.alias_depth + ntalias.alias_depth >
-                        Alias.MAX_ALIAS_DEPTH for al in dbalias.all_aliases]):
-                    raise ArgumentError("Maximum alias depth would be exceeded - "
-                                        "new target is an alias.")
-            dbalias.target = create_target_if_needed(session, logger, target, dbtgt_env)
+            dbtarget = create_target_if_needed(session, logger, target,
+                                               dbtgt_env)
+
+            # If the new target is an alias, check we're not creating a loop,
+            # and that the longest chain going through this alias stays
+            # within the limit
+            graph = AliasGraph(session)
+            graph.load([dbtarget])
+            graph.load_aliases([dbalias.fqdn])
+            if graph.reaches(dbtarget, dbalias.fqdn):
+                raise ArgumentError("Cannot alias {0} to {1}, as that "
+                                    "is an alias of {0}"
+                                    .format(fqdn, target))
+            if graph.height(dbalias.fqdn) + 1 + graph.depth(dbtarget) > \
+               Alias.MAX_ALIAS_DEPTH:
+                raise ArgumentError("Maximum alias depth would be exceeded - "
+                                    "new target is an alias.")
+            dbalias.target = dbtarget
 
             # TODO: at some day we should verify that the new target is also
             # bound as a server, and modify the ServiceInstanceServer bindings
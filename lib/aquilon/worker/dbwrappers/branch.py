@@ -49,6 +49,7 @@ from aquilon.utils import (
 from aquilon.worker.dbwrappers.user_principal import get_user_principal
 from aquilon.worker.processes import (
     GitRepo,
+    clone_pool,
     run_git
 )
 from aquilon.worker.locks import CompileKey
@@ -232,6 +233,8 @@ def remove_branch(logger, dbbranch, dbauthor=None):
         for dir in domain.directories():
             remove_dir(dir, logger=logger)
 
+    clone_pool.discard(dbbranch.name, logger=logger)
+
     kingrepo = GitRepo.template_king(logger)
     hash = kingrepo.ref_commit("refs/heads/" + dbbranch.name, compel=False)
     if hash:
@@ -24,9 +24,7 @@ import logging
 import shlex
 
 from aquilon.aqdb.model import (
-    AddressAlias,
     AddressAssignment,
-    Alias,
     Archetype,
     ArchetypeResource,
     ARecord,
@@ -86,7 +84,9 @@ from aquilon.aqdb.model import (
     StorageCluster,
     User,
 )
+from aquilon.aqdb.model.alias import AliasGraph
 from aquilon.aqdb.model.host_environment import Development, UAT, QA, Legacy, Production, Infra
+from aquilon.aqdb.utils.bulk_lookup import key_chunks, in_keys
 from aquilon.config import Config
 from aquilon.exceptions_ import ArgumentError
 from aquilon.exceptions_ import AuthorizationException, InternalError, AquilonError
@@ -391,21 +391,18 @@ class ChangeManagement(object):
         location_children = session.query(Location).get(location.id).children
         loc_ids = [loc.id for loc in location_children] + [location.id]
 
-        # ORA-01795: maximum number of expressions in a list is 1000
-        for i in range(0, len(loc_ids), 1000):
-            chunk_loc_ids = loc_ids[i:i + 1000]
-
+        for chunk_loc_ids in key_chunks(session, loc_ids):
             q = session.query(Host).join(
                 HardwareEntity,
                 Host.hardware_entity_id == HardwareEntity.id).join(
                     Location,
                     HardwareEntity.location_id == Location.id).filter(
-                        Location.id.in_(chunk_loc_ids))
+                        in_keys(session, Location.id, chunk_loc_ids))
 
             q1 = session.query(Cluster).join(
                 Location,
                 Cluster.location_constraint_id == Location.id).filter(
-                    Location.id.in_(chunk_loc_ids))
+                    in_keys(session, Location.id, chunk_loc_ids))
 
             q = q.reset_joinpoint()
             q = q.join(HostLifecycle).options(contains_eager('status'))
@@ -515,30 +512,12 @@ class ChangeManagement(object):
 
     def validate_fqdn(self, dbfqdn):
         # Check full depth of fqdn aliases or address_alias!
-        def dig_to_real_target(dbfqdn):
-            fqdns_to_test = [dbfqdn]
-            fqdns_tested = list()
-            final_target = dbfqdn
-            while fqdns_to_test:
-                to_test_now = []
-                for db_fqdn in fqdns_to_test:
-                    to_test_now.extend(db_fqdn.dns_records)
-                    fqdns_tested.append(db_fqdn)
-                fqdns_to_test = []
-                for rec in to_test_now:
-                    if rec in fqdns_tested:
-                        raise Exception("There might be a loop!!! Failing fast instead.")
-                    if isinstance(rec, AddressAlias):
-                        fqdns_to_test.append(rec.target)
-                    elif isinstance(rec, Alias):
-                        fqdns_to_test.append(rec.target)
-                    else:
-                        final_target = rec.fqdn
-                    fqdns_to_test = list(set(fqdns_to_test))
-            return final_target
-
-        fqdn = dig_to_real_target(dbfqdn)
+        graph = AliasGraph(object_session(dbfqdn))
+        graph.load([dbfqdn])
+        for fqdn in graph.final_targets(dbfqdn):
+            self._validate_target_fqdn(fqdn)
 
+    def _validate_target_fqdn(self, fqdn):
         CR = aliased(ClusterResource)
         HR = aliased(HostResource)
         S = aliased(ServiceAddress)
@@ -18,13 +18,12 @@
 
 import os.path
 
-from sqlalchemy.orm import contains_eager, subqueryload
+from sqlalchemy.orm import contains_eager
 
 from aquilon.exceptions_ import ArgumentError
 from aquilon.aqdb.model import (FeatureLink, Personality, PersonalityStage,
                                 HardwareFeature, HostFeature, HardwareEntity,
                                 Interface, Host)
-from aquilon.worker.templates import PlenaryHost, PlenaryPersonality
 from aquilon.worker.templates.domain import template_branch_basedir
 
 
@@ -83,16 +82,13 @@ def get_affected_plenaries(session, dbfeature, plenaries,
                            interface_name=None):
     if isinstance(dbfeature, HostFeature):
         if personality_stage:
-            plenaries.add(personality_stage)
+            plenaries.add_dependents(personality_stage, "features")
         else:
             q = session.query(PersonalityStage)
             q = q.join(Personality)
             q = q.filter_by(archetype=archetype)
-            q = q.options(contains_eager('personality'),
-                          subqueryload('personality.root_users'),
-                          subqueryload('personality.root_netgroups'))
-            q = q.options(PlenaryPersonality.query_options(load_personality=False))
-            plenaries.add(q)
+            q = q.options(contains_eager('personality'))
+            plenaries.add_dependents(q, "features")
     else:
         q = session.query(Host)
         if personality_stage:
@@ -125,5 +121,4 @@ def get_affected_plenaries(session, dbfeature, plenaries,
         # outer join
         q = q.join(HardwareEntity.primary_name)
         q = q.options(contains_eager('hardware_entity.primary_name'))
-        q = q.options(PlenaryHost.query_options())
-        plenaries.add(q)
+        plenaries.add_dependents(q, "features")
@@ -34,12 +34,12 @@ from aquilon.aqdb.model import (HardwareEntity, DnsEnvironment, DnsDomain, Fqdn,
                                 VirtualMachine)
 from aquilon.aqdb.model.dns_domain import parse_fqdn
 from aquilon.aqdb.model.feature import hardware_features, host_features
+from aquilon.aqdb.utils.bulk_lookup import key_chunks, in_keys
 from aquilon.worker.dbwrappers.branch import get_branch_and_author
 from aquilon.worker.dbwrappers.feature import check_feature_template
 from aquilon.worker.dbwrappers.grn import lookup_grn
 from aquilon.worker.dbwrappers.service_instance import check_no_provided_service
 from aquilon.worker.templates import PlenaryServiceInstanceServer
-from aquilon.utils import chunk
 
 
 def create_host(session, logger, config, dbhw, dbarchetype, domain=None,
@@ -209,12 +209,12 @@ def hostlist_to_hosts(session, hostlist, query_options=None,
     def look_up_dns_records():
         for dbdns_domain in itervalues(dns_domains):
             short_names = parsed_fqdns[dbdns_domain.name]
-            for name_chunk in chunk(short_names, 1000):
+            for name_chunk in key_chunks(session, short_names):
                 q = session.query(DnsRecord)
                 q = q.with_polymorphic([ARecord, ReservedName])
                 q = q.join(Fqdn, DnsRecord.fqdn_id == Fqdn.id)
                 q = q.filter_by(dns_environment=dbdns_env, dns_domain=dbdns_domain)
-                q = q.filter(Fqdn.name.in_(name_chunk))
+                q = q.filter(in_keys(session, Fqdn.name, name_chunk))
                 q = q.options(contains_eager('fqdn'))
                 for dbdns_rec in q:
                     set_committed_value(dbdns_rec.fqdn, 'dns_domain', dbdns_domain)
@@ -227,12 +227,12 @@ def hostlist_to_hosts(session, hostlist, query_options=None,
 
     def look_up_hosts():
         hosts_by_fqdn = {}
-        for dns_rec_chunk in chunk(dns_records_by_name.values(), 1000):
+        dns_rec_ids = [rec.id for rec in dns_records_by_name.values()]
+        for id_chunk in key_chunks(session, dns_rec_ids):
             q = session.query(Host)
             HWAlias = with_polymorphic(HardwareEntity, [Machine, NetworkDevice])
             q = q.join(HWAlias)
-            q = q.filter(HWAlias.primary_name_id.in_(rec.id for rec in
-                                                     dns_rec_chunk))
+            q = q.filter(in_keys(session, HWAlias.primary_name_id, id_chunk))
             q = q.options(contains_eager(Host.hardware_entity.of_type(HWAlias)))
             if query_options:
                 q = q.options(*query_options)
@@ -293,11 +293,11 @@ def preload_machine_data(session, hw_by_id, machines):
     :return:
     """
 
-    for machine_chunk in chunk(machines, 1000):
+    for machine_chunk in key_chunks(session, machines):
         disks_by_hw = defaultdict(list)
         q = session.query(Disk)
         q = q.options(undefer('comments'))
-        q = q.filter(Disk.machine_id.in_(machine_chunk))
+        q = q.filter(in_keys(session, Disk.machine_id, machine_chunk))
         for dbdisk in q:
             dbhw = hw_by_id[dbdisk.machine_id]
             set_committed_value(dbdisk, "machine", dbhw)
@@ -311,7 +311,8 @@ def preload_machine_data(session, hw_by_id, machines):
                 set_committed_value(dbhw, "disks", [])
 
         q = session.query(MachineChassisSlot)
-        q = q.filter(MachineChassisSlot.machine_id.in_(machine_chunk))
+        q = q.filter(in_keys(session, MachineChassisSlot.machine_id,
+                             machine_chunk))
         slots_by_hw = defaultdict(list)
         for dbslot in q:
             dbhw = hw_by_id[dbslot.machine_id]
@@ -327,7 +328,8 @@ def preload_machine_data(session, hw_by_id, machines):
 
         vms = set()
         q = session.query(VirtualMachine)
-        q = q.filter(VirtualMachine.machine_id.in_(machine_chunk))
+        q = q.filter(in_keys(session, VirtualMachine.machine_id,
+                             machine_chunk))
         for vm in q:
             dbhw = hw_by_id[vm.machine_id]
             set_committed_value(vm, "machine", dbhw)
@@ -347,10 +349,12 @@ def preload_netdev_data(session, hw_by_id, netdevs):
     :param netdevs:
     :return:
     """
-    for netdev_chunk in chunk(netdevs, 1000):
+    for netdev_chunk in key_chunks(session, netdevs):
         slots_by_hw = defaultdict(list)
         q = session.query(NetworkDeviceChassisSlot)
-        q = q.filter(NetworkDeviceChassisSlot.network_device_id.in_(netdev_chunk))
+        q = q.filter(in_keys(session,
+                             NetworkDeviceChassisSlot.network_device_id,
+                             netdev_chunk))
         for dbslot in q:
             dbhw = hw_by_id[dbslot.network_device_id]
             set_committed_value(dbslot, "network_device", dbhw)
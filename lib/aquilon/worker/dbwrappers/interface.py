@@ -348,6 +348,18 @@ def set_port_group_phys(session, dbinterface, port_group_name):
     dbinterface.port_group_name = dbvi.port_group
 
 
+def lock_port_groups(session, port_groups):
+    """
+    Lock the networks of the port groups, and reload their guest counters.
+
+    The counters may have been loaded before the lock was granted, and a
+    concurrent allocation may have changed them since then.
+    """
+    Network.lock_rows(pg.network for pg in port_groups)
+    for pg in port_groups:
+        session.refresh(pg, ["guest_count"])
+
+
 def set_port_group_vm(session, logger, dbinterface, port_group_name):
     dbmachine = dbinterface.hardware_entity
     allocator = get_vm_pg_allocator(dbmachine)
@@ -367,7 +379,7 @@ def set_port_group_vm(session, logger, dbinterface, port_group_name):
             return
 
         # Protect against concurrent allocations
-        selected_pg.network.lock_row()
+        lock_port_groups(session, [selected_pg])
 
         if selected_pg.network.is_at_guest_capacity:
             raise ArgumentError("{0} is full for {1:l}.".format(selected_pg,
@@ -382,7 +394,7 @@ def set_port_group_vm(session, logger, dbinterface, port_group_name):
         selected_capacity = 0
 
         # Protect agains concurrent invocations
-        Network.lock_rows(pg.network for pg in allocator.port_groups)
+        lock_port_groups(session, allocator.port_groups)
 
         used_pgs = set(iface.port_group for iface in dbmachine.interfaces
                        if iface.port_group)
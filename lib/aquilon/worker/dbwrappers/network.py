@@ -21,6 +21,7 @@ from sqlalchemy.sql import and_, update
 
 from aquilon.exceptions_ import NotFoundException
 from aquilon.aqdb.model import Network, AddressAssignment, ARecord
+from aquilon.aqdb.model.vlan import update_guest_counts
 
 
 def get_network_byip(session, ipaddr, environment, query_options=None):
@@ -63,3 +64,6 @@ def fix_foreign_links(session, oldnet, newnet):
     )
     session.expire(oldnet, ['dns_records'])
     session.expire(newnet, ['dns_records'])
+
+    # The bulk update above bypassed the flush hooks maintaining the counters
+    update_guest_counts(session, [oldnet, newnet])
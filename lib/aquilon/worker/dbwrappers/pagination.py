@@ -0,0 +1,161 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Keyset pagination of search results."""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+import json
+from uuid import UUID
+
+from dateutil.parser import parse
+
+from sqlalchemy.sql import and_, or_
+
+from aquilon.exceptions_ import ArgumentError
+
+# HTTP response header carrying the token of the next page
+CONTINUATION_HEADER = "X-Aquilon-Continuation"
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, UUID):
+        return {"uuid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "datetime" in value:
+            return parse(value["datetime"])
+        if "uuid" in value:
+            return UUID(value["uuid"])
+        raise ValueError("Unknown value type")
+    return value
+
+
+def encode_token(scope, values):
+    """
+    Create an opaque continuation token.
+
+    The token records the sort key of the last row returned, and the scope
+    (usually the name of the command), so a token cannot be used to resume a
+    different search.
+    """
+    data = json.dumps([scope, [_encode_value(value) for value in values]],
+                      separators=(",", ":"))
+    return urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_token(scope, token, count):
+    """ Return the sort key values stored in a continuation token. """
+    try:
+        token = str(token)
+        data = urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        token_scope, values = json.loads(data.decode("utf-8"))
+        values = [_decode_value(value) for value in values]
+    except (BinasciiError, TypeError, ValueError, UnicodeError):
+        raise ArgumentError("Invalid continuation token.")
+
+    if token_scope != scope or len(values) != count:
+        raise ArgumentError("The continuation token does not belong to "
+                            "this search.")
+    return values
+
+
+def keyset_filter(columns, values, descending=False):
+    """
+    Return a filter matching the rows sorted after the given key values.
+
+    The leading column is also given as a simple range condition, so the
+    database can use an index on it to skip the rows already returned instead
+    of reading and discarding them.
+    """
+    clauses = []
+    for idx, column in enumerate(columns):
+        conds = [prev == value
+                 for prev, value in zip(columns[:idx], values[:idx])]
+        if descending:
+            conds.append(column < values[idx])
+        else:
+            conds.append(column > values[idx])
+        clauses.append(and_(*conds))
+
+    if descending:
+        bound = columns[0] <= values[0]
+    else:
+        bound = columns[0] >= values[0]
+    return and_(bound, or_(*clauses))
+
+
+def paginate(query, columns, page_size, continuation=None, scope=None,
+             descending=False):
+    """
+    Return one page of the result of a query, and the token of the next page.
+
+    The columns must form a unique sort key of the result, e.g. by having the
+    primary key as the last column. The query is ordered by the columns, and
+    if a continuation token is given, the rows up to and including the one
+    the token was created from are skipped using a keyset predicate instead
+    of OFFSET, so fetching later pages costs the same as fetching the first.
+
+    The returned token is None if there are no more rows.
+    """
+    columns = list(columns)
+    if page_size < 1:
+        raise ArgumentError("The page size must be a positive number.")
+
+    if continuation:
+        values = decode_token(scope, continuation, len(columns))
+        query = query.filter(keyset_filter(columns, values, descending))
+
+    # The sort order must match the keyset predicate, so any ordering set up
+    # by the caller is replaced
+    query = query.order_by(None)
+    if descending:
+        query = query.order_by(*[column.desc() for column in columns])
+    else:
+        query = query.order_by(*columns)
+
+    # Fetch one more row than needed, to know if there is a next page
+    query = query.add_columns(*columns).limit(page_size + 1)
+
+    items = []
+    seen = set()
+    last_key = None
+    rows = 0
+    for row in query:
+        rows += 1
+        key = tuple(row[1:])
+        # Joins may return the same object multiple times
+        if key in seen:
+            continue
+        if len(items) >= page_size:
+            break
+        seen.add(key)
+        items.append(row[0])
+        last_key = key
+
+    # If duplicates used up the limit, then there may be more rows even if
+    # the page is not full
+    if rows > page_size:
+        token = encode_token(scope, last_key)
+    else:
+        token = None
+    return items, token
@@ -16,7 +16,7 @@
 # limitations under the License.
 """ Helper functions for managing parameters. """
 
-from jsonschema import validate, ValidationError
+from jsonschema import ValidationError
 from six import iteritems
 
 from sqlalchemy.orm import contains_eager, joinedload
@@ -27,8 +27,8 @@ from aquilon.aqdb.model import (PersonalityStage, PersonalityParameter, Host,
                                 FeatureLink, HostFeature, HardwareFeature,
                                 HardwareEntity, Interface)
 from aquilon.aqdb.model.hostlifecycle import Ready, Almostready
+from aquilon.utils import get_schema_validator, validate_json_values
 from aquilon.worker.formats.parameter_definition import ParamDefinitionFormatter
-from aquilon.worker.templates import PlenaryHost, PlenaryPersonality
 
 
 def set_parameter(session, parameter, db_paramdef, path, value, update=False):
@@ -45,7 +45,7 @@ def set_parameter(session, parameter, db_paramdef, path, value, update=False):
     if db_paramdef.schema:
         new_value = parameter.get_path(db_paramdef.path)
         try:
-            validate(new_value, db_paramdef.schema)
+            get_schema_validator(db_paramdef.schema).validate(new_value)
         except ValidationError as err:
             raise ArgumentError(err)
 
@@ -223,8 +223,7 @@ def add_feature_paramdef_plenaries(session, dbfeature, plenaries):
 
         q = q.join(PersonalityStage.features)
         q = q.filter_by(feature=dbfeature)
-        q = q.options(PlenaryPersonality.query_options())
-        plenaries.add(q)
+        plenaries.add_dependents(q, "feature_parameters")
     else:
         q = session.query(Host)
         q = q.join(PersonalityStage, FeatureLink)
@@ -241,9 +240,7 @@ def add_feature_paramdef_plenaries(session, dbfeature, plenaries):
 
         q = q.options(contains_eager('hardware_entity'),
                       contains_eager('personality_stage'))
-        q = q.options(PlenaryHost.query_options())
-
-        plenaries.add(q)
+        plenaries.add_dependents(q, "feature_parameters")
 
 
 def update_paramdef_schema(session, db_paramdef, schema):
@@ -253,10 +250,11 @@ def update_paramdef_schema(session, db_paramdef, schema):
 
     # Ensure that existing values do not conflict with the new schema
     params = search_path_in_personas(session, db_paramdef)
-    for param, value in iteritems(params):
-        try:
-            validate(value, schema)
-        except ValidationError as err:
-            raise ArgumentError("Existing value for {0:l} conflicts with the "
-                                "new schema: {1!s}"
-                                .format(param.holder_object, err))
+    validator = get_schema_validator(schema)
+    items = (("{0:l}".format(param.holder_object), value)
+             for param, value in iteritems(params))
+    failed = validate_json_values(validator, items)
+    if failed:
+        raise ArgumentError("\n".join("Existing value for %s conflicts with "
+                                      "the new schema: %s" % (label, error)
+                                      for label, error in sorted(failed)))
@@ -29,8 +29,9 @@ from aquilon.aqdb.model import (
     User,
     UserType,
 )
-from aquilon.worker.templates import PlenaryPersonality
+from aquilon.aqdb.utils.bulk_lookup import key_chunks, in_keys
 from aquilon.utils import chunk
+from aquilon.worker.templates import PlenaryPersonality
 
 
 class UserSync(object):
@@ -54,13 +55,22 @@ class UserSync(object):
         'type': lambda x, y: x.name == y,
     }
 
+    # Attributes compared when looking for changes, besides the type
+    _user_fields = ('uid', 'gid', 'full_name', 'home_dir')
+
     def __init__(self, config, session, logger, plenaries, incremental=False,
-                 ignore_delete_limit=False):
+                 ignore_delete_limit=False, bulk=False):
         self._config = config
         self._session = session
         self._logger = logger
         self._plenaries = plenaries
         self._incremental = incremental
+        self._bulk = bulk
+
+        if incremental and bulk:
+            raise ArgumentError('The incremental and bulk options cannot be '
+                                'used together.')
+        self._batch_size = config.getint('broker', 'user_sync_batch_size')
 
         if not config.has_value(*self._script_location):
             raise ArgumentError('User synchronization is disabled.')
@@ -131,45 +141,52 @@ class UserSync(object):
                     user=dbuser, updates='; '.join(update_msg)))
             self._updated += updated
 
-    def _report_duplicate_uid(self, new, old):
+    def _report_duplicate_uid(self, new, old_name):
         msg = 'Duplicate UID: {} is already used by {}, skipping {}.'.format(
-            new['uid'], old.name, new['name'])
+            new['uid'], old_name, new['name'])
         if self._incremental:
             self._errors.append(msg)
         else:
             self._logger.client_info(msg)
 
-    def _update_plenaries_on_delete(self, userchunk):
+    def _update_plenaries_on_delete(self, id_chunk):
         updated_plenaries = set()
-        userset = set(userchunk)
+        id_set = set(id_chunk)
 
         # Check for root users in the list, and remove their permissions from
         # the personalities
         q = self._session.query(Personality)
         q = q.join(Personality.root_users)
-        q = q.filter(User.id.in_(dbuser.id for dbuser in userchunk))
+        q = q.filter(in_keys(self._session, User.id, id_chunk))
         q = q.options(subqueryload('root_users'),
                       subqueryload('root_netgroups'),
                       joinedload('stages'))
         q = q.options(PlenaryPersonality.query_options(
             prefix='stages.', load_personality=False))
         for personality in q:
-            for dbuser in userset & set(personality.root_users):
+            for dbuser in [dbuser for dbuser in personality.root_users
+                           if dbuser.id in id_set]:
                 personality.root_users.remove(dbuser)
 
             updated_plenaries.update(personality.stages.values())
 
         # Check for any entitlement for the given users
+        updated_plenaries.update(self._entitlement_plenaries(id_chunk))
+
+        return updated_plenaries
+
+    def _entitlement_plenaries(self, user_ids):
+        updated_plenaries = set()
+
         q = self._session.query(Entitlement)
-        q = q.filter(Entitlement.user_id.in_(
-            dbuser.id for dbuser in userchunk))
+        q = q.filter(in_keys(self._session, Entitlement.user_id, user_ids))
         for entit in q:
             if entit.host_id:
                 updated_plenaries.add(entit.host)
             elif entit.cluster_id:
                 updated_plenaries.add(entit.cluster)
             elif entit.personality_id:
-                updated_plenaries.add(entit.personality.stages.values())
+                updated_plenaries.update(entit.personality.stages.values())
             elif entit.archetype_id:
                 updated_plenaries.add(entit.archetype)
             elif entit.target_eon_id:
@@ -177,25 +194,31 @@ class UserSync(object):
 
         return updated_plenaries
 
-    def _delete_gone(self, userlist):
-        if self._limit is not None and len(userlist) > self._limit:
+    def _check_delete_limit(self, count):
+        if self._limit is not None and count > self._limit:
             msg = ('Cowardly refusing to delete {} users, because it is '
                    'over the limit of {}.  Use the --ignore_delete_limit '
-                   'option to override.'.format(len(userlist), self._limit))
+                   'option to override.'.format(count, self._limit))
             if self._incremental:
                 self._errors.append(msg)
             else:
                 self._logger.client_info(msg)
+            return False
+        return True
+
+    def _delete_gone(self, userlist):
+        if not self._check_delete_limit(len(userlist)):
             return
 
         updated_plenaries = set()
 
-        # Oracle has limits on the size of the IN clause, so we will need to
-        # split the list to smaller chunks
+        # Databases have limits on the size of the IN clause, so we may need
+        # to split the list to smaller chunks
         self._logger.info('Searching all the plenaries that need updating...')
-        for userchunk in chunk(userlist, 1000):
+        for id_chunk in key_chunks(self._session,
+                                   [dbuser.id for dbuser in userlist]):
             updated_plenaries.update(
-                self._update_plenaries_on_delete(userchunk))
+                self._update_plenaries_on_delete(id_chunk))
 
         # Add to the plenary collection all the plenaries that have been
         # updated following the deletion of the users
@@ -289,6 +312,168 @@ class UserSync(object):
 
             yield row
 
+    def compute_delta(self):
+        """
+        Compare the users returned by the script with the database.
+
+        Return the users to add, the changes of the existing users as
+        (current row, changed attributes) pairs, the current rows of the users
+        to delete, and the number of unchanged users. UID conflicts are
+        resolved the same way as by refresh_user().
+        """
+        q = self._session.query(User.id, User.name, User.uid, User.gid,
+                                User.full_name, User.home_dir,
+                                UserType.name.label('type_name'))
+        q = q.join(UserType)
+
+        current = {}
+        names_by_uid = {}
+        self._logger.info('Listing current users...')
+        for row in q:
+            current[row.name] = row
+            names_by_uid[row.uid] = row.name
+        self._logger.info('Found {} users'.format(len(current)))
+
+        # Names not seen in the output of the script yet
+        remaining = set(current)
+
+        to_add = []
+        to_update = []
+        unchanged = 0
+        for user in self.read_users():
+            if user['name'] not in remaining:
+                if user['uid'] in names_by_uid:
+                    self._report_duplicate_uid(user,
+                                               names_by_uid[user['uid']])
+                    continue
+
+                to_add.append(user)
+                names_by_uid[user['uid']] = user['name']
+                continue
+
+            row = current[user['name']]
+            if user['uid'] != row.uid:
+                if user['uid'] in names_by_uid:
+                    # The user is left in the list of names to delete
+                    self._report_duplicate_uid(user,
+                                               names_by_uid[user['uid']])
+                    continue
+
+                del names_by_uid[row.uid]
+                names_by_uid[user['uid']] = row.name
+
+            remaining.remove(row.name)
+
+            changes = {}
+            for attr in self._user_fields:
+                if user[attr] != getattr(row, attr):
+                    changes[attr] = user[attr]
+            if user['type'] != row.type_name:
+                changes['type'] = user['type']
+
+            if changes:
+                to_update.append((row, changes))
+            else:
+                unchanged += 1
+
+        to_delete = [current[name] for name in sorted(remaining)]
+        return to_add, to_update, to_delete, unchanged
+
+    def _bulk_delete(self, to_delete):
+        if not to_delete or not self._check_delete_limit(len(to_delete)):
+            return
+
+        user_ids = [row.id for row in to_delete]
+
+        self._logger.info('Searching all the plenaries that need updating...')
+        updated_plenaries = set()
+        for id_chunk in key_chunks(self._session, user_ids):
+            updated_plenaries.update(
+                self._update_plenaries_on_delete(id_chunk))
+        self._plenaries.add(updated_plenaries)
+
+        # Removing root users from personalities is done through the session
+        self._session.flush()
+
+        for row in to_delete:
+            self._logger.debug('Deleting user {} (uid: {}, gid: {})'
+                               .format(row.name, row.uid, row.gid))
+
+        # Entitlements and root user mappings are removed by the database
+        for batch in chunk(user_ids, self._batch_size):
+            for id_chunk in key_chunks(self._session, batch):
+                q = self._session.query(User)
+                q = q.filter(in_keys(self._session, User.id, id_chunk))
+                q.delete(synchronize_session=False)
+        self._deleted = len(user_ids)
+
+    def _bulk_update(self, to_update):
+        mappings = []
+        type_changed = []
+        for row, changes in to_update:
+            mapping = {'id': row.id}
+            update_msg = []
+            for attr in sorted(changes):
+                new = changes[attr]
+                if attr == 'type':
+                    mapping['type_id'] = self._transform_type(new).id
+                    old = row.type_name
+                    type_changed.append(row.id)
+                else:
+                    mapping[attr] = new
+                    old = getattr(row, attr)
+                update_msg.append('{} = {}, was {}'.format(attr, new, old))
+            mappings.append(mapping)
+            self._logger.debug('Updating user {} ({})'
+                               .format(row.name, '; '.join(update_msg)))
+
+        for batch in chunk(mappings, self._batch_size):
+            self._session.bulk_update_mappings(User, batch)
+        self._updated = len(mappings)
+
+        # Entitlement templates include the type of the users
+        for id_chunk in key_chunks(self._session, type_changed):
+            self._plenaries.add(self._entitlement_plenaries(id_chunk))
+
+    def _bulk_add(self, to_add):
+        mappings = []
+        for details in to_add:
+            dbuser_type = self._transform_type(details['type'])
+            mappings.append({'name': details['name'],
+                             'uid': details['uid'],
+                             'gid': details['gid'],
+                             'full_name': details['full_name'],
+                             'home_dir': details['home_dir'],
+                             'type_id': dbuser_type.id})
+            self._logger.debug('Adding {} user {} (uid: {}, gid: {})'
+                               .format(dbuser_type.name, details['name'],
+                                       details['uid'], details['gid']))
+
+        for batch in chunk(mappings, self._batch_size):
+            self._session.bulk_insert_mappings(User, batch)
+        self._added = len(mappings)
+
+    def _refresh_bulk(self):
+        to_add, to_update, to_delete, unchanged = self.compute_delta()
+        self._logger.info('Found {} users to add, {} to update and {} to '
+                          'delete.'.format(len(to_add), len(to_update),
+                                           len(to_delete)))
+
+        # Deleting first frees up names and UIDs which may be reused
+        self._bulk_delete(to_delete)
+        self._bulk_update(to_update)
+        self._bulk_add(to_add)
+
+        # The bulk statements bypassed the session, so make sure the
+        # plenaries see the new state of the database
+        self._session.expire_all()
+
+        self._plenaries.write()
+
+        self._logger.client_info(
+            'Added {}, deleted {}, updated {} users, {} unchanged.'.format(
+                self._added, self._deleted, self._updated, unchanged))
+
     def refresh_user(self):
         self._success = []
         self._errors = []
@@ -296,6 +481,10 @@ class UserSync(object):
         self._deleted = 0
         self._updated = 0
 
+        if self._bulk:
+            self._refresh_bulk()
+            return
+
         # Get the list of users by uid and by name, this will be the base list
         # to know which users we have in extra at the end, and identify any
         # duplicate UID we might have
@@ -310,7 +499,7 @@ class UserSync(object):
                     # But the UID already exists in the database (as another
                     # user, it means), then we need to show an error
                     self._report_duplicate_uid(
-                        user, users['uid'][user['uid']])
+                        user, users['uid'][user['uid']].name)
                     continue
 
                 # If we reach here, just create the new user with the
@@ -339,7 +528,7 @@ class UserSync(object):
                         # list by name, so that it will be removed from the
                         # database at the end of that process.
                         self._report_duplicate_uid(
-                            user, users['uid'][user['uid']])
+                            user, users['uid'][user['uid']].name)
                         continue
 
                     # If we reach here, we can just replace the mention of the
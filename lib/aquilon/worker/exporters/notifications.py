@@ -14,21 +14,24 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from collections import deque
 import os
 import sys
+from threading import Lock
 from time import time
 from uuid import uuid4
 from struct import pack
 
 from twisted.python import log
 from twisted.internet import reactor
-from twisted.internet.protocol import ClientCreator, Protocol
+from twisted.internet.protocol import Protocol, ReconnectingClientFactory
 
 from aquilon.config import Config
 from aquilon.exceptions_ import ProtocolError
 from aquilon.worker.exporter import (ExportHandler, ExporterNotification,
                                      register_exporter)
 from aquilon.worker.formats.formatters import ObjectFormatter
+from aquilon.worker.metrics import registry
 
 
 # TODO: This should be merged with formats/formatters.py
@@ -87,32 +90,145 @@ class PublishProtocol(Protocol):
         self.transport.write(dlen + data)
 
 
-def send_messages(proto, messages):
-    try:
+class PersistentPublishProtocol(PublishProtocol):
+    """
+    Publishing protocol which keeps the connection open, and lets the factory
+    know when it can be used.
+    """
+    def connectionMade(self):
+        self.factory.connection_made(self)
+
+    def connectionLost(self, reason):
+        self.factory.connection_lost(self)
+
+
+class EventPublisher(ReconnectingClientFactory):
+    """
+    Long-lived connection to the event socket.
+
+    Messages are put in a bounded queue, and written out in a single batch
+    when the connection is available. If the queue is full, the oldest
+    messages are dropped. Lost connections are re-established with an
+    exponential backoff. Messages are only counted as written once they have
+    been handed to a connected transport; there is no acknowledgement from
+    the other side.
+
+    All methods must be called from the reactor thread.
+    """
+    protocol = PersistentPublishProtocol
+    maxDelay = 60
+
+    # Instance shared by the broker
+    instance = None
+    instance_lock = Lock()
+
+    def __init__(self, sockname, queue_size, timeout=1):
+        self.sockname = sockname
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.queue = deque()
+        self.proto = None
+        self.connecting = False
+        self.flush_pending = False
+        self.stats = {"published": 0,
+                      "written": 0,
+                      "dropped": 0,
+                      "batches": 0,
+                      "connects": 0,
+                      "failures": 0}
+
+    @classmethod
+    def get_instance(cls):
+        # Called from the threads executing the commands
+        with cls.instance_lock:
+            if cls.instance is None:
+                config = Config()
+                sockname = os.path.join(config.get("broker", "sockdir"),
+                                        "events")
+                queue_size = config.getint("broker", "event_queue_size")
+                cls.instance = cls(sockname, queue_size)
+        return cls.instance
+
+    def publish(self, messages):
         for msg in messages:
-            proto.sendMessage(msg)
-    finally:
-        # Don't leak the socket
-        proto.transport.loseConnection()
+            if len(self.queue) >= self.queue_size:
+                self.queue.popleft()
+                self.stats["dropped"] += 1
+            self.queue.append(msg)
+            self.stats["published"] += 1
+
+        if self.proto:
+            # Coalesce messages published in the same reactor iteration
+            if not self.flush_pending:
+                self.flush_pending = True
+                reactor.callLater(0, self.flush)
+        elif not self.connecting:
+            self.connecting = True
+            self.continueTrying = True
+            reactor.connectUNIX(self.sockname, self, self.timeout)
+
+    def flush(self):
+        self.flush_pending = False
+        if not self.proto or not self.queue:
+            return
+
+        # If the connection is going away, keep the messages until
+        # connection_made() is called again
+        transport = self.proto.transport
+        if not self.proto.connected or transport.disconnecting:
+            return
+
+        data = []
+        for msg in self.queue:
+            payload = msg.serialize()
+            data.append(pack('!I', len(payload)))
+            data.append(payload)
+        transport.write("".join(data))
+
+        self.stats["written"] += len(self.queue)
+        self.stats["batches"] += 1
+        self.queue.clear()
+
+    def connection_made(self, proto):
+        self.resetDelay()
+        self.proto = proto
+        self.connecting = False
+        self.stats["connects"] += 1
+        self.flush()
+
+    def connection_lost(self, proto):
+        if self.proto is proto:
+            self.proto = None
+
+    def clientConnectionLost(self, connector, reason):
+        self.connecting = True
+        ReconnectingClientFactory.clientConnectionLost(self, connector, reason)
+
+    def clientConnectionFailed(self, connector, reason):
+        self.stats["failures"] += 1
+        log.msg("Notification push failed: {0:s}, {1:d} messages queued"
+                .format(reason.getErrorMessage(), len(self.queue)))
+        ReconnectingClientFactory.clientConnectionFailed(self, connector,
+                                                         reason)
+
+    def statistics(self):
+        stats = [((name,), value)
+                 for name, value in sorted(self.stats.items())]
+        stats.append((("queued",), len(self.queue)))
+        return stats
 
 
 @register_exporter('Fqdn')
 class NotificationExportHandler(ExportHandler, ProtocolBufferMixin):
-
     def __init__(self):
         self.config = Config()
-        self._creator = ClientCreator(reactor, PublishProtocol)
 
     def publish(self, notifications, **kwargs):
-        sockname = os.path.join(self.config.get("broker", "sockdir"), "events")
-        timeout = 1  # TODO: should be configurable
-        # The following construts a Deffered that, connect and then send
-        # all of the queued notifications.  This will be processed after
-        # the request has finished.  Any errors are logged, but ignored.
-        d = self._creator.connectUNIX(sockname, timeout)  # pid
-        d.addCallback(send_messages, notifications)
-        d.addErrback(lambda e: log.msg("Notification push failed: {0:s}"
-                                       .format(e.getErrorMessage())))
+        # The messages are handed over to the reactor thread, and will be
+        # sent after the request has finished. Connection errors are logged,
+        # and the messages are kept until the queue overflows.
+        reactor.callFromThread(EventPublisher.get_instance().publish,
+                               list(notifications))
 
     def fill_fqdn(self, msg, obj):
         msg.entity_type = msg.DNS_RECORD
@@ -178,3 +294,16 @@ class NotificationExportHandler(ExportHandler, ProtocolBufferMixin):
 
     def delete(self, obj, **kwargs):
         return self.new_notification('DELETE', obj, kwargs)
+
+
+def _publisher_statistics():
+    # The publisher is only created when the first notification is sent
+    publisher = EventPublisher.instance
+    if publisher is None:
+        return []
+    return publisher.statistics()
+
+
+registry.gauge("aqd_event_publisher",
+               "Counters and queue length of the event notification "
+               "publisher.", _publisher_statistics, ["counter"])
@@ -15,10 +15,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from sqlalchemy.orm import joinedload, undefer
+
 from aquilon.worker.formats.formatters import ObjectFormatter
 
 
 class CompileableFormatter(ObjectFormatter):
+    def query_options(self, style, prefix=""):
+        personality = prefix + 'personality_stage.personality'
+        return [joinedload(prefix + 'personality_stage'),
+                joinedload(personality),
+                undefer(personality + '.archetype.comments')]
+
     def fill_proto(self, object, skeleton, embedded=True, indirect_attrs=True):
         skeleton.status = object.status.name
         self.redirect_proto(object.personality_stage, skeleton.personality)
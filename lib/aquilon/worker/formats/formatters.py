@@ -17,6 +17,7 @@
 """Base classes for formatting objects."""
 
 import csv
+import json
 import sys
 
 from six import text_type
@@ -24,6 +25,9 @@ from six.moves import cStringIO as StringIO  # pylint: disable=F0401
 
 import google.protobuf.message
 from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.json_format import MessageToDict
+from twisted.internet import reactor, threads
+from twisted.python.threadable import isInIOThread
 
 from aquilon.config import Config
 from aquilon.exceptions_ import ProtocolError
@@ -34,6 +38,14 @@ from aquilon.worker.processes import build_mako_lookup
 csv.register_dialect('aquilon', delimiter=',', quoting=csv.QUOTE_MINIMAL,
                      doublequote=True, lineterminator='\n')
 
+# Amount of NDJSON output collected before sending it to the client
+NDJSON_CHUNK_SIZE = 64 * 1024
+
+# Key of the record terminating an NDJSON stream that failed. Once part of the
+# output was sent, the HTTP status can no longer be changed, so the error has
+# to be reported in-band.
+NDJSON_ERROR_KEY = "aquilon_error"
+
 
 class ResponseFormatter(object):
     """This handles the top level of formatting results... results
@@ -41,7 +53,7 @@ class ResponseFormatter(object):
         handlers and wrapped appropriately.
 
     """
-    formats = ["raw", "csv", "proto", "djb"]
+    formats = ["raw", "csv", "proto", "djb", "ndjson"]
 
     loaded_protocols = {}
 
@@ -128,6 +140,59 @@ class ResponseFormatter(object):
         request.setHeader("Content-Type", "text/plain; charset=utf-8")
         return ObjectFormatter.redirect_djb(result).encode("utf-8")
 
+    def format_ndjson(self, result, request):
+        """Newline-delimited JSON, one line per object.
+
+        The output is sent to the client in chunks while the objects are
+        being formatted, so the whole result never has to be kept in memory.
+        The remaining output is returned as usual.
+        """
+        request.setHeader("Content-Type",
+                          "application/x-ndjson; charset=utf-8")
+
+        if self.protobuf_container:
+            container = self.protobuf_container()
+            field_name = container.DESCRIPTOR.fields[0].name
+            container = getattr(container, field_name)
+        else:
+            container = None
+
+        if isinstance(result, text_type):
+            records = [result]
+        else:
+            records = ObjectFormatter.redirect_ndjson(result, container)
+
+        buf = []
+        size = 0
+        for record in records:
+            line = json.dumps(record, sort_keys=True) + "\n"
+            buf.append(line)
+            size += len(line)
+            if size >= NDJSON_CHUNK_SIZE:
+                self._write_chunk(request, "".join(buf).encode("utf-8"))
+                buf = []
+                size = 0
+
+        return "".join(buf).encode("utf-8")
+
+    @staticmethod
+    def ndjson_error(code, message):
+        """Format the last record of a stream that failed."""
+        record = {NDJSON_ERROR_KEY: {"code": code, "message": message}}
+        return (json.dumps(record, sort_keys=True) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _write_chunk(request, data):
+        # Once output was written, the response has no Content-Length, and
+        # it is sent using chunked transfer encoding
+        request.streamed = True
+        if isInIOThread():
+            request.write(data)
+        else:
+            # Wait for the data to be handed over, so the reactor does not
+            # have to buffer the output of a fast producer
+            threads.blockingCallFromThread(reactor, request.write, data)
+
     def format_proto(self, result, request):
         if not self.protobuf_container:  # pragma: no cover
             raise ProtocolError("Protobuf formatter is not available")
@@ -235,6 +300,44 @@ class ObjectFormatter(object):
         raise ProtocolError("{0!r} does not have a protobuf formatter."
                             .format(type(result)))
 
+    def format_ndjson(self, result, container=None):
+        """
+        Generate the records of the NDJSON output style.
+
+        If the command has a protobuf message type, then every object is
+        described by the JSON mapping of its protobuf message, so the output
+        uses the same field names as the proto style, and unset fields are
+        reported with their default value. Otherwise, the records are the
+        rows of the CSV style, as JSON arrays.
+        """
+        if container is not None:
+            try:
+                self.format_proto(result, container, embedded=False)
+            except ProtocolError:
+                del container[:]
+            else:
+                for msg in container:
+                    yield MessageToDict(msg, preserving_proto_field_name=True,
+                                        including_default_value_fields=True)
+                # Do not let the container grow
+                del container[:]
+                return
+
+        for fields in self.csv_fields(result):
+            if fields:
+                yield list(fields)
+
+    def query_options(self, style, prefix=""):  # pylint: disable=W0613
+        """
+        Loader options needed for formatting the object in the given style.
+
+        Commands returning many objects should apply these options to their
+        query, so the number of queries does not grow with the number of
+        objects returned. The prefix is the path of the relationship leading
+        to the object, if it is not the main entity of the query.
+        """
+        return []
+
     @staticmethod
     def redirect_raw(result, indent="", embedded=True, indirect_attrs=True):
         handler = ObjectFormatter.handlers.get(result.__class__,
@@ -261,6 +364,18 @@ class ObjectFormatter(object):
         handler.format_proto(result, container, embedded=embedded,
                              indirect_attrs=indirect_attrs)
 
+    @staticmethod
+    def redirect_ndjson(result, container=None):
+        handler = ObjectFormatter.handlers.get(result.__class__,
+                                               ObjectFormatter.default_handler)
+        return handler.format_ndjson(result, container)
+
+    @staticmethod
+    def redirect_query_options(cls, style, prefix=""):
+        handler = ObjectFormatter.handlers.get(cls,
+                                               ObjectFormatter.default_handler)
+        return handler.query_options(style, prefix=prefix)
+
 ObjectFormatter.default_handler = ObjectFormatter()
 
 
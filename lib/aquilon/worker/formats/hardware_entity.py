@@ -18,6 +18,8 @@
 
 from operator import attrgetter
 
+from sqlalchemy.orm import joinedload, subqueryload, undefer
+
 from aquilon.aqdb.model import HardwareEntity, Location
 from aquilon.worker.formats.formatters import ObjectFormatter
 
@@ -27,6 +29,16 @@ class HardwareEntityFormatter(ObjectFormatter):
                    indirect_attrs=True):
         pass
 
+    def query_options(self, style, prefix=""):
+        return [undefer(prefix + 'comments'),
+                joinedload(prefix + 'model'),
+                joinedload(prefix + 'location'),
+                subqueryload(prefix + 'location.parents'),
+                subqueryload(prefix + 'interfaces'),
+                subqueryload(prefix + 'interfaces.assignments'),
+                subqueryload(prefix + 'interfaces.assignments.dns_records'),
+                joinedload(prefix + 'interfaces.assignments.network')]
+
     def format_raw(self, hwe, indent="", embedded=True, indirect_attrs=True):
         details = [indent + "{0:c}: {0.label}".format(hwe)]
 
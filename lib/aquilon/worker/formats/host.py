@@ -20,8 +20,9 @@ from collections import defaultdict
 from operator import attrgetter
 
 from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import joinedload, subqueryload, undefer
 
-from aquilon.aqdb.model import Host, Machine
+from aquilon.aqdb.model import Host, HardwareEntity, Machine
 from aquilon.aqdb.model.feature import hardware_features, host_features
 from aquilon.worker.formats.formatters import ObjectFormatter
 from aquilon.worker.formats.compileable import CompileableFormatter
@@ -29,6 +30,29 @@ from aquilon.worker.formats.list import ListFormatter
 
 
 class HostFormatter(CompileableFormatter):
+    def query_options(self, style, prefix=""):
+        options = super(HostFormatter, self).query_options(style,
+                                                           prefix=prefix)
+        options.extend([undefer(prefix + 'comments'),
+                        subqueryload(prefix + 'personality_stage.grns'),
+                        subqueryload(prefix + 'grns'),
+                        subqueryload(prefix + 'services_used'),
+                        subqueryload(prefix + 'services_provided'),
+                        joinedload(prefix + 'resholder'),
+                        subqueryload(prefix + 'resholder.resources'),
+                        joinedload(prefix + '_cluster'),
+                        subqueryload(prefix + '_cluster.cluster')])
+        if style == "raw":
+            # Only the raw format shows features
+            archetype = prefix + 'personality_stage.personality.archetype'
+            options.extend([
+                subqueryload(prefix + 'personality_stage.features'),
+                subqueryload(archetype + '.features')])
+
+        options.extend(self.redirect_query_options(
+            HardwareEntity, style, prefix + 'hardware_entity.'))
+        return options
+
     def fill_proto(self, host, skeleton, embedded=True, indirect_attrs=True):
         super(HostFormatter, self).fill_proto(host, skeleton)
         skeleton.type = "host"  # Deprecated
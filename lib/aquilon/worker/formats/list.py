@@ -23,8 +23,12 @@ from sqlalchemy.orm.collections import InstrumentedList
 from sqlalchemy.orm.query import Query
 from sqlalchemy.ext.associationproxy import _AssociationList
 
+from aquilon.aqdb.model import Base
 from aquilon.worker.formats.formatters import ObjectFormatter
 
+# Number of rows fetched at once by QueryStream
+DEFAULT_BATCH_SIZE = 1000
+
 
 class ListFormatter(ObjectFormatter):
     def format_raw(self, result, indent="", embedded=True,
@@ -50,12 +54,58 @@ class ListFormatter(ObjectFormatter):
             ObjectFormatter.redirect_proto(item, skeleton, embedded=embedded,
                                            indirect_attrs=indirect_attrs)
 
+    def format_ndjson(self, result, container=None):
+        for item in result:
+            for record in self.redirect_ndjson(item, container):
+                yield record
+
 ObjectFormatter.handlers[list] = ListFormatter()
 ObjectFormatter.handlers[Query] = ListFormatter()
 ObjectFormatter.handlers[InstrumentedList] = ListFormatter()
 ObjectFormatter.handlers[_AssociationList] = ListFormatter()
 
 
+class QueryStream(object):
+    """
+    Iterate over the result of a query without loading all rows at once.
+
+    Rows are fetched in batches using Query.yield_per(), and the objects of a
+    batch are expunged from the session before the next batch is fetched, so
+    memory usage does not grow with the size of the result. The query must not
+    use eager loading of collections, as yield_per() does not support it.
+
+    The result can be iterated only once.
+    """
+
+    def __init__(self, query, batch_size=DEFAULT_BATCH_SIZE):
+        self.query = query
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        session = self.query.session
+        batch = []
+        for item in self.query.yield_per(self.batch_size):
+            yield item
+
+            # Column queries return tuples, which are not part of the session
+            if isinstance(item, Base):
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._expunge(session, batch)
+                batch = []
+
+        self._expunge(session, batch)
+
+    @staticmethod
+    def _expunge(session, objects):
+        for obj in objects:
+            if obj in session:
+                session.expunge(obj)
+
+
+ObjectFormatter.handlers[QueryStream] = ListFormatter()
+
+
 class StringList(list):
     pass
 
@@ -70,6 +120,10 @@ class StringListFormatter(ListFormatter):
         for obj in objects:
             writer.writerow((str(obj),))
 
+    def format_ndjson(self, objects, container=None):
+        for obj in objects:
+            yield str(obj)
+
 ObjectFormatter.handlers[StringList] = StringListFormatter()
 
 
@@ -92,6 +146,10 @@ class StringAttributeListFormatter(ListFormatter):
         for obj in objects:
             writer.writerow((str(objects.getter(obj)),))
 
+    def format_ndjson(self, objects, container=None):
+        for obj in objects:
+            yield str(objects.getter(obj))
+
     def format_proto(self, objects, container, embedded=True, indirect_attrs=True):
         # This method always populates the first field of the protobuf message,
         # regardless of how that field is called.
@@ -108,3 +166,19 @@ class StringAttributeListFormatter(ListFormatter):
             # if a usecase comes up.
 
 ObjectFormatter.handlers[StringAttributeList] = StringAttributeListFormatter()
+
+
+class StringAttributeStream(QueryStream):
+    """ Streaming version of StringAttributeList """
+
+    def __init__(self, query, attr, batch_size=DEFAULT_BATCH_SIZE):
+        if isinstance(attr, string_types):
+            self.getter = attrgetter(attr)
+        else:
+            self.getter = attr
+        super(StringAttributeStream, self).__init__(query,
+                                                    batch_size=batch_size)
+
+
+ObjectFormatter.handlers[StringAttributeStream] = \
+    StringAttributeListFormatter()
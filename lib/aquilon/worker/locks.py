@@ -22,13 +22,22 @@ from aquilon.exceptions_ import InternalError
 from aquilon.locks import LockQueue, LockKey
 from aquilon.aqdb.model import PersonalityStage, ServiceInstance
 from aquilon.worker.logger import CLIENT_INFO
+from aquilon.worker.metrics import phase_timer
 
 LOGGER = logging.getLogger(__name__)
 
 
+class BrokerLockQueue(LockQueue):
+    """LockQueue that accounts the time spent waiting for the locks."""
+
+    def acquire(self, key):
+        with phase_timer("lock_wait"):
+            super(BrokerLockQueue, self).acquire(key)
+
+
 # Single instance of the LockQueue that should be used by any code
 # in the broker.
-lock_queue = LockQueue()
+lock_queue = BrokerLockQueue()
 
 
 class NoLockKey(LockKey):
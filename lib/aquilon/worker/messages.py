@@ -17,24 +17,31 @@
 """Pub/sub mechanism for status messages."""
 
 from threading import Lock
-from collections import deque
-from logging import DEBUG
+from collections import namedtuple
+from struct import pack, unpack, calcsize
+import os
 import uuid
 
 from six import iteritems
 
 from twisted.internet import reactor
 
+from aquilon.config import Config
 from aquilon.exceptions_ import InternalError
 
 
-# Some requests can generate many debug messages.  After this limit is
-# passed older records will be replaced with None.
+# Some requests can generate many messages.  After this limit is passed, the
+# older half of the records kept in memory is written to a spill file.
 # This is somewhat arbitrary as a number.  If each log message was a
-# string of 100 bytes then 10000 would be about 1 MB.  However the log
-# record object has quite a few more fields (source file, line, function
-# name, and potentially exception info) which can bloat this quite a bit.
-MAX_DEBUG_MESSAGES_PER_REQUEST = 10000
+# string of 100 bytes then 10000 would be about 1 MB.
+MAX_RECORDS_IN_MEMORY = 10000
+
+# Spilled records are stored as the level number and the length of the
+# UTF-8 encoded message, followed by the message itself
+SPILL_HEADER = "!HI"
+SPILL_HEADER_SIZE = calcsize(SPILL_HEADER)
+
+SpilledRecord = namedtuple("SpilledRecord", ["levelno", "message"])
 
 
 class RequestStatus(object):
@@ -71,11 +78,15 @@ class RequestStatus(object):
         self.command = ""
         self.args = {}
         self.description = ""
+        # The most recent records, older ones are moved to the spill file
         self.records = []
-        self.debug_fifo = deque()
+        # Number of records in the spill file
+        self.spilled = 0
+        self.spill_path = None
+        self.spill_file = None
         self.is_finished = False
-        # Dict of subscribers to the length of the records list the last
-        # time it was processed by the subscriber.
+        # Dict of subscribers to the number of records (including spilled
+        # ones) the last time it was processed by the subscriber.
         self.subscribers = {}
         # This lock should be aquired for any access to records, is_finished,
         # or subscribers.
@@ -125,15 +136,48 @@ class RequestStatus(object):
         """Add a new message into the status log and notify watchers."""
         with self.lock:
             self.records.append(record)
-            # Constrain the number of debug messages kept to keep memory
-            # usage in check.
-            if record.levelno <= DEBUG:
-                self.debug_fifo.append(len(self.records) - 1)
-                if len(self.debug_fifo) > MAX_DEBUG_MESSAGES_PER_REQUEST:
-                    remove_index = self.debug_fifo.popleft()
-                    self.records[remove_index] = None
             for (subscriber, processed) in self.subscribers.items():
                 self._notify_subscriber(subscriber, processed)
+            # Constrain the number of messages kept to keep memory usage in
+            # check.
+            if len(self.records) > MAX_RECORDS_IN_MEMORY:
+                self._spill(len(self.records) // 2)
+
+    def _spill(self, count):
+        """Move the oldest records from memory to the spill file."""
+        if not self.spill_file:
+            config = Config()
+            spooldir = config.get("broker", "request_spooldir")
+            if not os.path.exists(spooldir):
+                os.makedirs(spooldir)
+            self.spill_path = os.path.join(spooldir,
+                                           "request_%s.log" % self.auditid)
+            self.spill_file = open(self.spill_path, "wb")
+
+        data = []
+        for record in self.records[:count]:
+            message = record.message or u""
+            if not isinstance(message, bytes):
+                message = message.encode("utf-8")
+            data.append(pack(SPILL_HEADER, record.levelno, len(message)))
+            data.append(message)
+        self.spill_file.write(b"".join(data))
+        self.spill_file.flush()
+
+        del self.records[:count]
+        self.spilled += count
+
+    def _read_spilled(self, start):
+        """Iterate over the records in the spill file, starting at start."""
+        with open(self.spill_path, "rb") as fh:
+            for index in range(self.spilled):
+                levelno, size = unpack(SPILL_HEADER,
+                                       fh.read(SPILL_HEADER_SIZE))
+                if index < start:
+                    fh.seek(size, os.SEEK_CUR)
+                    continue
+                message = fh.read(size).decode("utf-8")
+                yield SpilledRecord(levelno, message)
 
     def add_subscriber(self, subscriber):
         """The subscriber should subclass/implement StatusSubscriber."""
@@ -150,13 +194,14 @@ class RequestStatus(object):
     def _notify_subscriber(self, subscriber, processed):
         # No lock in this method... it may not be necessary if the
         # messages are finished.  Lock is taken at a higher level when needed.
-        known = len(self.records)
-        for record_index in range(processed, known):
-            record = self.records[record_index]
-            # The record may have been replaced by None if too many
-            # debug messages were seen.
-            if record is not None:
+        if processed < self.spilled:
+            # Late subscribers get the older records streamed from disk
+            for record in self._read_spilled(processed):
                 subscriber.process(record)
+            processed = self.spilled
+        known = self.spilled + len(self.records)
+        for record in self.records[processed - self.spilled:]:
+            subscriber.process(record)
         if subscriber in self.subscribers:
             self.subscribers[subscriber] = known
 
@@ -166,10 +211,21 @@ class RequestStatus(object):
             self.is_finished = True
             while self.subscribers:
                 (subscriber, processed) = self.subscribers.popitem()
-                if processed < len(self.records):
+                if processed < self.spilled + len(self.records):
                     self._notify_subscriber(subscriber, processed)
                 subscriber.finish()
 
+    def close(self):
+        """Remove the spill file, if there is one."""
+        with self.lock:
+            if self.spill_file:
+                self.spill_file.close()
+                self.spill_file = None
+                try:
+                    os.unlink(self.spill_path)
+                except OSError:  # pragma: no cover
+                    pass
+
 
 class StatusCatalog(object):
     """Global store for all StatusRequest objects."""
@@ -233,6 +289,7 @@ class StatusCatalog(object):
         self.status_by_auditid.pop(status.auditid, None)
         if status.requestid:
             self.status_by_requestid.pop(status.requestid, None)
+        status.close()
 
     def remove_request_status(self, status):
         """Mark the RequestStatus as finished and remove references to it."""
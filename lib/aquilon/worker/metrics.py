@@ -0,0 +1,254 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Performance metrics of the broker.
+
+The metrics are kept in memory, and are exported in the Prometheus text
+format by MetricsResource.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock, local
+import time
+
+from six import iteritems
+
+from sqlalchemy import event
+from twisted.internet import reactor
+from twisted.web.resource import Resource
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 300.0, 900.0, 1800.0)
+
+_request = local()
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace('"', r'\"'))
+                             for name, value in pairs)
+
+
+class Histogram(object):
+    def __init__(self, name, description, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = Lock()
+        # label values => [bucket counts..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        idx = bisect_left(self.buckets, value)
+        with self.lock:
+            try:
+                data = self.values[labels]
+            except KeyError:
+                data = [0] * (len(self.buckets) + 1) + [0.0]
+                self.values[labels] = data
+            data[idx] += 1
+            data[-1] += value
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.description),
+                 "# TYPE %s histogram" % self.name]
+        with self.lock:
+            values = sorted((labels, data[:]) for labels, data
+                            in iteritems(self.values))
+        for labels, data in values:
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), data[:-1]):
+                total += count
+                lines.append("%s_bucket%s %d" %
+                             (self.name,
+                              _format_labels(self.labelnames, labels,
+                                             ("le", bound)),
+                              total))
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append("%s_sum%s %f" % (self.name, suffix, data[-1]))
+            lines.append("%s_count%s %d" % (self.name, suffix, total))
+        return lines
+
+
+class Gauge(object):
+    """A value computed at the time the metrics are collected.
+
+    The callback must return a list of (label values, value) pairs.
+    """
+
+    def __init__(self, name, description, callback, labelnames=()):
+        self.name = name
+        self.description = description
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.description),
+                 "# TYPE %s gauge" % self.name]
+        for labels, value in self.callback():
+            lines.append("%s%s %s" % (self.name,
+                                      _format_labels(self.labelnames, labels),
+                                      value))
+        return lines
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, *args, **kwargs):
+        metric = Gauge(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+command_duration = registry.histogram(
+    "aqd_command_duration_seconds", "Time spent executing broker commands.",
+    ["command"])
+command_phase_duration = registry.histogram(
+    "aqd_command_phase_seconds",
+    "Time spent by broker commands in the db, lock_wait, render and format "
+    "phases.", ["command", "phase"])
+compile_duration = registry.histogram(
+    "aqd_compile_duration_seconds", "Duration of panc runs.")
+
+
+@contextmanager
+def command_timer(command):
+    """Measure the execution of a command, including its phases.
+
+    Time spent in the DB and waiting for locks is collected by add_phase_time()
+    from the thread executing the command.
+    """
+    phases = defaultdict(float)
+    _request.phases = phases
+    start = time.time()
+    try:
+        yield
+    finally:
+        _request.phases = None
+        command_duration.observe(time.time() - start, command)
+        for phase, seconds in iteritems(phases):
+            command_phase_duration.observe(seconds, command, phase)
+
+
+def add_phase_time(phase, seconds):
+    phases = getattr(_request, "phases", None)
+    if phases is not None:
+        phases[phase] += seconds
+
+
+@contextmanager
+def phase_timer(phase):
+    start = time.time()
+    try:
+        yield
+    finally:
+        add_phase_time(phase, time.time() - start)
+
+
+# Statements of a connection do not nest at the cursor level, so a single start
+# time per connection is enough. A failed statement does not trigger
+# after_cursor_execute, so handle_error has to clean up after it.
+
+def _db_timer_start(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=W0613
+    conn.info['metrics_start_time'] = time.time()
+
+
+def _db_timer_stop(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=W0613
+    _db_timer_record(conn)
+
+
+def _db_timer_error(exception_context):
+    if exception_context.connection is not None:
+        _db_timer_record(exception_context.connection)
+
+
+def _db_timer_record(conn):
+    start = conn.info.pop('metrics_start_time', None)
+    if start is not None:
+        add_phase_time("db", time.time() - start)
+
+
+def instrument_db(dbf):
+    """Collect statement timings and connection pool usage."""
+    engines = [("Session", dbf.engine)]
+    if dbf.no_lock_engine:
+        engines.append(("NLSession", dbf.no_lock_engine))
+
+    for _, engine in engines:
+        event.listen(engine, "before_cursor_execute", _db_timer_start)
+        event.listen(engine, "after_cursor_execute", _db_timer_stop)
+        event.listen(engine, "handle_error", _db_timer_error)
+
+    def pool_stats():
+        stats = []
+        for name, engine in engines:
+            pool = engine.pool
+            # Only QueuePool keeps track of checkouts
+            if hasattr(pool, "checkedout"):
+                stats.append(((name, "checked_out"), pool.checkedout()))
+                stats.append(((name, "size"), pool.size()))
+                stats.append(((name, "overflow"), pool.overflow()))
+        return stats
+
+    registry.gauge("aqd_db_pool_connections",
+                   "Connections of the database pools.", pool_stats,
+                   ["session", "state"])
+
+
+def _thread_pool_stats():
+    pool = reactor.getThreadPool()
+    return [(("max",), pool.max),
+            (("busy",), len(pool.working)),
+            (("idle",), len(pool.waiters)),
+            (("queued",), pool.q.qsize())]
+
+
+registry.gauge("aqd_thread_pool", "Occupancy of the thread pool executing "
+               "the commands.", _thread_pool_stats, ["state"])
+
+
+class MetricsResource(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader("Content-Type", "text/plain; version=0.0.4")
+        return registry.render().encode("utf-8")
@@ -367,8 +367,14 @@ class GitRepo(object):
         Create a temporary clone for working on the given branch
 
         This function is a context manager meant to be used in a with statement.
-        The temporary clone is removed automatically.
+        The temporary clone is removed automatically, or returned to the clone
+        pool if pooling is enabled.
         """
+        if clone_pool.enabled:
+            with clone_pool.checkout(self, branch) as repo:
+                yield repo
+            return
+
         config = Config()
         # TODO: is rundir suitable for this purpose?
         rundir = config.get("broker", "rundir")
@@ -392,6 +398,126 @@ class GitRepo(object):
             self.run(["push", "origin", ref])
 
 
+class GitClonePool(object):
+    """
+    Pool of reusable clones of a repository, keyed by branch
+
+    Creating a clone of a large repository for every command is expensive, so
+    clones handed out by GitRepo.temp_clone() are kept after use, and reset to
+    the state of the origin the next time the same branch is requested. A clone
+    is only ever used by a single command at a time; callers are still expected
+    to hold the same locks they would for a temporary clone.
+
+    Clones which were in use when an exception was raised, or which cannot be
+    reset, are thrown away.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._basedir = None
+        # Idle clones, in least recently used order: (origin, branch, tempdir)
+        self._idle = []
+
+    @property
+    def enabled(self):
+        return config.getint("broker", "git_clone_pool_size") > 0
+
+    def _get_basedir(self, logger):
+        with self._lock:
+            if self._basedir is None:
+                basedir = config.get("broker", "git_clone_pool_dir")
+                # Left-overs of a previous run are not tracked, get rid of them
+                if os.path.exists(basedir):
+                    remove_dir(basedir, logger=logger)
+                os.makedirs(basedir)
+                self._basedir = basedir
+            return self._basedir
+
+    def _acquire(self, origin, branch):
+        with self._lock:
+            for idx in range(len(self._idle) - 1, -1, -1):
+                if self._idle[idx][:2] == (origin, branch):
+                    return self._idle.pop(idx)[2]
+        return None
+
+    def _release(self, origin, branch, tempdir, logger):
+        per_branch = config.getint("broker", "git_clone_pool_size")
+        max_clones = config.getint("broker", "git_clone_pool_max_clones")
+        expired = []
+        with self._lock:
+            siblings = [entry for entry in self._idle
+                        if entry[:2] == (origin, branch)]
+            if len(siblings) >= per_branch:
+                expired.append(tempdir)
+            else:
+                self._idle.append((origin, branch, tempdir))
+                while len(self._idle) > max_clones:
+                    expired.append(self._idle.pop(0)[2])
+
+        for path in expired:
+            remove_dir(path, logger=logger)
+
+    def discard(self, branch, logger=LOGGER):
+        """
+        Remove all idle clones of the given branch
+        """
+        with self._lock:
+            expired = [entry[2] for entry in self._idle if entry[1] == branch]
+            self._idle = [entry for entry in self._idle if entry[1] != branch]
+
+        for path in expired:
+            remove_dir(path, logger=logger)
+
+    @staticmethod
+    def _reset(repo, branch):
+        repo.run(["fetch", "--prune", "origin"])
+        repo.run(["checkout", "--force", "-B", branch, "origin/" + branch])
+        repo.run(["clean", "-f", "-d", "-x", "-q"])
+
+    @contextmanager
+    def checkout(self, origin, branch):
+        """
+        Context manager returning a clean clone of origin at the given branch
+        """
+        logger = origin.logger
+        tempdir = self._acquire(origin.path, branch)
+        repo = None
+        if tempdir:
+            repo = GitRepo(os.path.join(tempdir, branch), logger=logger,
+                           loglevel=origin.loglevel)
+            try:
+                self._reset(repo, branch)
+            except ProcessException as err:
+                logger.info("Failed to reuse clone %s, discarding it: %s",
+                            repo.path, err)
+                remove_dir(tempdir, logger=logger)
+                repo = None
+
+        if not repo:
+            tempdir = mkdtemp(prefix="git_clone_",
+                              dir=self._get_basedir(logger))
+            try:
+                run_git(["clone", "--shared", "--branch", branch, "--",
+                         origin.path, branch],
+                        path=tempdir, logger=logger, loglevel=origin.loglevel)
+            except Exception:
+                remove_dir(tempdir, logger=logger)
+                raise
+            repo = GitRepo(os.path.join(tempdir, branch), logger=logger,
+                           loglevel=origin.loglevel)
+
+        try:
+            yield repo
+        except BaseException:
+            remove_dir(tempdir, logger=logger)
+            raise
+        else:
+            self._release(origin.path, branch, tempdir, logger)
+
+
+clone_pool = GitClonePool()
+
+
 IP_NOT_DEFINED_RE = re.compile(r"Host with IP address "
                                r"[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}"
                                r" is not defined")
@@ -420,8 +546,9 @@ def dsdb_enabled(view_func):
 class DSDBEnabledMeta(type):
     def __new__(mcls, name, bases, body):
         for name, obj in body.items():
-            if name[:2] == name[-2:] == '__' or name in ['normalize_iface', 'getenv']:
-                # skip special method names like __init__ and helper class methods
+            if name[0] == '_' or name in ['normalize_iface', 'getenv']:
+                # skip special method names like __init__, private and helper
+                # class methods
                 continue
             if isinstance(obj, types.FunctionType):
                 # decorate all functions
@@ -456,6 +583,7 @@ class DSDBRunner(object):
         self.actions = []
         self.rollback_list = []
         self.manager_grn = config.get('dsdb', 'manager_grn')
+        self.parallel_actions = config.getint('dsdb', 'parallel_actions')
 
     def normalize_iface(self, iface):
         return INVALID_NAME_RE.sub("_", iface)
@@ -465,46 +593,40 @@ class DSDBRunner(object):
         return env_calculate_method(self, obj)
 
     def commit(self, verbose=False):
-        for cmd_line, args, rollback, error_filter, ignore_msg in self.actions:
-            try:
-                if cmd_line:
-                    cmd = ["dsdb"]
-                    cmd.extend(args)
-                    if verbose:
-                        self.logger.client_info("DSDB: %s" %
-                                                " ".join(str(a) for a in args))
-                    run_command(cmd, env=self.getenv(), logger=self.logger)
-                else:
-                    self.invoke_dsdb_module(args, verbose=verbose)
-            except ProcessException as err:
-                if error_filter and err.out and error_filter.search(err.out):
-                    self.logger.warning(ignore_msg)
-                else:
-                    raise
-            except Exception as err:
-                self.logger.warning(str(err))
-                if error_filter:
-                    self.logger.warning(ignore_msg)
-                else:
-                    raise AquilonError("DSDB command failed: {}.".format(', '.join(args.keys())))
-            if rollback:
-                self.rollback_list.append((cmd_line, rollback))
+        for batch in self._batch_actions(self.actions):
+            results = self._run_batch([(action[0], action[1])
+                                       for action in batch],
+                                      verbose=verbose)
+            failure = None
+            # Results are processed in queue order, so the rollback list has
+            # the same ordering as if the actions were executed sequentially
+            for action, err in zip(batch, results):
+                (cmd_line, args, rollback, error_filter, ignore_msg,
+                 independent) = action
+                if err is not None:
+                    try:
+                        self._check_error(err, args, error_filter, ignore_msg)
+                    except Exception as failed:
+                        if failure is None:
+                            failure = failed
+                        continue
+                if rollback:
+                    self.rollback_list.append((cmd_line, rollback,
+                                               independent))
+            if failure is not None:
+                raise failure
 
     def rollback(self, verbose=False):
         self.rollback_list.reverse()
         rollback_failures = []
-        for cmd_line, args in self.rollback_list:
-            try:
-                if cmd_line:
-                    cmd = ["dsdb"]
-                    cmd.extend(args)
-                    self.logger.client_info("DSDB: %s" %
-                                            " ".join(str(a) for a in args))
-                    run_command(cmd, env=self.getenv(), logger=self.logger)
-                else:
-                    self.invoke_dsdb_module(args, verbose=True)
-            except Exception as err:
-                rollback_failures.append(str(err))
+        actions = [(cmd_line, args, None, None, None, independent)
+                   for cmd_line, args, independent in self.rollback_list]
+        for batch in self._batch_actions(actions):
+            results = self._run_batch([(action[0], action[1])
+                                       for action in batch],
+                                      verbose=True)
+            rollback_failures.extend(str(err) for err in results
+                                     if err is not None)
 
         did_something = bool(self.rollback_list)
         del self.rollback_list[:]
@@ -515,6 +637,94 @@ class DSDBRunner(object):
         elif did_something:
             self.logger.client_info("DSDB rollback completed.")
 
+    def _check_error(self, err, args, error_filter, ignore_msg):
+        if isinstance(err, ProcessException):
+            if error_filter and err.out and error_filter.search(err.out):
+                self.logger.warning(ignore_msg)
+            else:
+                raise err
+        else:
+            self.logger.warning(str(err))
+            if error_filter:
+                self.logger.warning(ignore_msg)
+            else:
+                raise AquilonError("DSDB command failed: {}."
+                                   .format(', '.join(args.keys())))
+
+    def _batch_actions(self, actions):
+        """
+        Split the list of actions into batches that can be executed together.
+
+        Consecutive command line actions which were registered as independent
+        with the same value form a single batch, if parallel execution is
+        enabled. Every other action is a batch on its own. Module calls share
+        a single client object, so they are always executed one at a time.
+        """
+        batch = []
+        for action in actions:
+            cmd_line, independent = action[0], action[5]
+            if batch and independent != batch[-1][5]:
+                yield batch
+                batch = []
+            if cmd_line and independent and self.parallel_actions > 1:
+                batch.append(action)
+                continue
+            if batch:
+                yield batch
+                batch = []
+            yield [action]
+        if batch:
+            yield batch
+
+    def _run_batch(self, batch, verbose=False):
+        """
+        Execute a list of (cmd_line, args) pairs.
+
+        Returns a list holding either None or the exception raised by the
+        corresponding action. At most parallel_actions commands are run at the
+        same time.
+        """
+        results = [None] * len(batch)
+        if len(batch) == 1:
+            try:
+                self._run_action(batch[0][0], batch[0][1], verbose=verbose)
+            except Exception as err:
+                results[0] = err
+            return results
+
+        # The context contains the log prefix
+        ctx = (context.get(ILogContext) or {}).copy()
+
+        def run_one(idx, cmd_line, args):
+            try:
+                callWithContext(ctx, self._run_action, cmd_line, args,
+                                verbose=verbose)
+            except Exception as err:
+                results[idx] = err
+
+        for start in range(0, len(batch), self.parallel_actions):
+            threads = [Thread(target=run_one, args=(idx, cmd_line, args))
+                       for idx, (cmd_line, args)
+                       in enumerate(batch[start:start + self.parallel_actions],
+                                    start)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        return results
+
+    def _run_action(self, cmd_line, args, verbose=False):
+        if cmd_line:
+            cmd = ["dsdb"]
+            cmd.extend(args)
+            if verbose:
+                self.logger.client_info("DSDB: %s" %
+                                        " ".join(str(a) for a in args))
+            run_command(cmd, env=self.getenv(), logger=self.logger)
+        else:
+            self.invoke_dsdb_module(args, verbose=verbose)
+
     def invoke_dsdb_module(self, args, verbose=False):
         for method, attributes in args.iteritems():
             if verbose:
@@ -535,7 +745,7 @@ class DSDBRunner(object):
             raise ArgumentError(error_msg)
 
     def add_action(self, command_args, rollback_args, error_filter=None,
-                   ignore_msg=False, cmd_line=True):
+                   ignore_msg=False, cmd_line=True, independent=False):
         """
         Register an action to execute and it's rollback counterpart.
 
@@ -544,12 +754,16 @@ class DSDBRunner(object):
         error_filter: regexp of error messages in the output of dsdb that
                       should be ignored
         ignore_msg: message to log if the error_filter matched
+        independent: the action does not depend on the actions registered
+                     right before it with the same value, so they may be
+                     executed in parallel. Use different values to keep
+                     phases which depend on each other apart.
         """
         if error_filter and not ignore_msg:
             raise InternalError("Specifying an error filter needs the message "
                                 "specified as well.")
         self.actions.append((cmd_line, command_args, rollback_args, error_filter,
-                             ignore_msg))
+                             ignore_msg, independent))
 
     def getenv(self):
         if self.dsdb_use_testdb:
@@ -719,7 +933,7 @@ class DSDBRunner(object):
                         ignore_msg="Delete chassis {} in DSDB failed, proceeding in AQDB.".format(dbchassis.label))
 
     def add_host_details(self, fqdn, ip, iface=None, mac=None, primary=None,
-                         comments=None, **_):
+                         comments=None, independent=False, **_):
         if not isinstance(ip, IPv4Address):
             return
 
@@ -738,7 +952,7 @@ class DSDBRunner(object):
             command.extend(["-comments", comments])
 
         rollback = ["delete_host", "-ip_address", ip]
-        self.add_action(command, rollback)
+        self.add_action(command, rollback, independent=independent)
 
     def update_host_details(self, fqdn, iface=None, new_ip=None, new_mac=None,
                             new_comments=None, old_ip=None, old_mac=None,
@@ -781,7 +995,7 @@ class DSDBRunner(object):
         self.add_action(command, rollback)
 
     def delete_host_details(self, fqdn, ip, iface=None, mac=None, primary=None,
-                            comments=None, **_):
+                            comments=None, independent=False, **_):
         if not isinstance(ip, IPv4Address):
             return
         command = ["delete_host", "-ip_address", ip]
@@ -798,7 +1012,7 @@ class DSDBRunner(object):
 
         self.add_action(command, rollback, IP_NOT_DEFINED_RE,
                         "DSDB did not have a host with this IP address, "
-                        "proceeding.")
+                        "proceeding.", independent=independent)
 
     @classmethod
     def snapshot_hw(cls, dbhw_ent):
@@ -1006,8 +1220,12 @@ class DSDBRunner(object):
         adds.sort(key=sort_by_primary)
         deletes.sort(key=sort_by_primary, reverse=True)
 
+        # Entries bound to a primary name do not depend on each other, only
+        # on the primary entry itself. The deletes and the adds may refer to
+        # the same IP address, so they must not end up in the same batch.
         for attrs in deletes:
-            self.delete_host_details(**attrs)
+            self.delete_host_details(
+                independent="delete" if attrs['primary'] else False, **attrs)
 
         for kwargs in addr_updates:
             # The old FQDN and interface name are the fixed point
@@ -1019,7 +1237,8 @@ class DSDBRunner(object):
             self.update_host_iface_name(**kwargs)
 
         for attrs in adds:
-            self.add_host_details(**attrs)
+            self.add_host_details(
+                independent="add" if attrs['primary'] else False, **attrs)
 
     def add_dns_domain(self, dns_domain, comments):
         if not comments:
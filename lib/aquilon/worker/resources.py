@@ -51,7 +51,7 @@ from xml.etree import ElementTree
 from six import iteritems
 
 from twisted.web import server, resource, http
-from twisted.internet import defer, threads
+from twisted.internet import defer
 from twisted.python import log, context
 from twisted.python.log import ILogContext
 
@@ -60,6 +60,7 @@ from aquilon.aqdb.types import StringEnum
 from aquilon.exceptions_ import ArgumentError, ProtocolError
 from aquilon.worker.formats.formatters import ResponseFormatter
 from aquilon.worker.broker import BrokerCommand, ERROR_TO_CODE
+from aquilon.worker.admission import admission_controller
 from aquilon.worker import commands
 from aquilon.worker.processes import cache_version
 from aquilon.worker.messages import StatusCatalog
@@ -221,7 +222,8 @@ class ResponsePage(resource.Resource):
                                                     style=style,
                                                     **arguments))
         if broker_command.defer_to_thread:
-            d = d.addCallback(lambda arguments: threads.deferToThread(
+            d = d.addCallback(lambda arguments: admission_controller.run(
+                broker_command, arguments["user"],
                 broker_command.invoke_render, **arguments))
 
             # Save the current log context, as it does not survive deferring
@@ -252,7 +254,11 @@ class ResponsePage(resource.Resource):
         return result
 
     def finishRender(self, result, request):
-        if result:
+        if getattr(request, "streamed", False):
+            # Part of the output was already sent by the formatter
+            if result:
+                request.write(result)
+        elif result:
             request.setHeader('content-length', str(len(result)))
             # TODO: When disconnected, why doesn't write() fail?
             request.write(result)
@@ -277,10 +283,23 @@ class ResponsePage(resource.Resource):
     def wrapNonInternalError(self, failure, request):
         """This takes care of 'expected' problems, like NotFoundException."""
         r = failure.trap(*ERROR_TO_CODE.keys())
+        if getattr(request, "streamed", False):
+            return self.finishStreamedError(ERROR_TO_CODE[r],
+                                            failure.getErrorMessage(),
+                                            request)
         request.setResponseCode(ERROR_TO_CODE[r])
         formatted = self.format(failure.value, request)
         return self.finishRender(formatted, request)
 
+    def finishStreamedError(self, code, msg, request):
+        """Terminate a partially sent NDJSON response with an error record.
+
+        The status line was sent with the first chunk, so the client would
+        otherwise see a successful, but truncated, response.
+        """
+        return self.finishRender(self.formatter.ndjson_error(code, msg),
+                                 request)
+
     # TODO: Something should go into both the logs and back to the client...
     def wrapError(self, failure, request):
         """This is generally the final stop for errors - anything will be
@@ -289,6 +308,9 @@ class ResponsePage(resource.Resource):
         log.msg("Internal Error: %s\nTraceback:\n%s" %
                 (msg, failure.getBriefTraceback()))
         # failure.printDetailedTraceback()
+        if getattr(request, "streamed", False):
+            return self.finishStreamedError(http.INTERNAL_SERVER_ERROR, msg,
+                                            request)
         request.setResponseCode(http.INTERNAL_SERVER_ERROR)
         request.setHeader("Content-Type", "text/plain; charset=utf-8")
         return self.finishRender(msg.encode("utf-8"), request)
@@ -19,12 +19,16 @@
 import os
 import errno
 import logging
+import shutil
+from hashlib import sha1
+from tempfile import mkdtemp
 import threading
 import weakref
+from collections import defaultdict
 from contextlib import contextmanager
 
 from sqlalchemy.inspection import inspect
-from sqlalchemy.orm import object_session
+from sqlalchemy.orm import object_session, Query
 
 from aquilon.exceptions_ import (InternalError, IncompleteError,
                                  NotFoundException, ArgumentError)
@@ -42,6 +46,122 @@ LOGGER = logging.getLogger(__name__)
 _mylocal = threading.local()
 
 
+class PlenaryStage(object):
+    """Shadow area collecting the plenary changes of a single request.
+
+    New templates are written below a private directory, and removals are
+    only recorded. publish() then moves everything into place using renames,
+    keeping hard links of the replaced files, so a later rollback() can put
+    the old files back without rewriting them. If the changes were not
+    published yet, rollback() just throws the shadow area away without
+    touching the real templates.
+
+    The staging directory should be on the same file system as the
+    templates, otherwise publishing falls back to copying.
+    """
+
+    config = Config()
+
+    def __init__(self, logger=LOGGER):
+        self.logger = logger
+        self.dir = None
+        # Target path => staged file, or None if the target is to be removed
+        self.pending = {}
+        self.order = []
+        # (target, backup) pairs of the published changes
+        self.published = []
+
+    def _shadow_path(self, kind, target):
+        if not self.dir:
+            stagedir = self.config.get("broker", "plenary_staging_dir")
+            if not os.path.exists(stagedir):
+                os.makedirs(stagedir)
+            self.dir = mkdtemp(prefix="plenary-", dir=stagedir)
+        return os.path.join(self.dir, kind, target.lstrip("/"))
+
+    def _record(self, target, staged):
+        if target not in self.pending:
+            self.order.append(target)
+        self.pending[target] = staged
+
+    def write(self, target, content):
+        try:
+            mode = os.stat(target).st_mode
+        except OSError:
+            mode = 0o644
+        staged = self._shadow_path("new", target)
+        write_file(staged, content, mode=mode, create_directory=True,
+                   logger=self.logger)
+        self._record(target, staged)
+
+    def remove(self, target):
+        self._record(target, None)
+
+    def publish(self):
+        """Move all staged changes into place."""
+        for target in self.order:
+            staged = self.pending[target]
+            if os.path.exists(target):
+                backup = self._shadow_path("old", target)
+                _link_or_copy(target, backup)
+            else:
+                backup = None
+            self.published.append((target, backup))
+
+            if staged:
+                dirname = os.path.dirname(target)
+                if not os.path.exists(dirname):
+                    os.makedirs(dirname)
+                self.logger.debug("Publishing %s", target)
+                shutil.move(staged, target)
+            elif backup:
+                self.logger.debug("Removing %s", target)
+                remove_file(target, cleanup_directory=True, logger=self.logger)
+
+        self.pending = {}
+        self.order = []
+
+    def rollback(self):
+        """Undo the published changes, and drop everything else."""
+        for target, backup in reversed(self.published):
+            self.logger.debug("Restoring %s", target)
+            if backup:
+                dirname = os.path.dirname(target)
+                if not os.path.exists(dirname):
+                    os.makedirs(dirname)
+                shutil.move(backup, target)
+                # Do not restore the timestamp of the plenary. If the
+                # rollback is due to just a couple of profiles failing from a
+                # large batch, we want the next domain compile to recompile
+                # the hosts that did not fail here.
+                os.utime(target, None)
+            else:
+                remove_file(target, cleanup_directory=True, logger=self.logger)
+        self.published = []
+        self.discard()
+
+    def discard(self):
+        """Throw away the shadow area."""
+        if self.dir:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.dir = None
+        self.pending = {}
+        self.order = []
+        self.published = []
+
+
+def _link_or_copy(source, dest):
+    dirname = os.path.dirname(dest)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    try:
+        os.link(source, dest)
+    except OSError as err:
+        if err.errno != errno.EXDEV:
+            raise
+        shutil.copy2(source, dest)
+
+
 class Plenary(object):
     template_type = "unique"
     """ Specifies the PAN template type to generate """
@@ -53,6 +173,15 @@ class Plenary(object):
 
     """
 
+    dependents = defaultdict(list)
+    """ Reverse dependency index, mapping (DB class, kind of data) pairs to
+        the plenary classes which embed that kind of data in the templates of
+        objects of the given DB class - e.g. (Host, "feature_parameters").
+        Plenary classes listed here must implement query_options().
+        See PlenaryCollection.add_dependents().
+
+    """
+
     prefix = None
     """ Path prefix used to check conflicts with e.g. archetype names """
 
@@ -88,6 +217,9 @@ class Plenary(object):
         self.changed = False
         self.allow_incomplete = allow_incomplete
 
+        # If set, files are staged there instead of being written directly
+        self.stage = None
+
     def __hash__(self):
         """Since equality is based on dbobj, just hash on it."""
         return hash(self.dbobj)
@@ -214,14 +346,49 @@ class Plenary(object):
 
         self.logger.debug("Writing %r [%s]", self, self.new_path)
 
-        write_file(self.new_path, content, create_directory=True,
-                   logger=self.logger)
+        if self.stage:
+            self.stage.write(self.new_path, content)
+        else:
+            write_file(self.new_path, content, create_directory=True,
+                       logger=self.logger)
         self.changed = True
         if self.new_path == self.old_path:
             self.removed = False
 
         return 1
 
+    def check_drift(self):
+        """Compare the template on disk with what _write() would produce.
+
+        Nothing is written. Returns a list of (plenary, problem) tuples, which
+        is empty if the file is up to date.
+        """
+
+        if isinstance(self.dbobj, CompileableMixin) and \
+           not self.ignore_compileable and \
+           not self.dbobj.archetype.is_compileable:
+            expected = None
+        else:
+            try:
+                expected = sha1(self._generate_content()).hexdigest()
+            except IncompleteError:
+                expected = None
+
+        try:
+            current = sha1(self.read()).hexdigest()
+        except NotFoundException:
+            current = None
+
+        if expected == current:
+            return []
+        elif expected is None:
+            problem = "should not exist"
+        elif current is None:
+            problem = "is missing"
+        else:
+            problem = "is out of date"
+        return [(self, "%s %s" % (self.old_path, problem))]
+
     def read(self):
         int_error = lambda e: \
             InternalError("Error reading plenary file %s: %s" %
@@ -246,8 +413,12 @@ class Plenary(object):
 
         if os.path.exists(self.old_path):
             self.logger.debug("Removing %r [%s]", self, self.old_path)
-        if remove_file(self.old_path, cleanup_directory=True,
-                       logger=self.logger):
+            if self.stage:
+                self.stage.remove(self.old_path)
+                self.removed = True
+        if not self.stage and remove_file(self.old_path,
+                                          cleanup_directory=True,
+                                          logger=self.logger):
             self.removed = True
         return 1
 
@@ -286,6 +457,12 @@ class Plenary(object):
                              "without having saved state.", self.old_path)
             return
 
+        # Staged files are restored by PlenaryStage.rollback()
+        if self.stage:
+            self.removed = False
+            self.changed = False
+            return
+
         # If the plenary has moved, then we need to clean up the new location
         if self.new_path and self.new_path != self.old_path:
             self.logger.debug("Removing %r [%s]", self, self.new_path)
@@ -333,6 +510,9 @@ class Plenary(object):
     def set_logger(self, logger):
         self.logger = logger
 
+    def set_stage(self, stage):
+        self.stage = stage
+
 
 class PlenaryParameterized(Plenary):
 
@@ -544,27 +724,46 @@ class PlenaryCollection(object):
             raise ArgumentError("\n".join(errors))
         return total
 
+    def check_drift(self):
+        drifted = []
+        for plen in self.plenaries:
+            drifted.extend(plen.check_drift())
+        return drifted
+
     def write(self, locked=False, remove_profile=True, verbose=False):
         # If locked is True, assume error handling happens higher
         # in the stack.
         total = 0
         key = None
+        stage = None
         try:
             if not locked:
                 key = self.get_key()
                 lock_queue.acquire(key)
 
+                # Nothing is written until all plenaries were generated
+                # successfully, so failures do not have to touch any files
+                stage = PlenaryStage(logger=self.logger)
+                self.set_stage(stage)
+
             # Pre-stash all plenaries before attempting to write any
             # of them.  This way if an error occurs all can go through
             # the same restore logic.
             self.stash()
 
             total = self._write(remove_profile=remove_profile)
+            if stage:
+                stage.publish()
         except:
+            if stage:
+                stage.rollback()
             if not locked:
                 self.restore_stash()
             raise
         finally:
+            if stage:
+                stage.discard()
+                self.set_stage(None)
             if not locked and key:
                 lock_queue.release(key)
 
@@ -583,6 +782,10 @@ class PlenaryCollection(object):
             plen.set_logger(logger)
         self.logger = logger
 
+    def set_stage(self, stage):
+        for plen in self.plenaries:
+            plen.set_stage(stage)
+
     def append(self, plenary):
         plenary.set_logger(self.logger)
         self.plenaries.append(plenary)
@@ -600,6 +803,38 @@ class PlenaryCollection(object):
             self.append(cls.get_plenary(dbobj_or_iterable,
                                         allow_incomplete=allow_incomplete))
 
+    def add_dependents(self, dbobj_or_query, kind, allow_incomplete=True):
+        """
+        Add only the plenaries whose content depends on the given kind of data.
+
+        The plenary classes are looked up in the Plenary.dependents index, and
+        a query is extended to load just the relations those classes need. If
+        the index has no entry, then all the plenaries of the objects are
+        added, and a query is used as-is.
+        """
+        if isinstance(dbobj_or_query, Query):
+            dbclass = dbobj_or_query.column_descriptions[0]["type"]
+        else:
+            dbclass = type(dbobj_or_query)
+
+        classes = Plenary.dependents.get((dbclass, kind), None)
+        if not classes:
+            self.add(dbobj_or_query, allow_incomplete=allow_incomplete)
+            return
+
+        if isinstance(dbobj_or_query, Query):
+            options = []
+            for cls in classes:
+                options.extend(cls.query_options())
+            dbobjs = dbobj_or_query.options(*options)
+        else:
+            dbobjs = [dbobj_or_query]
+
+        for dbobj in dbobjs:
+            for cls in classes:
+                self.append(cls.get_plenary(dbobj,
+                                            allow_incomplete=allow_incomplete))
+
     def flatten(self):
         """
         Flatten embedded plenary collections.
@@ -628,18 +863,35 @@ class PlenaryCollection(object):
 
     @contextmanager
     def transaction(self, verbose=False):
+        """Write the plenaries, and undo the changes if the body fails.
+
+        Everything, including the body, runs while holding the compile lock
+        of the plenaries. stash() reads the current templates, so unchanged
+        ones can be left alone, and the new templates are generated into a
+        PlenaryStage. Only if all of them could be generated are they moved
+        into place, with one rename per file. If generating a template or
+        the body fails, the published files are restored by renaming the
+        saved hard links back instead of rewriting their old content.
+        """
         with self.get_key():
+            stage = PlenaryStage(logger=self.logger)
+            self.set_stage(stage)
             self.stash()
             try:
                 count = self.write(locked=True)
+                stage.publish()
                 yield
                 # Do the logging only if the transaction succeeded
                 if verbose:
                     self.logger.client_info("Flushed %d/%d templates." %
                                             (count, len(self.plenaries)))
             except:
+                stage.rollback()
                 self.restore_stash()
                 raise
+            finally:
+                stage.discard()
+                self.set_stage(None)
 
 
 def add_location_info(lines, dblocation, prefix=""):
@@ -20,6 +20,7 @@ import logging
 from operator import attrgetter
 
 from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import joinedload, subqueryload
 
 from aquilon.aqdb.model import (Cluster, EsxCluster, ComputeCluster,
                                 StorageCluster)
@@ -62,6 +63,18 @@ class PlenaryCluster(PlenaryCollection):
         self.append(PlenaryClusterClient.get_plenary(dbcluster,
                                                      allow_incomplete=allow_incomplete))
 
+    @classmethod
+    def query_options(cls, prefix=""):
+        return [subqueryload(prefix + "location_constraint.parents"),
+                joinedload(prefix + "resholder"),
+                subqueryload(prefix + "resholder.resources"),
+                subqueryload(prefix + "_hosts"),
+                joinedload(prefix + "_hosts.host.hardware_entity"),
+                subqueryload(prefix + "allowed_personalities"),
+                subqueryload(prefix + "services_used"),
+                subqueryload(prefix + "services_provided"),
+                joinedload(prefix + "personality_stage")]
+
 
 Plenary.handlers[Cluster] = PlenaryCluster
 Plenary.handlers[ComputeCluster] = PlenaryCluster
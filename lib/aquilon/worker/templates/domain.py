@@ -17,8 +17,13 @@
 """Any work by the broker to write out (or read in?) templates lives here."""
 
 import os
+import errno
+import filecmp
 import logging
+import shutil
 import time
+from tempfile import mkdtemp
+from threading import Condition
 
 from aquilon.config import Config, lookup_file_path
 from aquilon.exceptions_ import ArgumentError, ProcessException, AquilonError
@@ -26,6 +31,7 @@ from aquilon.aqdb.model import (Host, Cluster, Fqdn, DnsDomain, DnsRecord,
                                 HardwareEntity, Sandbox, Domain, Archetype,
                                 Personality, PersonalityStage)
 from aquilon.worker.logger import CLIENT_INFO
+from aquilon.worker.metrics import compile_duration
 from aquilon.notify.index import trigger_notifications
 from aquilon.worker.processes import run_command
 
@@ -82,7 +88,7 @@ class TemplateDomain(object):
         return dirs
 
     def compile(self, session, only=None, panc_debug_include=None,
-                panc_debug_exclude=None, cleandeps=False):
+                panc_debug_exclude=None, cleandeps=False, snapshot=None):
         """Compile the template domain using the panc compiler.
 
         The build directories are checked and constructed
@@ -93,6 +99,10 @@ class TemplateDomain(object):
         If the 'only' parameter is provided, then it should be a
         list or set containing the profiles that need to be compiled.
 
+        If 'snapshot' is a DomainSnapshot, then the compiler reads and writes
+        the copies inside the snapshot instead of the live directories, and
+        no locking is needed.
+
         May raise ArgumentError exception, else returns the standard
         output (as a string) of the compile
         """
@@ -100,10 +110,15 @@ class TemplateDomain(object):
         only, nothing_to_do = self._preprocess_only(session, only)
         if nothing_to_do:
             return
+        if only is not None and not snapshot and compile_scheduler.enabled:
+            compile_scheduler.compile(self, only, panc_debug_include,
+                                      panc_debug_exclude, cleandeps)
+            return
         args = self._compute_panc_args(outputdir, templatedir, only,
                                        panc_debug_exclude, panc_debug_include,
-                                       cleandeps)
-        self._invoke_panc_compiler(args)
+                                       cleandeps, snapshot=snapshot)
+        # Snapshot compiles notify only after the profiles got published
+        self._invoke_panc_compiler(args, notify=not snapshot)
 
     def _preprocess_only(self, session, only):
         if only is not None:
@@ -207,8 +222,12 @@ class TemplateDomain(object):
         return formats, suffixes
 
     def _compute_panc_args(self, outputdir, templatedir, only,
-                           panc_debug_exclude, panc_debug_include, cleandeps):
+                           panc_debug_exclude, panc_debug_include, cleandeps,
+                           snapshot=None):
         config = Config()
+        if snapshot:
+            outputdir = snapshot.path("profiles")
+            templatedir = snapshot.path("templates")
         formats, suffixes = self._compute_formats_and_suffixes()
         formats.append("dep")
 
@@ -229,8 +248,13 @@ class TemplateDomain(object):
                     config.get("panc", "batch_size"))
         args.append("-Dant-contrib.jar=%s" %
                     config.get("tool_locations", "ant_contrib_jar"))
-        if isinstance(self.domain, Sandbox):
+        if isinstance(self.domain, Sandbox) or snapshot:
             args.append("-Ddomain.templates=%s" % templatedir)
+        if snapshot:
+            args.append("-Dsource.profiles=%s" % snapshot.path("source"))
+            args.append("-Dplenary=%s" % snapshot.path("plenary"))
+            args.append("-Dglobal.profiles=%s" % snapshot.path("objects"))
+            args.append("-Dcompiled.profiles=%s" % snapshot.path("build"))
         if only:
             # Use -Dforce.build=true?
             # TODO: pass the list in a temp file
@@ -250,10 +274,11 @@ class TemplateDomain(object):
             args.append("-Dclean.dep.files=%s" % cleandeps)
         return args
 
-    def _invoke_panc_compiler(self, args):
+    def _invoke_panc_compiler(self, args, notify=True):
         panc_env = self._compute_panc_env()
         config = Config()
         self.logger.info("starting compile")
+        start = time.time()
         try:
             run_command(args, env=panc_env, logger=self.logger,
                         path=config.get("broker", "quattordir"),
@@ -261,6 +286,8 @@ class TemplateDomain(object):
         except ProcessException:
             raise ArgumentError("Compilation failed, see the compiler "
                                 "messages for details.")
+        finally:
+            compile_duration.observe(time.time() - start)
 
         # Ugly hack. The File.lastModified() method is supposed to have
         # millisecond granularity, but the actual implementation in Java 7
@@ -273,4 +300,327 @@ class TemplateDomain(object):
         # anything this compilation used.
         time.sleep(1)
 
-        trigger_notifications(config, self.logger, CLIENT_INFO)
+        if notify:
+            trigger_notifications(config, self.logger, CLIENT_INFO)
+
+
+class _LoggerFanout(object):
+    """Send the messages of a shared compile to every requester."""
+
+    def __init__(self, loggers):
+        self.loggers = loggers
+
+    def __getattr__(self, name):
+        def fanout(*args, **kwargs):
+            for logger in self.loggers:
+                getattr(logger, name)(*args, **kwargs)
+        return fanout
+
+
+class _CompileRequest(object):
+    def __init__(self, template_domain, only):
+        self.template_domain = template_domain
+        self.only = only
+        self.done = False
+        self.error = None
+
+
+class CompileScheduler(object):
+    """Merge concurrent compiles of the same domain.
+
+    Commands modifying objects compile just the affected profiles, while
+    holding the compile lock of those profiles. Instead of starting a
+    separate compiler for every command, the requests are queued per domain.
+    If no compile is running for the domain, then the requester runs the
+    compiler itself, for all the requests queued at that point. Requests
+    arriving while a compile is running are merged into the next one.
+
+    The requesters keep holding their locks while waiting, so the profiles
+    are protected the same way as if they were compiled one by one. If a
+    merged compile fails, the requests are compiled again separately, so
+    every caller gets back the errors of its own profiles only.
+    """
+
+    def __init__(self):
+        self.condition = Condition()
+        # (domain, author, options) => list of pending requests
+        self.queues = {}
+        self.running = set()
+
+        config = Config()
+        self.enabled = config.getboolean("broker", "coalesce_compiles")
+        self.window = config.getfloat("broker", "compile_batch_window")
+
+    def compile(self, template_domain, only, panc_debug_include,
+                panc_debug_exclude, cleandeps):
+        if template_domain.author:
+            author = template_domain.author.name
+        else:
+            author = None
+        key = (template_domain.domain.name, author, panc_debug_include,
+               panc_debug_exclude, cleandeps)
+        request = _CompileRequest(template_domain, only)
+
+        with self.condition:
+            self.queues.setdefault(key, []).append(request)
+            while not request.done:
+                if key in self.running:
+                    self.condition.wait()
+                    continue
+
+                self.running.add(key)
+                self.condition.release()
+                try:
+                    if self.window:
+                        time.sleep(self.window)
+                    with self.condition:
+                        batch = self.queues.pop(key, [])
+                    self._run(batch, panc_debug_include, panc_debug_exclude,
+                              cleandeps)
+                finally:
+                    self.condition.acquire()
+                    self.running.discard(key)
+                    self.condition.notify_all()
+
+        if request.error:
+            raise request.error
+
+    def _compile(self, requests, panc_debug_include, panc_debug_exclude,
+                 cleandeps):
+        only = set()
+        for request in requests:
+            only.update(request.only)
+
+        leader = requests[0].template_domain
+        if len(requests) == 1:
+            logger = leader.logger
+        else:
+            logger = _LoggerFanout([request.template_domain.logger
+                                    for request in requests])
+            logger.client_info("Compiling %d profiles for %d requests "
+                               "together." % (len(only), len(requests)))
+
+        template_domain = TemplateDomain(leader.domain, leader.author,
+                                         logger=logger)
+        outputdir, templatedir = template_domain._prepare_dirs()
+        args = template_domain._compute_panc_args(outputdir, templatedir,
+                                                  sorted(only),
+                                                  panc_debug_exclude,
+                                                  panc_debug_include,
+                                                  cleandeps)
+        template_domain._invoke_panc_compiler(args)
+
+    def _run(self, batch, panc_debug_include, panc_debug_exclude, cleandeps):
+        try:
+            self._compile(batch, panc_debug_include, panc_debug_exclude,
+                          cleandeps)
+        except Exception as err:
+            if len(batch) == 1:
+                batch[0].error = err
+            else:
+                for request in batch:
+                    try:
+                        self._compile([request], panc_debug_include,
+                                      panc_debug_exclude, cleandeps)
+                    except Exception as err:
+                        request.error = err
+        finally:
+            for request in batch:
+                request.done = True
+
+
+compile_scheduler = CompileScheduler()
+
+
+def _snapshot_tree(source, dest, copy=False, ignore=()):
+    """Replicate a directory tree.
+
+    Files are hard linked by default, which is only safe for trees where all
+    writers replace files by renaming, like write_file() does. Trees the
+    compiler writes into should be copied instead.
+    """
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames[:] = [name for name in dirnames if name not in ignore]
+        relpath = os.path.relpath(dirpath, source)
+        target = os.path.normpath(os.path.join(dest, relpath))
+        if not os.path.exists(target):
+            os.makedirs(target)
+        for name in filenames:
+            src = os.path.join(dirpath, name)
+            dst = os.path.join(target, name)
+            try:
+                if copy:
+                    shutil.copy2(src, dst)
+                else:
+                    os.link(src, dst)
+            except (IOError, OSError) as err:
+                # Files of other domains may disappear while we're walking
+                if err.errno != errno.ENOENT:
+                    raise
+
+
+class DomainSnapshot(object):
+    """Point-in-time copy of everything needed to compile a domain.
+
+    take() has to be called while holding the compile lock of the domain.
+    The compiler can then run against the snapshot without any locks, and
+    publish() moves the results into place, again while holding the lock.
+    Profiles whose object template has changed since the snapshot was taken
+    are not published, but returned to the caller for recompilation.
+
+    Published build files get a timestamp from just before the snapshot, so
+    the dependency checking of the compiler will notice any template that
+    was modified after the snapshot was taken.
+    """
+
+    def __init__(self, template_domain, logger=LOGGER):
+        self.template_domain = template_domain
+        self.logger = logger
+        self.dir = None
+        self.timestamp = None
+        # Profile name => (inode, mtime) of the object template
+        self.sources = {}
+        # Profile name => mtime of the .dep file, in the snapshot and in the
+        # live build directory
+        self.deps = {}
+        self.live_deps = {}
+
+        config = Config()
+        self.extension = config.get("panc", "template_extension")
+        domain = template_domain.domain.name
+        quattordir = config.get("broker", "quattordir")
+        self.live = {
+            "source": os.path.join(config.get("broker", "cfgdir"),
+                                   "domains", domain, "profiles"),
+            "plenary": config.get("broker", "plenarydir"),
+            "templates": template_branch_basedir(config,
+                                                 template_domain.domain,
+                                                 template_domain.author),
+            "objects": os.path.join(quattordir, "objects"),
+            "build": os.path.join(quattordir, "build", domain),
+            "profiles": config.get("broker", "profilesdir"),
+        }
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def take(self):
+        config = Config()
+        snapshotdir = config.get("broker", "compile_snapshot_dir")
+        if not os.path.exists(snapshotdir):
+            os.makedirs(snapshotdir)
+        self.dir = mkdtemp(prefix=self.template_domain.domain.name + "-",
+                           dir=snapshotdir)
+        self.timestamp = int(time.time()) - 1
+
+        self.logger.client_info("Taking a snapshot of {0:l}."
+                                .format(self.template_domain.domain))
+        _snapshot_tree(self.live["source"], self.path("source"))
+        _snapshot_tree(self.live["plenary"], self.path("plenary"))
+        _snapshot_tree(self.live["templates"], self.path("templates"),
+                       ignore=(".git",))
+        for name, path in self._walk("source", self.extension):
+            st = os.stat(path)
+            self.sources[name] = (st.st_ino, st.st_mtime)
+
+        # The compiler overwrites the object templates of this domain in
+        # place, so only those need to be copied, the ones belonging to other
+        # domains can be linked
+        _snapshot_tree(self.live["objects"], self.path("objects"))
+        for name in self.sources:
+            self._copy("objects", name + self.extension)
+        _snapshot_tree(self.live["build"], self.path("build"), copy=True)
+        os.makedirs(self.path("profiles"))
+
+        for name, path in self._walk("build", ".dep"):
+            self.deps[name] = os.stat(path).st_mtime
+            self.live_deps[name] = self._live_mtime("build", name + ".dep")
+
+    def _live_mtime(self, tree, relpath):
+        try:
+            return os.stat(os.path.join(self.live[tree], relpath)).st_mtime
+        except OSError:
+            return None
+
+    def _walk(self, tree, extension):
+        top = self.path(tree)
+        for dirpath, _, filenames in os.walk(top):
+            for filename in filenames:
+                if filename.endswith(extension):
+                    path = os.path.join(dirpath, filename)
+                    name = os.path.relpath(path, top)[:-len(extension)]
+                    yield name, path
+
+    def _copy(self, tree, relpath):
+        src = os.path.join(self.live[tree], relpath)
+        dst = os.path.join(self.path(tree), relpath)
+        if not os.path.exists(dst):
+            return
+        os.unlink(dst)
+        try:
+            shutil.copy2(src, dst)
+        except (IOError, OSError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+    def _move(self, tree, relpath, timestamp=None):
+        src = os.path.join(self.path(tree), relpath)
+        dst = os.path.join(self.live[tree], relpath)
+        if not os.path.exists(src):
+            return
+        if os.path.exists(dst) and filecmp.cmp(src, dst):
+            return
+        if timestamp:
+            os.utime(src, (timestamp, timestamp))
+        dirname = os.path.dirname(dst)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        shutil.move(src, dst)
+
+    def publish(self):
+        """Publish the results of the compile.
+
+        Returns the list of profiles that need to be compiled again.
+        """
+        _, suffixes = self.template_domain._compute_formats_and_suffixes()
+        changed = []
+        count = 0
+        for name, path in self._walk("build", ".dep"):
+            if os.stat(path).st_mtime == self.deps.get(name):
+                # Not compiled by us
+                continue
+
+            try:
+                st = os.stat(os.path.join(self.live["source"],
+                                          name + self.extension))
+                current = (st.st_ino, st.st_mtime)
+            except OSError:
+                current = None
+            if current != self.sources.get(name):
+                if current:
+                    changed.append(name)
+                continue
+
+            if self._live_mtime("build", name + ".dep") != \
+               self.live_deps.get(name):
+                # Someone else has compiled the profile after the snapshot
+                continue
+
+            for suffix in [".dep"] + suffixes:
+                self._move("build", name + suffix, timestamp=self.timestamp)
+            for suffix in suffixes:
+                self._move("profiles", name + suffix,
+                           timestamp=self.timestamp)
+            self._move("objects", name + self.extension)
+            count += 1
+
+        self.logger.client_info("Published %d profiles compiled from the "
+                                "snapshot." % count)
+        if count:
+            trigger_notifications(Config(), self.logger, CLIENT_INFO)
+        return sorted(changed)
+
+    def discard(self):
+        if self.dir:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.dir = None
@@ -150,6 +150,29 @@ class PlenaryHostData(StructurePlenary):
     def template_name(cls, dbhost):
         return cls.prefix + "/" + str(dbhost.fqdn)
 
+    @classmethod
+    def query_options(cls, prefix=""):
+        hwprefix = prefix + "hardware_entity."
+        return [subqueryload(hwprefix + "interfaces"),
+                subqueryload(hwprefix + "interfaces.assignments"),
+                joinedload(hwprefix + 'interfaces.assignments.network'),
+                subqueryload(hwprefix + 'interfaces.assignments.dns_records'),
+                joinedload(hwprefix + 'model'),
+                joinedload(hwprefix + 'location'),
+                subqueryload(hwprefix + 'location.parents'),
+                subqueryload(prefix + "grns"),
+                joinedload(prefix + "resholder"),
+                subqueryload(prefix + "resholder.resources"),
+                subqueryload(prefix + "_cluster"),
+                lazyload(prefix + "_cluster.host")]
+
+    def get_key(self, exclusive=True):
+        # The data is only used when compiling the host, so it is protected by
+        # the same lock as the object template, which may not be written
+        # together with this plenary
+        plenary = PlenaryHostObject.get_plenary(self.dbobj, logger=self.logger)
+        return plenary.get_key(exclusive=exclusive)
+
     def body(self, lines):
         dbstage = self.dbobj.personality_stage
         dbhw_ent = self.dbobj.hardware_entity
@@ -335,6 +358,10 @@ class PlenaryHostData(StructurePlenary):
                 pan_assign(lines, base_path + "/" + path, params[path])
 
 
+Plenary.dependents[Host, "features"].append(PlenaryHostData)
+Plenary.dependents[Host, "feature_parameters"].append(PlenaryHostData)
+
+
 class PlenaryHostObject(ObjectPlenary):
     """
     A plenary template for a host, stored at the toplevel of the profiledir
@@ -344,6 +371,15 @@ class PlenaryHostObject(ObjectPlenary):
     def template_name(cls, dbhost):
         return str(dbhost.fqdn)
 
+    @classmethod
+    def query_options(cls, prefix=""):
+        return [subqueryload(prefix + "hardware_entity.interfaces"),
+                joinedload(prefix + 'hardware_entity.model'),
+                subqueryload(prefix + "services_used"),
+                subqueryload(prefix + "services_provided"),
+                subqueryload(prefix + "_cluster"),
+                lazyload(prefix + "_cluster.host")]
+
     def get_key(self, exclusive=True):
         keylist = [super(PlenaryHostObject, self).get_key(exclusive=exclusive)]
 
@@ -458,6 +494,9 @@ class PlenaryHostObject(ObjectPlenary):
         pan_include(lines, "archetype/final")
 
 
+Plenary.dependents[Host, "features"].append(PlenaryHostObject)
+
+
 class PlenaryHostArchetype(Plenary):
     """A plenary template for a host's archetype
 
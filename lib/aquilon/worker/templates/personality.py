@@ -125,16 +125,8 @@ class PlenaryPersonality(PlenaryCollection):
 
     @classmethod
     def query_options(cls, prefix="", load_personality=True):
-        options = []
-        if load_personality:
-            options.append(joinedload(prefix + 'personality'))
-        return options + [subqueryload(prefix + 'parameters'),
-                          subqueryload(prefix + 'features'),
-                          subqueryload(prefix + 'grns'),
-                          joinedload(prefix + 'features.feature'),
-                          joinedload(prefix + 'features.feature.param_def_holder'),
-                          subqueryload(prefix + 'features.feature.param_def_holder.param_definitions'),
-                          joinedload(prefix + 'features.model')]
+        return PlenaryPersonalityBase.query_options(
+            prefix=prefix, load_personality=load_personality)
 
 Plenary.handlers[PersonalityStage] = PlenaryPersonality
 
@@ -150,6 +142,22 @@ class PlenaryPersonalityBase(Plenary):
     def loadpath(cls, dbstage):
         return dbstage.personality.archetype.name
 
+    @classmethod
+    def query_options(cls, prefix="", load_personality=True):
+        holder = prefix + 'features.feature.param_def_holder'
+        options = []
+        if load_personality:
+            options.append(joinedload(prefix + 'personality'))
+        return options + [subqueryload(prefix + 'personality.root_users'),
+                          subqueryload(prefix + 'personality.root_netgroups'),
+                          subqueryload(prefix + 'parameters'),
+                          subqueryload(prefix + 'features'),
+                          subqueryload(prefix + 'grns'),
+                          joinedload(prefix + 'features.feature'),
+                          joinedload(holder),
+                          subqueryload(holder + '.param_definitions'),
+                          joinedload(prefix + 'features.model')]
+
     def body(self, lines):
         dbpers = self.dbobj.personality
 
@@ -220,6 +228,12 @@ class PlenaryPersonalityBase(Plenary):
                               exclusive=exclusive)
 
 
+Plenary.dependents[PersonalityStage, "features"].append(
+    PlenaryPersonalityBase)
+Plenary.dependents[PersonalityStage, "feature_parameters"].append(
+    PlenaryPersonalityBase)
+
+
 class PlenaryPersonalityParameter(StructurePlenary):
     prefix = "personality"
 
@@ -68,6 +68,31 @@ def set_thread_pool_size(config):
     reactor.suggestThreadPoolSize(int(pool_size))
 
 
+def add_metrics_service(config, service, bind_address=None):
+    """Serve the broker metrics on a separate port, if configured."""
+    if not config.has_value("broker", "metrics_port"):
+        return service
+
+    # Imported here for the same reason as RestServer
+    from twisted.web.server import Site
+    from aquilon.aqdb.db_factory import DbFactory
+    from aquilon.worker.metrics import MetricsResource, instrument_db
+
+    instrument_db(DbFactory())
+
+    port = config.get("broker", "metrics_port")
+    if bind_address:
+        addr = "tcp:%s:interface=%s" % (port, bind_address)
+    else:
+        addr = "tcp:%s" % port
+    log.msg("Serving metrics on %s" % addr)
+
+    multiService = MultiService()
+    multiService.addService(service)
+    multiService.addService(strports.service(addr, Site(MetricsResource())))
+    return multiService
+
+
 def make_required_dirs(config):
     for d in ["basedir", "profilesdir", "plenarydir", "rundir", "logdir"]:
         dir = config.get("broker", d)
@@ -179,7 +204,9 @@ class AQDMaker(object):
             os.makedirs(sockdir, 0o700)
 
         if options["usesock"]:
-            return strports.service("unix:%s/aqdsock" % sockdir, openSite)
+            return add_metrics_service(config,
+                                       strports.service("unix:%s/aqdsock" %
+                                                        sockdir, openSite))
 
         openport = config.get("broker", "openport")
         if config.has_option("broker", "bind_address"):
@@ -191,7 +218,9 @@ class AQDMaker(object):
 
         # Return before firing up knc.
         if options["noauth"]:
-            return strports.service(openaddr, openSite)
+            return add_metrics_service(config,
+                                       strports.service(openaddr, openSite),
+                                       bind_address)
 
         sockname = os.path.join(sockdir, "kncsock")
         # This flag controls whether or not this process will start up
@@ -257,6 +286,6 @@ class AQDMaker(object):
         multiService.addService(strports.service(unixsocket, kncSite))
         if not options["authonly"]:
             multiService.addService(strports.service(openaddr, openSite))
-        return multiService
+        return add_metrics_service(config, multiService, bind_address)
 
 serviceMaker = AQDMaker()
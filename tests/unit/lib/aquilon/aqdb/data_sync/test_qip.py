@@ -0,0 +1,167 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from ipaddress import IPv4Address, IPv4Network
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.data_sync.qip import (NetworkSummary, QIPInfo,
+                                            QIPRefresh, SortedWalker)
+
+LOCATION = mock.Mock(id=1)
+OTHER_LOCATION = mock.Mock(id=2)
+
+
+def summary(net_id, address, name=None, location=LOCATION, routers=()):
+    address = IPv4Network(address)
+    return NetworkSummary(id=net_id, ip=address.network_address,
+                          cidr=address.prefixlen,
+                          name=name or str(address.network_address),
+                          network_type="unknown", location_id=location.id,
+                          side="a", network_compartment_id=None,
+                          routers=set(routers))
+
+
+def qip(address, name=None, location=LOCATION, routers=()):
+    address = IPv4Network(address)
+    return QIPInfo(name=name or str(address.network_address),
+                   address=address, location=location,
+                   network_type="unknown", side="a", routers=list(routers),
+                   compartment=None)
+
+
+def old_walk(aqnetworks, qipnets):
+    """ Classification done by the dict-based walk used before """
+    aq_by_ip = {aqnet.ip: aqnet for aqnet in aqnetworks}
+    qip_by_ip = {qipinfo.address.network_address: qipinfo
+                 for qipinfo in qipnets}
+    changed = {}
+    aq_left = []
+    for ip, aqnet in aq_by_ip.items():
+        if ip not in qip_by_ip:
+            aq_left.append(aqnet.id)
+            continue
+        qipinfo = qip_by_ip.pop(ip)
+        if not QIPRefresh.is_unchanged(aqnet, qipinfo):
+            changed[aqnet.id] = qipinfo
+    return changed, sorted(aq_left), sorted(qip_by_ip.values())
+
+
+class TestSortedWalker(unittest.TestCase):
+    def test_walk(self):
+        items = ["a", "b"]
+        walker = SortedWalker(items)
+        self.assertEqual(walker.next(), "a")
+        # Processed items are released
+        self.assertEqual(items, [None, "b"])
+        self.assertEqual(walker.next(), "b")
+        self.assertIsNone(walker.next())
+        self.assertIsNone(walker.next())
+
+    def test_empty(self):
+        self.assertIsNone(SortedWalker([]).next())
+
+
+class TestIsUnchanged(unittest.TestCase):
+    def test_unchanged(self):
+        router = IPv4Address(u"10.0.0.1")
+        self.assertTrue(QIPRefresh.is_unchanged(
+            summary(1, u"10.0.0.0/24", routers=[router]),
+            qip(u"10.0.0.0/24", routers=[router])))
+
+    def test_changed(self):
+        aqnet = summary(1, u"10.0.0.0/24")
+        for qipinfo in [qip(u"10.0.0.0/25"),
+                        qip(u"10.0.0.0/24", name="renamed"),
+                        qip(u"10.0.0.0/24", location=OTHER_LOCATION),
+                        qip(u"10.0.0.0/24",
+                            routers=[IPv4Address(u"10.0.0.1")])]:
+            self.assertFalse(QIPRefresh.is_unchanged(aqnet, qipinfo))
+
+        qipinfo = qip(u"10.0.0.0/24")
+        qipinfo.compartment = mock.Mock(id=5)
+        self.assertFalse(QIPRefresh.is_unchanged(aqnet, qipinfo))
+
+
+class TestMatchNetworks(unittest.TestCase):
+    def match(self, aqnetworks, qipnets):
+        refresh = QIPRefresh.__new__(QIPRefresh)
+        refresh.building = None
+        refresh.aqnetworks = list(aqnetworks)
+        changed, aq_left, qip_left = refresh.match_networks(sorted(qipnets))
+
+        self.assertEqual((changed, sorted(aq_left), qip_left),
+                         old_walk(aqnetworks, qipnets))
+        self.assertIsNone(refresh.aqnetworks)
+        return changed, aq_left, qip_left
+
+    def test_unchanged(self):
+        self.assertEqual(self.match([summary(1, u"10.0.0.0/24")],
+                                    [qip(u"10.0.0.0/24")]),
+                         ({}, [], []))
+
+    def test_add_delete(self):
+        added = qip(u"10.0.2.0/24")
+        changed, aq_left, qip_left = self.match(
+            [summary(1, u"10.0.0.0/24"), summary(2, u"10.0.1.0/24")],
+            [qip(u"10.0.0.0/24"), added])
+        self.assertEqual(changed, {})
+        self.assertEqual(aq_left, [2])
+        self.assertEqual(qip_left, [added])
+
+    def test_update(self):
+        renamed = qip(u"10.0.0.0/24", name="renamed")
+        self.assertEqual(self.match([summary(1, u"10.0.0.0/24")], [renamed]),
+                         ({1: renamed}, [], []))
+
+    def test_split(self):
+        first = qip(u"10.0.0.0/25")
+        second = qip(u"10.0.0.128/25")
+        changed, aq_left, qip_left = self.match([summary(1, u"10.0.0.0/24")],
+                                                [second, first])
+        # The first subnet changes the netmask, the second one is new
+        self.assertEqual(changed, {1: first})
+        self.assertEqual(aq_left, [])
+        self.assertEqual(qip_left, [second])
+
+    def test_merge(self):
+        merged = qip(u"10.0.0.0/24")
+        changed, aq_left, qip_left = self.match(
+            [summary(1, u"10.0.0.0/25"), summary(2, u"10.0.0.128/25")],
+            [merged])
+        self.assertEqual(changed, {1: merged})
+        self.assertEqual(aq_left, [2])
+        self.assertEqual(qip_left, [])
+
+    def test_building_filter(self):
+        refresh = QIPRefresh.__new__(QIPRefresh)
+        refresh.building = mock.sentinel.building
+        refresh.location_buildings = {LOCATION.id: mock.sentinel.building,
+                                      OTHER_LOCATION.id: mock.sentinel.other}
+        refresh.aqnetworks = [summary(1, u"10.0.0.0/24"),
+                              summary(2, u"10.0.1.0/24",
+                                      location=OTHER_LOCATION)]
+        # Networks in other buildings must not be deleted
+        self.assertEqual(refresh.match_networks([]), ({}, [1], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+with patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import (Base, AddressAlias, DnsDomain,
+                                    DnsEnvironment, DnsRecord, Fqdn)
+    from aquilon.aqdb.model.alias import Alias, AliasGraph
+
+from aquilon.exceptions_ import ArgumentError
+
+# Name -> (record type, target)
+RECORDS = {"a": ("alias", "b"),
+           "b": ("alias", "c"),
+           "c": ("reserved_name", None),
+           "d": ("address_alias", "c"),
+           "x": ("alias", "y"),
+           "y": ("alias", "x")}
+NAMES = ["a", "b", "c", "d", "e", "x", "y"]
+
+
+class TestAliasGraph(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[DnsEnvironment.__table__,
+                                                 DnsDomain.__table__,
+                                                 Fqdn.__table__,
+                                                 DnsRecord.__table__,
+                                                 Alias.__table__,
+                                                 AddressAlias.__table__])
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+        conn = self.session.connection()
+        conn.execute(DnsEnvironment.__table__.insert(), id=1, name="internal")
+        conn.execute(DnsDomain.__table__.insert(), id=1, name="ms.com")
+        for fqdn_id, name in enumerate(NAMES, 1):
+            conn.execute(Fqdn.__table__.insert(), id=fqdn_id, name=name,
+                         dns_domain_id=1, dns_environment_id=1)
+        records = sorted(RECORDS.items())
+        for rec_id, (name, (rec_type, target)) in enumerate(records, 1):
+            conn.execute(DnsRecord.__table__.insert(), id=rec_id,
+                         fqdn_id=NAMES.index(name) + 1,
+                         dns_record_type=rec_type)
+            if target:
+                table = Alias.__table__ if rec_type == "alias" \
+                    else AddressAlias.__table__
+                conn.execute(table.insert(), dns_record_id=rec_id,
+                             target_id=NAMES.index(target) + 1)
+
+        self.fqdns = dict((dbfqdn.name, dbfqdn)
+                          for dbfqdn in self.session.query(Fqdn))
+
+        self.statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args:
+                     self.statements.append(statement))
+
+    def graph(self, *names):
+        graph = AliasGraph(self.session)
+        graph.load([self.fqdns[name] for name in names])
+        return graph
+
+    def test_depth(self):
+        graph = self.graph("a", "d")
+        self.assertEqual(graph.depth(self.fqdns["a"]), 2)
+        self.assertEqual(graph.depth(self.fqdns["b"]), 1)
+        self.assertEqual(graph.depth(self.fqdns["c"]), 0)
+        # Address aliases do not count
+        self.assertEqual(graph.depth(self.fqdns["d"]), 0)
+
+    def test_query_per_level(self):
+        self.graph("a", "d", "x")
+        # Levels: {a, d, x}, {b, c, y}
+        self.assertEqual(len(self.statements), 2)
+
+    def test_final_targets(self):
+        graph = self.graph("a", "d", "e")
+        self.assertEqual(graph.final_targets(self.fqdns["a"]),
+                         [self.fqdns["c"]])
+        self.assertEqual(graph.final_targets(self.fqdns["d"]),
+                         [self.fqdns["c"]])
+        self.assertEqual(graph.final_targets(self.fqdns["e"]),
+                         [self.fqdns["e"]])
+
+    def test_reaches(self):
+        graph = self.graph("a", "c")
+        self.assertTrue(graph.reaches(self.fqdns["a"], self.fqdns["c"]))
+        self.assertFalse(graph.reaches(self.fqdns["c"], self.fqdns["a"]))
+
+    def test_height(self):
+        graph = AliasGraph(self.session)
+        graph.load_aliases([self.fqdns["c"]])
+        self.assertEqual(graph.height(self.fqdns["c"]), 2)
+        self.assertEqual(graph.height(self.fqdns["a"]), 0)
+
+    def test_loop(self):
+        graph = self.graph("x")
+        self.assertRaises(ArgumentError, graph.depth, self.fqdns["x"])
+        self.assertRaises(ArgumentError, graph.final_targets, self.fqdns["x"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from ipaddress import IPv4Address, IPv4Network
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import (AddressAssignment, Base, Network,
+                                    PortGroup, PublicInterface)
+
+from aquilon.worker.dbwrappers.interface import lock_port_groups
+from aquilon.worker.dbwrappers.network import fix_foreign_links
+
+
+class TestGuestCount(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        # Deleting and moving addresses touches many other tables
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+        # SQLite does not enforce the foreign keys to the location, network
+        # environment, model and hardware tables, so they are left out
+        self.net1 = self.add_network(u"10.0.0.0/24", 100)
+        self.net2 = self.add_network(u"10.0.1.0/24", 101)
+        self.session.flush()
+
+    def add_network(self, address, tag=None):
+        dbnetwork = Network(network=IPv4Network(address), name=address,
+                            network_type="unknown", location_id=1,
+                            network_environment_id=1)
+        self.session.add(dbnetwork)
+        if tag:
+            self.session.add(PortGroup(network=dbnetwork, network_tag=tag,
+                                       usage="user"))
+        return dbnetwork
+
+    def add_interface(self, name, port_group=None):
+        dbinterface = PublicInterface(name=name, hardware_entity_id=1,
+                                      model_id=1, port_group=port_group)
+        self.session.add(dbinterface)
+        return dbinterface
+
+    def add_address(self, dbinterface, dbnetwork, ip):
+        dbaddr = AddressAssignment(interface=dbinterface, network=dbnetwork,
+                                   ip=IPv4Address(ip))
+        self.session.add(dbaddr)
+        return dbaddr
+
+    def assertCounts(self, *counts):
+        self.session.flush()
+        self.assertEqual((self.net1.guest_count, self.net2.guest_count),
+                         counts)
+        # The stored counters must match what the slow queries compute
+        self.assertEqual((self.net1.count_guests(), self.net2.count_guests()),
+                         counts)
+
+    def test_add_delete_address(self):
+        dbaddr = self.add_address(self.add_interface("eth0"), self.net1,
+                                  u"10.0.0.10")
+        self.assertCounts(1, 0)
+
+        self.session.delete(dbaddr)
+        self.assertCounts(0, 0)
+
+    def test_move_address(self):
+        dbaddr = self.add_address(self.add_interface("eth0"), self.net1,
+                                  u"10.0.0.10")
+        self.assertCounts(1, 0)
+
+        dbaddr.network = self.net2
+        dbaddr.ip = IPv4Address(u"10.0.1.10")
+        self.assertCounts(0, 1)
+
+    def test_add_delete_interface(self):
+        dbinterface = self.add_interface("eth0", self.net1.port_group)
+        self.assertCounts(1, 0)
+
+        # An address on the same network does not count twice
+        self.add_address(dbinterface, self.net1, u"10.0.0.10")
+        self.assertCounts(1, 0)
+
+        self.session.delete(dbinterface)
+        self.assertCounts(0, 0)
+
+    def test_move_interface(self):
+        dbinterface = self.add_interface("eth0", self.net1.port_group)
+        self.assertCounts(1, 0)
+
+        dbinterface.port_group = self.net2.port_group
+        self.assertCounts(0, 1)
+
+    def test_split(self):
+        self.add_address(self.add_interface("eth0"), self.net1, u"10.0.0.10")
+        dbinterface = self.add_interface("eth1", self.net1.port_group)
+        self.add_address(dbinterface, self.net1, u"10.0.0.200")
+        self.assertCounts(2, 0)
+
+        self.net1.cidr = 25
+        subnet = self.add_network(u"10.0.0.128/25")
+        self.session.flush()
+        fix_foreign_links(self.session, self.net1, subnet)
+
+        # Once its address moved to the new subnet, eth1 is counted as a user
+        # of the port group
+        self.assertCounts(2, 0)
+
+    def test_merge(self):
+        self.net1.cidr = 25
+        subnet = self.add_network(u"10.0.0.128/25")
+        self.add_address(self.add_interface("eth0"), subnet, u"10.0.0.200")
+        self.assertCounts(0, 0)
+
+        self.net1.cidr = 24
+        self.session.flush()
+        fix_foreign_links(self.session, subnet, self.net1)
+        self.assertCounts(1, 0)
+
+    def test_lock_reloads_count(self):
+        self.assertCounts(0, 0)
+        dbpg = self.net1.port_group
+
+        # Another request allocates the port group while we wait for the lock
+        table = PortGroup.__table__
+        self.session.execute(table.update().where(table.c.id == dbpg.id)
+                             .values(guest_count=1))
+        self.assertEqual(self.net1.guest_count, 0)
+
+        lock_port_groups(self.session, [dbpg])
+        self.assertEqual(self.net1.guest_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+with patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import Vendor
+
+from aquilon.aqdb.reference_cache import reference_cache
+
+
+class TestReferenceCache(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Vendor.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+
+        self.statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args:
+                     self.statements.append(statement))
+
+        reference_cache.enable()
+        self.addCleanup(reference_cache.disable)
+
+        session = self.Session()
+        session.add(Vendor(name="hp"))
+        session.commit()
+        session.close()
+
+    def lookup(self):
+        session = self.Session()
+        del self.statements[:]
+        dbvendor = Vendor.get_unique(session, "hp", compel=True)
+        return session, dbvendor
+
+    def test_hit(self):
+        session, dbvendor = self.lookup()
+        self.assertTrue(self.statements)
+        session.commit()
+
+        session, dbvendor = self.lookup()
+        self.assertEqual(self.statements, [])
+        self.assertEqual(dbvendor.name, "hp")
+        self.assertIn(dbvendor, session)
+        session.commit()
+
+    def test_invalidate_on_commit(self):
+        session, dbvendor = self.lookup()
+        session.commit()
+
+        session, dbvendor = self.lookup()
+        dbvendor.comments = "Some comments"
+        session.commit()
+        self.assertEqual(reference_cache.entries, {})
+
+        session, dbvendor = self.lookup()
+        self.assertEqual(dbvendor.comments, "Some comments")
+        session.commit()
+
+    def test_uncommitted_delete(self):
+        session, dbvendor = self.lookup()
+        session.commit()
+
+        session, dbvendor = self.lookup()
+        session.delete(dbvendor)
+        self.assertEqual(Vendor.get_unique(session, "hp"), None)
+        session.rollback()
+
+        session, dbvendor = self.lookup()
+        self.assertEqual(self.statements, [])
+        session.commit()
+
+    def test_concurrent_update(self):
+        # The transaction of the first session starts before the second one
+        # commits its change, so its result must not be cached
+        session1 = self.Session()
+        session1.query(Vendor.id).all()
+
+        session2, dbvendor = self.lookup()
+        dbvendor.comments = "Some comments"
+        session2.commit()
+
+        Vendor.get_unique(session1, "hp")
+        session1.commit()
+        self.assertEqual(reference_cache.entries, {})
@@ -0,0 +1,124 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import oracle, postgresql
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import Vendor
+
+from aquilon.aqdb.utils.bulk_lookup import (MAX_DEFAULT_KEYS,
+                                            MAX_ORACLE_KEYS, in_keys,
+                                            key_chunks)
+
+
+def fake_session(dialect_name):
+    session = mock.Mock()
+    session.bind.dialect.name = dialect_name
+    return session
+
+
+class TestSQLite(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Vendor.__table__.create(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+        for idx in range(1200):
+            self.session.add(Vendor(name="v%d" % idx))
+        self.session.commit()
+
+    def test_key_chunks(self):
+        sizes = [len(key_chunk) for key_chunk
+                 in key_chunks(self.session, range(1200))]
+        self.assertEqual(sizes, [MAX_DEFAULT_KEYS, MAX_DEFAULT_KEYS, 200])
+        self.assertEqual(list(key_chunks(self.session, [])), [])
+
+    def test_lookup(self):
+        names = ["v%d" % idx for idx in range(0, 1200, 2)]
+        found = []
+        for name_chunk in key_chunks(self.session, names):
+            q = self.session.query(Vendor.name)
+            q = q.filter(in_keys(self.session, Vendor.name, name_chunk))
+            found.extend(name for name, in q)
+        self.assertEqual(sorted(found), sorted(names))
+
+
+class TestPostgreSQL(unittest.TestCase):
+    def setUp(self):
+        self.session = fake_session("postgresql")
+
+    def test_key_chunks(self):
+        keys = list(range(100000))
+        self.assertEqual(list(key_chunks(self.session, keys)), [keys])
+        self.assertEqual(list(key_chunks(self.session, [])), [])
+
+    def test_any_array(self):
+        expr = in_keys(self.session, Vendor.id, [1, 2, 3])
+        compiled = expr.compile(dialect=postgresql.dialect())
+        self.assertEqual(str(compiled),
+                         "vendor.id = any(%(param_1)s)")
+        self.assertEqual(compiled.params, {"param_1": [1, 2, 3]})
+
+    def test_empty(self):
+        expr = in_keys(self.session, Vendor.id, [])
+        compiled = expr.compile(dialect=postgresql.dialect())
+        self.assertNotIn("any(", str(compiled))
+
+
+class TestOracle(unittest.TestCase):
+    def setUp(self):
+        self.session = fake_session("oracle")
+
+    def compile(self, keys):
+        expr = in_keys(self.session, Vendor.id, keys)
+        return expr.compile(dialect=oracle.dialect())
+
+    def test_key_chunks(self):
+        sizes = [len(key_chunk) for key_chunk
+                 in key_chunks(self.session, range(70000))]
+        self.assertEqual(sizes, [MAX_ORACLE_KEYS, MAX_ORACLE_KEYS, 6000])
+
+    def test_padding(self):
+        compiled = self.compile([1, 2, 3])
+        self.assertEqual(str(compiled).count(" IN ("), 1)
+        # Padded to the smallest bucket by repeating the last key
+        self.assertEqual(sorted(compiled.params.values()),
+                         [1, 2] + [3] * 8)
+
+        self.assertEqual(len(self.compile(range(11)).params), 100)
+
+    def test_multiple_in_lists(self):
+        compiled = self.compile(range(1500))
+        sql = str(compiled)
+        # 2000 keys split to two IN lists joined by OR
+        self.assertEqual(sql.count(" IN ("), 2)
+        self.assertEqual(sql.count(" OR "), 1)
+        self.assertEqual(len(compiled.params), 2000)
+        self.assertEqual(set(compiled.params.values()), set(range(1500)))
+
+
+if __name__ == '__main__':
+    unittest.main()
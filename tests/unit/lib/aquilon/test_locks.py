@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from aquilon.locks import LockQueue, LockKey
+
+
+class TestLockAccounting(unittest.TestCase):
+    def setUp(self):
+        self.queue = LockQueue()
+
+    def make_key(self, **exclusive):
+        key = LockKey(lock_queue=self.queue)
+        for name, item in exclusive.items():
+            key.exclusive[name].add(item)
+        key.transition("initialized")
+        return key
+
+    def test_blockers(self):
+        holder = self.make_key(domain="prod")
+        other = self.make_key(profile="host1")
+        waiter = self.make_key(domain="prod")
+
+        self.queue.acquire(holder)
+        self.queue.acquire(other)
+        self.queue.queue.append(waiter)
+        self.assertTrue(self.queue.blocked(waiter))
+        self.assertEqual(waiter.blocked_by, [holder])
+
+        self.queue.queue.remove(waiter)
+        self.queue.release(holder)
+        self.queue.release(other)
+
+    def test_stats(self):
+        key = self.make_key(domain="prod", profile="host1")
+        self.assertEqual(key.waited(), None)
+        self.assertEqual(key.held(), None)
+
+        with key:
+            self.assertEqual(key.state, "acquired")
+            self.assertTrue(key.held() >= 0)
+
+        released = key.timestamps["released"]
+        self.assertEqual(key.held(), key.held(now=released + 100))
+
+        stats = self.queue.statistics()
+        self.assertEqual(sorted(stats.keys()), ["domain", "profile"])
+        self.assertEqual(stats["domain"].acquired, 1)
+        self.assertEqual(stats["domain"].contended, 0)
+        self.assertEqual(stats["domain"].released, 1)
+        self.assertEqual(stats["domain"].hold_total, key.held())
+
+
+if __name__ == '__main__':
+    unittest.main()
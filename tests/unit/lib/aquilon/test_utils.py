@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import jsonschema
+
+from aquilon import utils
+
+
+class TestSchemaValidators(unittest.TestCase):
+    schema = {"type": "array", "items": {"type": "integer"}, "maxItems": 2}
+
+    def test_schema_is_checked_once(self):
+        utils.get_schema_validator(self.schema)
+        saved = jsonschema.Draft4Validator.check_schema
+        try:
+            jsonschema.Draft4Validator.check_schema = None
+            validator = utils.get_schema_validator(dict(self.schema))
+        finally:
+            jsonschema.Draft4Validator.check_schema = saved
+        self.assertTrue(validator.is_valid([1, 2]))
+
+    def test_invalid_schema(self):
+        self.assertRaises(jsonschema.SchemaError, utils.get_schema_validator,
+                          {"type": "no-such-type"})
+
+    def test_validate_values(self):
+        validator = utils.get_schema_validator(self.schema)
+        failed = utils.validate_json_values(validator,
+                                            [("a", [1]), ("b", [1, 2, 3]),
+                                             ("c", ["x"])])
+        self.assertEqual(failed, [("b", "[1, 2, 3] is too long"),
+                                  ("c", "'x' is not of type 'integer'")])
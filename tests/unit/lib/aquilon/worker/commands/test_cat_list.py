@@ -0,0 +1,127 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from aquilon.exceptions_ import ArgumentError, NotFoundException
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+
+# As these are unit tests, we do not need the full broker capability,
+# we can thus mock the DbFactory in order for it not to try and open
+# the database (which is not required anyway)
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import Base
+    from aquilon.worker.commands import cat_cluster_list, cat_list
+
+
+def get_mock_config(max_size):
+    config = mock.MagicMock()
+    config.has_option.return_value = True
+    config.get.return_value = str(max_size)
+    config.getint.return_value = max_size
+    return config
+
+
+def get_mock_plenary(name, content):
+    plenary = mock.MagicMock()
+    plenary.template_name.return_value = name
+    if content is None:
+        plenary.read.side_effect = NotFoundException("%s not found" % name)
+    else:
+        plenary.read.return_value = content
+    plenary._generate_content.return_value = "generated " + name
+    return plenary
+
+
+class TestCommandCatList(unittest.TestCase):
+    def get_command(self, plenaries):
+        command = cat_list.CommandCatList()
+        command.command = "cat"
+        command.config = get_mock_config(2)
+        command.get_objects = mock.Mock(return_value=list(plenaries))
+        patcher = mock.patch.object(cat_list.Plenary, 'get_plenary',
+                                    side_effect=lambda plenary, **_: plenary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return command
+
+    def test_json_map(self):
+        command = self.get_command([get_mock_plenary("hosts/b", "B"),
+                                    get_mock_plenary("hosts/a", "A"),
+                                    get_mock_plenary("hosts/c", None)])
+        logger = mock.Mock()
+        result = command.render(session=None, logger=logger, generate=False,
+                                json_map=True)
+
+        # Missing templates are reported, but do not fail the command
+        self.assertEqual(json.loads(result), {"hosts/a": "A", "hosts/b": "B"})
+        self.assertEqual(logger.client_info.call_count, 1)
+
+    def test_concatenated(self):
+        command = self.get_command([get_mock_plenary("hosts/b", "B"),
+                                    get_mock_plenary("hosts/a", "A")])
+        result = command.render(session=None, logger=mock.Mock(),
+                                generate=True, json_map=False)
+        self.assertEqual(result, "generated hosts/a\ngenerated hosts/b")
+
+    def test_list_size_limit(self):
+        command = cat_list.CommandCatList()
+        command.command = "cat"
+        command.config = get_mock_config(2)
+        session = mock.Mock()
+        self.assertRaises(ArgumentError, command.get_objects, session,
+                          list=["a", "b", "c"])
+        command.config.get.assert_called_with("broker", "cat_max_list_size")
+        # The limit is checked before looking at the database
+        self.assertFalse(session.query.called)
+
+
+class TestCommandCatClusterList(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+        self.command = cat_cluster_list.CommandCatClusterList()
+        self.command.command = "cat"
+        self.command.config = get_mock_config(2)
+
+    def test_list_size_limit(self):
+        self.assertRaises(ArgumentError, self.command.get_objects,
+                          self.session, cluster_list=["a", "b", "c"])
+
+    def test_missing(self):
+        # The query uses the options of the cluster plenaries
+        with self.assertRaises(ArgumentError) as cm:
+            self.command.get_objects(self.session,
+                                     cluster_list=["Cluster2", "cluster1"])
+        self.assertEqual(str(cm.exception),
+                         "Cluster(s) not found: cluster1, cluster2")
+
+
+if __name__ == '__main__':
+    unittest.main()
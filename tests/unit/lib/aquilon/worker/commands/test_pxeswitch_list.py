@@ -0,0 +1,145 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+
+# As these are unit tests, we do not need the full broker capability,
+# we can thus mock the DbFactory in order for it not to try and open
+# the database (which is not required anyway)
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.exceptions_ import PartialError, ProcessException
+    from aquilon.worker.commands import pxeswitch_list
+
+
+class TestCommandPXESwitchList(unittest.TestCase):
+    def setUp(self):
+        self.dbservice = mock.Mock()
+        self.hosts = []
+        self.calls = []
+        self.failing = set()
+        self.threads = set()
+        self.lock = threading.Lock()
+
+        for target in ["Service", "ChangeManagement", "ExternalKey",
+                       "check_hostlist_size"]:
+            patcher = mock.patch.object(pxeswitch_list, target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        pxeswitch_list.Service.get_unique.return_value = self.dbservice
+
+        patcher = mock.patch.object(pxeswitch_list, "hostlist_to_hosts",
+                                    return_value=self.hosts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(pxeswitch_list, "run_command",
+                                    side_effect=self.fake_run_command)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_run_command(self, args, **_):
+        servers = args[args.index("--servers") + 1]
+        with self.lock:
+            self.calls.append(servers)
+            self.threads.add(threading.current_thread())
+        if servers in self.failing:
+            raise ProcessException(command="aii-installfe", code=1)
+
+    def add_hosts(self, instance, count):
+        si = mock.Mock()
+        si.name = instance
+        si.service = self.dbservice
+        server = mock.Mock(host=None, fqdn=instance + ".example.com")
+        si.servers = [server]
+        for i in range(count):
+            dbhost = mock.MagicMock()
+            dbhost.fqdn = "%s-host%d.example.com" % (instance, i)
+            dbhost.__str__.return_value = dbhost.fqdn
+            dbhost.status.name = "build"
+            dbhost.services_used = [si]
+            self.hosts.append(dbhost)
+
+    @staticmethod
+    @mock.patch.object(pxeswitch_list.CommandPXESwitchList, '__init__')
+    def get_command_instance(mock_init):
+        mock_init.return_value = None
+        command = pxeswitch_list.CommandPXESwitchList()
+        command.command = "pxeswitch_list"
+        command.config = mock.Mock()
+        settings = {"installfe_user": "aqd", "logdir": "/var/tmp"}
+        command.config.get.side_effect = lambda _, name: settings[name]
+        command.config.lookup_tool.return_value = "ssh"
+        command.config.has_value.return_value = False
+        command.config.getint.return_value = 2
+        return command
+
+    def render(self, logger):
+        arguments = dict((option, None) for option in
+                         pxeswitch_list.CommandPXESwitchList._option_map)
+        arguments["install"] = True
+        command = self.get_command_instance()
+        command.render(session=mock.Mock(), logger=logger, list="list",
+                       justification=None, reason=None, user=None,
+                       **arguments)
+
+    def test_instances_run_in_parallel(self):
+        for instance in ["bs1", "bs2", "bs3"]:
+            self.add_hosts(instance, 2)
+        logger = mock.Mock()
+        self.render(logger)
+
+        self.assertEqual(sorted(self.calls),
+                         ["aqd@bs1.example.com",
+                          "aqd@bs2.example.com",
+                          "aqd@bs3.example.com"])
+        self.assertLessEqual(len(self.threads), 2)
+        self.assertEqual(logger.client_info.call_args_list,
+                         [mock.call("Bootserver instance bs1: 2 hosts, "
+                                    "succeeded."),
+                          mock.call("Bootserver instance bs2: 2 hosts, "
+                                    "succeeded."),
+                          mock.call("Bootserver instance bs3: 2 hosts, "
+                                    "succeeded.")])
+
+    def test_failed_instance(self):
+        self.add_hosts("bs1", 1)
+        self.add_hosts("bs2", 3)
+        self.failing.add("aqd@bs2.example.com")
+        with self.assertRaises(PartialError) as cm:
+            self.render(mock.Mock())
+
+        self.assertEqual(len(self.calls), 2)
+        msg = str(cm.exception).splitlines()
+        self.assertEqual(msg[:3], ["The following were successful:",
+                                   "Bootserver instance bs1: 1 hosts",
+                                   "The following failed:"])
+        self.assertTrue(msg[3].startswith("Bootserver instance bs2: 3 hosts, "
+                                          "failed: Command 'aii-installfe' "
+                                          "failed with return code '1'"))
+
+    def test_single_instance_failure(self):
+        self.add_hosts("bs1", 2)
+        self.failing.add("aqd@bs1.example.com")
+        self.assertRaises(ProcessException, self.render, mock.Mock())
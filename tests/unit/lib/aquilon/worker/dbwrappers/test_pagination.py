@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+import unittest
+from uuid import uuid4
+
+from dateutil.tz import tzutc
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+with patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import Vendor
+
+from aquilon.exceptions_ import ArgumentError
+from aquilon.worker.dbwrappers.pagination import (decode_token, encode_token,
+                                                  paginate)
+
+
+class TestPaginate(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Vendor.__table__.create(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+        self.statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, parameters, *args:
+                     self.statements.append((statement, parameters)))
+
+        # The leading sort column is not unique
+        for name, comments in [("v1", "b"), ("v2", "a"), ("v3", "b"),
+                               ("v4", "c"), ("v5", "a")]:
+            self.session.add(Vendor(name=name, comments=comments))
+        self.session.commit()
+
+        self.columns = [Vendor.comments, Vendor.id]
+
+    def all_pages(self, page_size, descending=False):
+        pages = []
+        token = None
+        while True:
+            items, token = paginate(self.session.query(Vendor), self.columns,
+                                    page_size, continuation=token,
+                                    scope="test", descending=descending)
+            pages.append([dbvendor.name for dbvendor in items])
+            if not token:
+                return pages
+
+    def test_ascending(self):
+        self.assertEqual(self.all_pages(2),
+                         [["v2", "v5"], ["v1", "v3"], ["v4"]])
+
+    def test_descending(self):
+        self.assertEqual(self.all_pages(2, descending=True),
+                         [["v4", "v3"], ["v1", "v5"], ["v2"]])
+
+    def test_exact_fit(self):
+        self.assertEqual(self.all_pages(5), [["v2", "v5", "v1", "v3", "v4"]])
+
+    def test_no_offset(self):
+        del self.statements[:]
+        self.all_pages(2)
+        self.assertEqual(len(self.statements), 3)
+        # SQLite always renders an OFFSET clause, so check that no rows are
+        # actually skipped by it
+        for statement, parameters in self.statements:
+            self.assertIn("LIMIT ? OFFSET ?", statement)
+            self.assertEqual(parameters[-1], 0)
+
+    def test_bad_page_size(self):
+        self.assertRaises(ArgumentError, paginate, self.session.query(Vendor),
+                          self.columns, 0)
+
+    def test_invalid_token(self):
+        self.assertRaises(ArgumentError, paginate, self.session.query(Vendor),
+                          self.columns, 2, continuation="not a token",
+                          scope="test")
+
+    def test_token_scope(self):
+        token = encode_token("other", ["a", 1])
+        self.assertRaises(ArgumentError, paginate, self.session.query(Vendor),
+                          self.columns, 2, continuation=token, scope="test")
+
+
+class TestToken(unittest.TestCase):
+    def test_round_trip(self):
+        values = [u"name", 42,
+                  datetime(2019, 1, 2, 3, 4, 5, 6, tzinfo=tzutc()), uuid4()]
+        token = encode_token("test", values)
+        self.assertNotIn("=", token)
+        self.assertEqual(decode_token("test", token, len(values)), values)
+
+    def test_wrong_length(self):
+        token = encode_token("test", ["a", 1])
+        self.assertRaises(ArgumentError, decode_token, "test", token, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+with patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import User, UserType
+
+from aquilon.exceptions_ import ArgumentError
+from aquilon.worker.dbwrappers.user import UserSync
+
+
+def script_row(name, uid, gid=100, full_name=None, type='human'):
+    return {'name': name, 'uid': uid, 'gid': gid,
+            'full_name': full_name or name, 'home_dir': '/home/' + name,
+            'type': type}
+
+
+class TestUserSyncBulk(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        UserType.__table__.create(engine)
+        User.__table__.create(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+        self.human = UserType(name='human')
+        self.robot = UserType(name='robot')
+        self.session.add_all([self.human, self.robot])
+        for name, uid in [('alice', 1), ('bob', 2), ('carol', 3)]:
+            self.session.add(User(name=name, uid=uid, gid=100,
+                                  full_name=name, home_dir='/home/' + name,
+                                  type=self.human))
+        self.session.commit()
+
+        self.config = Mock()
+        self.config.has_value.return_value = False
+        self.config.getint.return_value = 2
+        self.plenaries = Mock()
+
+    def make_sync(self, rows, **kwargs):
+        self.config.has_value.side_effect = \
+            lambda *args: list(args) == UserSync._script_location
+        sync = UserSync(self.config, self.session, Mock(), self.plenaries,
+                        bulk=True, **kwargs)
+        sync.read_users = Mock(return_value=iter(rows))
+        return sync
+
+    def test_incremental_conflict(self):
+        self.assertRaises(ArgumentError, self.make_sync, [], incremental=True)
+
+    def test_compute_delta(self):
+        sync = self.make_sync([script_row('alice', 1),
+                               script_row('bob', 2, full_name='Bob'),
+                               script_row('dave', 4),
+                               # Conflicts with the UID of alice
+                               script_row('eve', 1)])
+        to_add, to_update, to_delete, unchanged = sync.compute_delta()
+
+        self.assertEqual([user['name'] for user in to_add], ['dave'])
+        self.assertEqual([(row.name, changes) for row, changes in to_update],
+                         [('bob', {'full_name': 'Bob'})])
+        self.assertEqual([row.name for row in to_delete], ['carol'])
+        self.assertEqual(unchanged, 1)
+
+    def test_refresh_add_update(self):
+        sync = self.make_sync([script_row('alice', 1, type='robot'),
+                               script_row('bob', 5),
+                               script_row('carol', 3),
+                               script_row('dave', 2),
+                               script_row('erin', 6),
+                               script_row('frank', 7)])
+        with patch.object(sync, '_entitlement_plenaries',
+                          return_value=set()) as entitlement_plenaries:
+            sync.refresh_user()
+
+        users = {dbuser.name: dbuser for dbuser in self.session.query(User)}
+        self.assertEqual(sorted(users),
+                         ['alice', 'bob', 'carol', 'dave', 'erin', 'frank'])
+        self.assertEqual(users['alice'].type, self.robot)
+        self.assertEqual(users['bob'].uid, 5)
+        self.assertEqual(users['dave'].uid, 2)
+        self.assertEqual(users['dave'].type, self.human)
+
+        # Only the user whose type changed needs its entitlements rebuilt
+        entitlement_plenaries.assert_called_once_with((users['alice'].id,))
+        self.assertEqual(self.plenaries.write.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from struct import pack
+import threading
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.worker.exporters import notifications
+
+
+def message(payload):
+    msg = mock.Mock()
+    msg.serialize.return_value = payload
+    return msg
+
+
+def framed(*payloads):
+    return "".join(pack('!I', len(payload)) + payload for payload in payloads)
+
+
+class TestEventPublisher(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(notifications, 'reactor')
+        self.reactor = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.publisher = notifications.EventPublisher('/sock', queue_size=2)
+
+    def connect(self):
+        proto = mock.Mock()
+        proto.connected = True
+        proto.transport.disconnecting = False
+        self.publisher.connection_made(proto)
+        return proto
+
+    def test_overflow_drops_oldest(self):
+        self.publisher.publish([message("a"), message("b"), message("c")])
+
+        self.assertEqual([msg.serialize() for msg in self.publisher.queue],
+                         ["b", "c"])
+        self.assertEqual(self.publisher.stats["dropped"], 1)
+        self.assertEqual(self.publisher.stats["published"], 3)
+        self.assertEqual(self.reactor.connectUNIX.call_count, 1)
+
+        # Publishing again must not open a second connection
+        self.publisher.publish([message("d")])
+        self.assertEqual(self.reactor.connectUNIX.call_count, 1)
+
+    def test_flush_batches(self):
+        self.publisher.publish([message("a"), message("b")])
+        proto = self.connect()
+        proto.transport.write.assert_called_once_with(framed("a", "b"))
+
+        # Messages published in the same iteration are written together
+        self.publisher.publish([message("c")])
+        self.publisher.publish([message("d")])
+        self.assertEqual(self.reactor.callLater.call_count, 1)
+        self.publisher.flush()
+        proto.transport.write.assert_called_with(framed("c", "d"))
+
+        self.assertEqual(self.publisher.stats["written"], 4)
+        self.assertEqual(self.publisher.stats["batches"], 2)
+        self.assertEqual(len(self.publisher.queue), 0)
+
+    def test_reconnect_resends(self):
+        proto = self.connect()
+        proto.transport.disconnecting = True
+        self.publisher.publish([message("a")])
+        self.publisher.flush()
+
+        # Nothing was written to the dying connection
+        self.assertFalse(proto.transport.write.called)
+        self.assertEqual(self.publisher.stats["written"], 0)
+
+        self.publisher.connection_lost(proto)
+        self.assertIsNone(self.publisher.proto)
+
+        new_proto = self.connect()
+        new_proto.transport.write.assert_called_once_with(framed("a"))
+        self.assertEqual(self.publisher.stats["connects"], 2)
+        self.assertIn((("queued",), 0), self.publisher.statistics())
+
+    def test_single_instance(self):
+        created = []
+
+        def slow_init(self, sockname, queue_size):
+            # Give the other threads a chance to race
+            time.sleep(0.05)
+            created.append(self)
+
+        self.addCleanup(setattr, notifications.EventPublisher, "instance",
+                        None)
+        with mock.patch.object(notifications, "Config"), \
+                mock.patch.object(notifications.EventPublisher, "__init__",
+                                  slow_init):
+            threads = [threading.Thread(
+                target=notifications.EventPublisher.get_instance)
+                for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(created, [notifications.EventPublisher.instance])
+
+
+if __name__ == '__main__':
+    unittest.main()
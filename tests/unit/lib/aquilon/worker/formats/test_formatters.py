@@ -0,0 +1,90 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from google.protobuf.descriptor_pb2 import EnumValueDescriptorProto
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import Host, Vendor
+    from aquilon.worker.formats import host as host_formats
+    from aquilon.worker.formats.formatters import ObjectFormatter
+
+
+def option_paths(options):
+    return set(".".join(option.path) for option in options)
+
+
+class TestRedirectQueryOptions(unittest.TestCase):
+    def test_registered(self):
+        self.assertIsInstance(ObjectFormatter.handlers[Host],
+                              host_formats.HostFormatter)
+
+    def test_host(self):
+        paths = option_paths(ObjectFormatter.redirect_query_options(Host,
+                                                                    "proto"))
+        # Options of the host formatter itself
+        self.assertIn("grns", paths)
+        self.assertIn("services_used", paths)
+        self.assertIn("resholder.resources", paths)
+        # Options of the compileable formatter
+        self.assertIn("personality_stage", paths)
+        self.assertIn("personality_stage.personality", paths)
+        # Options of the hardware entity formatter, below the prefix
+        self.assertIn("hardware_entity.model", paths)
+        self.assertIn("hardware_entity.interfaces.assignments", paths)
+        # Features are shown by the raw format only
+        self.assertNotIn("personality_stage.features", paths)
+
+    def test_host_raw(self):
+        paths = option_paths(ObjectFormatter.redirect_query_options(Host,
+                                                                    "raw"))
+        self.assertIn("personality_stage.features", paths)
+        self.assertIn("personality_stage.personality.archetype.features",
+                      paths)
+
+    def test_prefix(self):
+        paths = option_paths(ObjectFormatter.redirect_query_options(
+            Host, "proto", prefix="host."))
+        self.assertIn("host.grns", paths)
+        self.assertIn("host.hardware_entity.model", paths)
+
+    def test_default(self):
+        self.assertEqual(ObjectFormatter.redirect_query_options(Vendor, "raw"),
+                         [])
+
+
+class TestNDJSON(unittest.TestCase):
+    def test_unset_fields(self):
+        class ProtoFormatter(ObjectFormatter):
+            def format_proto(self, result, container, embedded=True,
+                             indirect_attrs=True):
+                container.append(EnumValueDescriptorProto(name=result))
+
+        records = list(ProtoFormatter().format_ndjson("value", []))
+        # Unset proto2 fields are reported with their default value
+        self.assertEqual(records, [{"name": "value", "number": 0}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+
+# As these are unit tests, we do not need the full broker capability,
+# we can thus mock the DbFactory in order for it not to try and open
+# the database (which is not required anyway)
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.aqdb.model import Vendor
+    from aquilon.worker.formats import formatters
+    from aquilon.worker.formats import list as list_formats
+
+
+class TestQueryStream(unittest.TestCase):
+    def get_query(self, items):
+        query = mock.Mock()
+        query.yield_per.return_value = iter(items)
+        query.session.__contains__ = mock.Mock(return_value=True)
+        return query
+
+    def test_expunges_in_batches(self):
+        vendors = [Vendor(name="vendor%d" % i) for i in range(5)]
+        query = self.get_query(vendors)
+        stream = list_formats.QueryStream(query, batch_size=2)
+
+        seen = []
+        for vendor in stream:
+            # Objects must not be expunged before they are consumed
+            for call in query.session.expunge.call_args_list:
+                self.assertIsNot(call[0][0], vendor)
+            seen.append(vendor)
+
+        self.assertEqual(seen, vendors)
+        query.yield_per.assert_called_once_with(2)
+        self.assertEqual([call[0][0] for call in
+                          query.session.expunge.call_args_list], vendors)
+
+    def test_column_rows(self):
+        rows = [("vendor1",), ("vendor2",)]
+        query = self.get_query(rows)
+        stream = list_formats.StringAttributeStream(query, lambda row: row[0])
+
+        writer = mock.Mock()
+        list_formats.StringAttributeListFormatter().format_csv(stream, writer)
+        writer.writerow.assert_has_calls([mock.call(("vendor1",)),
+                                          mock.call(("vendor2",))])
+        self.assertFalse(query.session.expunge.called)
+
+
+class TestNDJSON(unittest.TestCase):
+    def test_stream(self):
+        request = mock.Mock()
+        formatter = formatters.ResponseFormatter()
+        result = list_formats.StringList(["host%d" % i for i in range(7)])
+        with mock.patch.object(formatters, "NDJSON_CHUNK_SIZE", 20), \
+                mock.patch.object(formatters, "isInIOThread",
+                                  return_value=True):
+            tail = formatter.format("ndjson", result, request)
+
+        chunks = [call[0][0] for call in request.write.call_args_list]
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(request.streamed)
+        self.assertEqual("".join(chunks) + tail,
+                         "".join('"host%d"\n' % i for i in range(7)))
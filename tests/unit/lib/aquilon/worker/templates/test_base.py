@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+
+# As these are unit tests, we do not need the full broker capability,
+# we can thus mock the DbFactory in order for it not to try and open
+# the database (which is not required anyway)
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.exceptions_ import IncompleteError
+    from aquilon.worker.templates import base
+
+
+class FakePlenary(base.Plenary):
+    basedir = None
+    content = "structure template fake;\n"
+
+    @classmethod
+    def template_name(cls, dbobj):
+        return "fake"
+
+    @classmethod
+    def base_dir(cls, dbobj):
+        return cls.basedir
+
+    def _generate_content(self):
+        if self.content is None:
+            raise IncompleteError("Not enough data.")
+        return self.content
+
+
+class FakeDbObject(object):
+    pass
+
+
+class FakeDependentPlenary(FakePlenary):
+    pass
+
+
+class TestPlenaryCollectionAddDependents(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(base.Plenary.handlers,
+                                  {FakeDbObject: FakePlenary})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        dependents = {(FakeDbObject, "fake"): [FakeDependentPlenary]}
+        patcher = mock.patch.dict(base.Plenary.dependents, dependents)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dbobj = FakeDbObject()
+        self.plenaries = base.PlenaryCollection(logger=mock.Mock())
+
+    def plenary_types(self):
+        return [type(plenary) for plenary in self.plenaries.plenaries]
+
+    def test_indexed(self):
+        self.plenaries.add_dependents(self.dbobj, "fake")
+        self.assertEqual(self.plenary_types(), [FakeDependentPlenary])
+
+    def test_not_indexed(self):
+        self.plenaries.add_dependents(self.dbobj, "other")
+        self.assertEqual(self.plenary_types(), [FakePlenary])
+
+
+class TestPlenaryCheckDrift(unittest.TestCase):
+    def setUp(self):
+        self.basedir = tempfile.mkdtemp()
+        FakePlenary.basedir = self.basedir
+        self.plenary = FakePlenary(object(), logger=mock.Mock())
+        self.path = self.plenary.old_path
+
+    def tearDown(self):
+        shutil.rmtree(self.basedir)
+
+    def write(self, content):
+        with open(self.path, "w") as f:
+            f.write(content)
+
+    def test_up_to_date(self):
+        self.write(FakePlenary.content)
+        self.assertEqual(self.plenary.check_drift(), [])
+
+    def test_missing(self):
+        self.assertEqual(self.plenary.check_drift(),
+                         [(self.plenary, self.path + " is missing")])
+
+    def test_out_of_date(self):
+        self.write("structure template old;\n")
+        self.assertEqual(self.plenary.check_drift(),
+                         [(self.plenary, self.path + " is out of date")])
+        # Checking must not touch the file
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "structure template old;\n")
+
+    def test_incomplete(self):
+        self.plenary.content = None
+        self.assertEqual(self.plenary.check_drift(), [])
+        self.write(FakePlenary.content)
+        self.assertEqual(self.plenary.check_drift(),
+                         [(self.plenary, self.path + " should not exist")])
+        self.assertTrue(os.path.exists(self.path))
+
+
+class TestPlenaryStage(unittest.TestCase):
+    def setUp(self):
+        self.basedir = tempfile.mkdtemp()
+        self.stagedir = os.path.join(self.basedir, "staging")
+        self.target = os.path.join(self.basedir, "plenary", "a", "fake.tpl")
+        config = mock.Mock()
+        config.get.return_value = self.stagedir
+        patcher = mock.patch.object(base.PlenaryStage, "config", config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stage = base.PlenaryStage(logger=mock.Mock())
+
+    def tearDown(self):
+        shutil.rmtree(self.basedir)
+
+    def write(self, content):
+        os.makedirs(os.path.dirname(self.target))
+        with open(self.target, "w") as f:
+            f.write(content)
+
+    def read(self):
+        with open(self.target) as f:
+            return f.read()
+
+    def test_discard_before_publish(self):
+        self.write("old")
+        self.stage.write(self.target, "new")
+        self.stage.rollback()
+        self.assertEqual(self.read(), "old")
+        self.assertEqual(os.listdir(self.stagedir), [])
+
+    def test_publish_and_rollback(self):
+        self.write("old")
+        self.stage.write(self.target, "new")
+        self.stage.publish()
+        self.assertEqual(self.read(), "new")
+        self.stage.rollback()
+        self.assertEqual(self.read(), "old")
+        self.assertEqual(os.listdir(self.stagedir), [])
+
+    def test_remove_and_rollback(self):
+        self.write("old")
+        self.stage.remove(self.target)
+        self.stage.publish()
+        self.assertFalse(os.path.exists(self.target))
+        self.stage.rollback()
+        self.assertEqual(self.read(), "old")
+
+    def test_new_file_rollback(self):
+        self.stage.write(self.target, "new")
+        self.stage.publish()
+        self.assertEqual(self.read(), "new")
+        self.stage.rollback()
+        self.assertFalse(os.path.exists(os.path.dirname(self.target)))
+
+    def test_plenary_write(self):
+        FakePlenary.basedir = os.path.dirname(self.target)
+        plenary = FakePlenary(object(), logger=mock.Mock())
+        plenary.is_dirty = mock.Mock(return_value=False)
+        plenary.is_deleted = mock.Mock(return_value=False)
+        plenary.set_stage(self.stage)
+        plenary.stash()
+        self.assertEqual(plenary._write(), 1)
+        self.assertFalse(os.path.exists(self.target))
+        self.stage.publish()
+        self.assertEqual(self.read(), FakePlenary.content)
+        self.stage.discard()
+        self.assertEqual(self.read(), FakePlenary.content)
@@ -14,9 +14,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import uuid
 
+import os
+import shutil
+from tempfile import mkdtemp
+import threading
 import unittest
+import uuid
 
 try:
     from unittest import mock
@@ -29,6 +33,7 @@ except ImportError:
 # we can thus mock the DbFactory in order for it not to try and open
 # the database (which is not required anyway)
 with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.exceptions_ import ArgumentError
     from aquilon.worker.templates import domain
 
 
@@ -44,6 +49,7 @@ class TestTemplateDomain(unittest.TestCase):
         instance.author = 'author'
         return instance
 
+    @mock.patch.object(domain.compile_scheduler, 'enabled', False)
     @mock.patch.object(domain.TemplateDomain, '_compute_formats_and_suffixes')
     @mock.patch.object(domain.TemplateDomain, '_preprocess_only')
     @mock.patch.object(domain.TemplateDomain, '_prepare_dirs')
@@ -87,3 +93,212 @@ class TestTemplateDomain(unittest.TestCase):
         for o in mock_rc.call_args_list[2][0][0]:
             self.assertIsNot(o.startswith('-Dpanc.debug.exclude'), True)
         patcher.stop()
+
+    @mock.patch.object(domain.TemplateDomain, '_invoke_panc_compiler')
+    @mock.patch.object(domain.TemplateDomain, '_compute_panc_args')
+    @mock.patch.object(domain.TemplateDomain, '_preprocess_only')
+    @mock.patch.object(domain.TemplateDomain, '_prepare_dirs')
+    def test_snapshot_compile_does_not_notify(self, mock_pd, mock_po,
+                                              mock_cpa, mock_ipc):
+        mock_pd.return_value = 'outputdir', 'templatedir'
+        mock_po.return_value = ['host1'], False
+        template_domain = self.get_instance()
+        template_domain.compile('session', only=['host1'],
+                                snapshot=mock.Mock())
+        mock_ipc.assert_called_with(mock_cpa.return_value, notify=False)
+
+
+class TestCompileScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = domain.CompileScheduler()
+        self.scheduler.window = 0
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.failing = set()
+
+        def fake_compile(requests, *args):
+            only = set()
+            for request in requests:
+                only.update(request.only)
+            self.batches.append(sorted(only))
+            self.started.set()
+            self.release.wait(5)
+            if only & self.failing:
+                raise ArgumentError("Compilation failed")
+
+        self.scheduler._compile = fake_compile
+
+    def template_domain(self):
+        template_domain = mock.Mock()
+        template_domain.domain.name = "unittest"
+        template_domain.author = None
+        return template_domain
+
+    def submit(self, only, errors):
+        try:
+            self.scheduler.compile(self.template_domain(), only,
+                                   None, None, False)
+        except ArgumentError as err:
+            errors[tuple(only)] = err
+
+    def run_concurrently(self, first, others):
+        errors = {}
+        leader = threading.Thread(target=self.submit, args=(first, errors))
+        leader.start()
+        self.started.wait(5)
+        threads = [threading.Thread(target=self.submit, args=(only, errors))
+                   for only in others]
+        for thread in threads:
+            thread.start()
+        # Give the other requests a chance to get queued
+        while len(self.scheduler.queues.get(("unittest", None, None, None,
+                                             False), [])) < len(others):
+            self.started.wait(0.01)
+        self.release.set()
+        for thread in [leader] + threads:
+            thread.join(5)
+        return errors
+
+    def test_merge(self):
+        errors = self.run_concurrently(["a"], [["b"], ["c"]])
+        self.assertEqual(errors, {})
+        self.assertEqual(self.batches, [["a"], ["b", "c"]])
+
+    def test_failure_is_reported_separately(self):
+        self.failing.add("c")
+        errors = self.run_concurrently(["a"], [["b"], ["c"]])
+        self.assertEqual(list(errors.keys()), [("c",)])
+        self.assertEqual(self.batches[:2], [["a"], ["b", "c"]])
+        # The retries run in the order the requesters wake up
+        self.assertEqual(sorted(self.batches[2:]), [["b"], ["c"]])
+
+
+class TestDomainSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.basedir = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.basedir)
+
+        settings = {
+            ("panc", "template_extension"): ".tpl",
+            ("broker", "quattordir"): self.live_path("quattor"),
+            ("broker", "cfgdir"): self.live_path("cfg"),
+            ("broker", "plenarydir"): self.live_path("plenary"),
+            ("broker", "profilesdir"): self.live_path("profiles"),
+            ("broker", "compile_snapshot_dir"): self.live_path("snapshots"),
+        }
+        config = mock.Mock()
+        config.get.side_effect = lambda section, name: settings[section, name]
+        for target, value in [("Config", mock.Mock(return_value=config)),
+                              ("template_branch_basedir",
+                               mock.Mock(return_value=self.live_path(
+                                   "templates")))]:
+            patcher = mock.patch.object(domain, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(domain, "trigger_notifications")
+        self.trigger_notifications = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        template_domain = mock.Mock()
+        template_domain.domain = mock.Mock(spec=["name", "__format__"])
+        template_domain.domain.name = "unittest"
+        template_domain.domain.__format__ = mock.Mock(return_value="unittest")
+        template_domain.author = None
+        template_domain._compute_formats_and_suffixes.return_value = \
+            (None, [".xml"])
+
+        self.sources = "cfg/domains/unittest/profiles/"
+        self.build = "quattor/build/unittest/"
+        for name in ["host1", "host2", "host3", "host4"]:
+            self.write(self.sources + name + ".tpl", "object " + name,
+                       mtime=1000)
+            self.write(self.build + name + ".dep", "old", mtime=1000)
+            self.write(self.build + name + ".xml", "old", mtime=1000)
+        self.write("plenary/hostdata/host1.tpl", "data", mtime=1000)
+        os.makedirs(self.live_path("templates"))
+        self.write("quattor/objects/host1.tpl", "object host1", mtime=1000)
+        self.write("quattor/objects/other.tpl", "object other", mtime=1000)
+
+        self.snapshot = domain.DomainSnapshot(template_domain,
+                                              logger=mock.Mock())
+        self.addCleanup(self.snapshot.discard)
+        self.snapshot.take()
+
+    def live_path(self, relpath):
+        return os.path.join(self.basedir, relpath)
+
+    def write(self, relpath, content, mtime=None, snapshot=False):
+        if snapshot:
+            path = self.snapshot.path(relpath)
+        else:
+            path = self.live_path(relpath)
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        # Replace the file the same way write_file() does
+        with open(path + ".tmp", "w") as f:
+            f.write(content)
+        os.rename(path + ".tmp", path)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    def read(self, relpath):
+        with open(self.live_path(relpath)) as f:
+            return f.read()
+
+    def compile_in_snapshot(self, name):
+        self.write("build/" + name + ".dep", "new", mtime=2000, snapshot=True)
+        self.write("build/" + name + ".xml", "new", mtime=2000, snapshot=True)
+        self.write("profiles/" + name + ".xml", "new", mtime=2000,
+                   snapshot=True)
+
+    def test_snapshot_is_isolated(self):
+        self.write("plenary/hostdata/host1.tpl", "changed")
+        with open(self.snapshot.path("plenary/hostdata/host1.tpl")) as f:
+            self.assertEqual(f.read(), "data")
+
+    def test_objects_of_other_domains_are_linked(self):
+        # The compiler overwrites the object templates of the domain
+        for relpath, linked in [("host1.tpl", False), ("other.tpl", True)]:
+            live = os.stat(self.live_path("quattor/objects/" + relpath))
+            copy = os.stat(self.snapshot.path("objects/" + relpath))
+            self.assertEqual(live.st_ino == copy.st_ino, linked)
+            self.assertEqual(copy.st_mtime, 1000)
+
+    def test_publish(self):
+        for name in ["host1", "host2", "host3"]:
+            self.compile_in_snapshot(name)
+
+        # The object template of host2 changes while compiling
+        self.write(self.sources + "host2.tpl", "object host2 changed")
+        # Somebody else compiles host3 while compiling
+        self.write(self.build + "host3.dep", "other", mtime=3000)
+        self.write(self.build + "host3.xml", "other", mtime=3000)
+
+        self.assertEqual(self.snapshot.publish(), ["host2"])
+
+        # host1 is published with the time stamp of the snapshot
+        for relpath in [self.build + "host1.dep", self.build + "host1.xml",
+                        "profiles/host1.xml"]:
+            self.assertEqual(self.read(relpath), "new")
+            self.assertEqual(os.stat(self.live_path(relpath)).st_mtime,
+                             self.snapshot.timestamp)
+        # host2 needs to be recompiled
+        self.assertEqual(self.read(self.build + "host2.xml"), "old")
+        # The compile of host3 done by somebody else is kept
+        self.assertEqual(self.read(self.build + "host3.xml"), "other")
+        # host4 was not compiled from the snapshot
+        self.assertEqual(self.read(self.build + "host4.xml"), "old")
+        self.assertFalse(os.path.exists(self.live_path("profiles/host4.xml")))
+        # Notifications are sent only once the profiles got published
+        self.assertEqual(self.trigger_notifications.call_count, 1)
+
+    def test_deleted_source(self):
+        self.compile_in_snapshot("host1")
+        os.unlink(self.live_path(self.sources + "host1.tpl"))
+
+        # Deleted hosts are neither published nor recompiled
+        self.assertEqual(self.snapshot.publish(), [])
+        self.assertEqual(self.read(self.build + "host1.xml"), "old")
+        self.assertFalse(self.trigger_notifications.called)
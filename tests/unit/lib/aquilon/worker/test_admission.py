@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+from aquilon.exceptions_ import TransientError
+from aquilon.worker import admission
+
+
+class Command(object):
+    admission_class = None
+    is_lock_free = False
+    requires_readonly = False
+
+
+class TestAdmission(unittest.TestCase):
+    def setUp(self):
+        self.options = {"enabled": "True", "write_threads": "2",
+                        "write_queue": "1", "user_limit": "2"}
+        patcher = mock.patch.object(admission, 'Config')
+        mock_config = patcher.start()
+        config = mock_config.return_value
+        config.has_value.side_effect = lambda _, key: key in self.options
+        config.getint.side_effect = lambda _, key: int(self.options[key])
+        config.getboolean.side_effect = \
+            lambda _, key: self.options[key] == "True"
+        self.addCleanup(patcher.stop)
+
+        self.controller = admission.AdmissionController()
+        pool = mock.Mock(max=2)
+        self.controller.pools["write"] = pool
+
+    def test_classify(self):
+        command = Command()
+        self.assertEqual(admission.classify(command), "write")
+        command.requires_readonly = True
+        self.assertEqual(admission.classify(command), "readonly")
+        command.is_lock_free = True
+        self.assertEqual(admission.classify(command), "lockfree")
+        command.admission_class = "compile"
+        self.assertEqual(admission.classify(command), "compile")
+
+    def test_queue_limit(self):
+        for user in ("user1", "user2", "user3"):
+            self.controller.admit("write", user)
+        self.assertRaises(TransientError, self.controller.admit, "write",
+                          "user4")
+
+        self.controller.release(None, "write", "user1")
+        self.controller.admit("write", "user4")
+        self.assertEqual(self.controller.admitted["write"], 3)
+
+    def test_user_limit(self):
+        self.controller.admit("write", "user1")
+        self.controller.admit("write", "user1")
+        self.assertRaises(TransientError, self.controller.admit, "write",
+                          "user1")
+        self.controller.release(None, "write", "user1")
+        self.controller.release(None, "write", "user1")
+        self.assertNotIn("user1", self.controller.users)
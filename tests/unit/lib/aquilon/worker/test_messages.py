@@ -0,0 +1,91 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+from logging import DEBUG, INFO
+from shutil import rmtree
+from tempfile import mkdtemp
+import os
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+from aquilon.worker import messages
+
+Record = namedtuple("Record", ["levelno", "message"])
+
+
+class Subscriber(messages.StatusSubscriber):
+    def __init__(self):
+        messages.StatusSubscriber.__init__(self)
+        self.received = []
+        self.finished = False
+
+    def process(self, record):
+        self.received.append((record.levelno, record.message))
+
+    def finish(self):
+        self.finished = True
+
+
+class TestRequestStatus(unittest.TestCase):
+    def setUp(self):
+        self.spooldir = mkdtemp()
+        patcher = mock.patch.object(messages, 'Config')
+        mock_config = patcher.start()
+        mock_config.return_value.get.return_value = self.spooldir
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(messages, 'MAX_RECORDS_IN_MEMORY', 10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        rmtree(self.spooldir)
+
+    def test_spill_and_replay(self):
+        status = messages.RequestStatus(1)
+        early = Subscriber()
+        status.add_subscriber(early)
+        expected = []
+        for i in range(25):
+            levelno = DEBUG if i % 2 else INFO
+            expected.append((levelno, u"message %d \u00e9" % i))
+            status.publish(Record(*expected[-1]))
+
+        self.assertTrue(len(status.records) <= 10)
+        self.assertEqual(status.spilled + len(status.records), 25)
+        self.assertEqual(early.received, expected)
+
+        # A late subscriber gets everything, partially from disk
+        late = Subscriber()
+        status.add_subscriber(late)
+        self.assertEqual(late.received, expected)
+
+        status.finish()
+        self.assertTrue(early.finished)
+        self.assertTrue(late.finished)
+
+        status.close()
+        self.assertEqual(os.listdir(self.spooldir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
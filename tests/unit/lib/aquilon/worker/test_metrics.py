@@ -0,0 +1,72 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+
+from aquilon.worker import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ["command"],
+                                      buckets=(1.0, 5.0))
+        histogram.observe(0.5, "show_host")
+        histogram.observe(2, "show_host")
+        histogram.observe(10, "show_host")
+        labels = 'command="show_host"'
+        self.assertEqual(histogram.render(),
+                         ['# HELP test_seconds Test.',
+                          '# TYPE test_seconds histogram',
+                          'test_seconds_bucket{%s,le="1.0"} 1' % labels,
+                          'test_seconds_bucket{%s,le="5.0"} 2' % labels,
+                          'test_seconds_bucket{%s,le="+Inf"} 3' % labels,
+                          'test_seconds_sum{%s} 12.500000' % labels,
+                          'test_seconds_count{%s} 3' % labels])
+
+    def test_phases(self):
+        metrics.add_phase_time("db", 1.0)
+        with metrics.command_timer("test_phases"):
+            metrics.add_phase_time("db", 0.25)
+            metrics.add_phase_time("db", 0.5)
+        metrics.add_phase_time("db", 1.0)
+
+        values = metrics.command_phase_duration.values
+        self.assertEqual(values[("test_phases", "db")][-1], 0.75)
+        buckets = metrics.command_duration.values[("test_phases",)][:-1]
+        self.assertEqual(sum(buckets), 1)
+
+    def test_db_timer(self):
+        engine = create_engine("sqlite://")
+        event.listen(engine, "before_cursor_execute",
+                     metrics._db_timer_start)
+        event.listen(engine, "after_cursor_execute", metrics._db_timer_stop)
+        event.listen(engine, "handle_error", metrics._db_timer_error)
+
+        conn = engine.connect()
+        with metrics.command_timer("test_db_timer"):
+            conn.execute("SELECT 1")
+            # A failing statement does not trigger after_cursor_execute
+            self.assertRaises(OperationalError, conn.execute,
+                              "SELECT * FROM no_such_table")
+            conn.execute("SELECT 2")
+        self.assertNotIn('metrics_start_time', conn.info)
+
+        values = metrics.command_phase_duration.values
+        self.assertIn(("test_db_timer", "db"), values)
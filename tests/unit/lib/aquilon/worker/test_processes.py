@@ -0,0 +1,185 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+from aquilon.exceptions_ import ProcessException
+from aquilon.worker import processes
+
+
+class TestDSDBRunner(unittest.TestCase):
+    @staticmethod
+    def get_runner(parallel_actions):
+        with mock.patch.object(processes, 'DSDB_ENABLED', False):
+            runner = processes.DSDBRunner(logger=mock.Mock())
+        runner.parallel_actions = parallel_actions
+        return runner
+
+    @staticmethod
+    def issued(mock_run_command):
+        return [call[0][0][1] for call in mock_run_command.call_args_list]
+
+    @mock.patch.object(processes, 'DSDB_ENABLED', True)
+    @mock.patch.object(processes, 'run_command')
+    def test_batches_only_independent_actions(self, mock_run_command):
+        runner = self.get_runner(4)
+        runner.add_action(['add_host', 'primary'], ['delete_host', 'primary'])
+        runner.add_action(['add_host', 'a'], ['delete_host', 'a'],
+                          independent=True)
+        runner.add_action(['add_host', 'b'], ['delete_host', 'b'],
+                          independent=True)
+        runner.add_action({'update_rack': {}}, None, cmd_line=False,
+                          independent=True)
+        batches = [[action[1] for action in batch]
+                   for batch in runner._batch_actions(runner.actions)]
+        self.assertEqual(batches, [[['add_host', 'primary']],
+                                   [['add_host', 'a'], ['add_host', 'b']],
+                                   [{'update_rack': {}}]])
+
+        runner.parallel_actions = 1
+        batches = list(runner._batch_actions(runner.actions))
+        self.assertEqual([len(batch) for batch in batches], [1, 1, 1, 1])
+
+    @mock.patch.object(processes, 'DSDB_ENABLED', True)
+    @mock.patch.object(processes, 'run_command')
+    def test_phases_are_not_merged(self, mock_run_command):
+        runner = self.get_runner(4)
+        old_hwdata = {"by-ip": {}, "by-fqdn": {}, "primary": None}
+        new_hwdata = {"by-ip": {}, "by-fqdn": {}, "primary": None}
+        # The auxiliary entries are replaced by new ones. Without an update
+        # in between, the deletes and the adds are next to each other.
+        for hwdata, names, offset in [(old_hwdata, ["aux1", "aux2"], 0),
+                                      (new_hwdata, ["new1", "new2"], 10)]:
+            for idx, name in enumerate(names):
+                entry = {"fqdn": name + ".example.com",
+                         "ip": "192.168.0.%d" % (idx + offset), "mac": None,
+                         "iface": "eth%d" % idx, "comments": None,
+                         "primary": "host.example.com"}
+                hwdata["by-fqdn"][entry["fqdn"]] = entry
+                hwdata["by-ip"][entry["ip"]] = entry
+
+        with mock.patch.object(runner, "snapshot_hw",
+                               return_value=new_hwdata), \
+                mock.patch.object(runner, "delete_host_details") as mock_del, \
+                mock.patch.object(runner, "add_host_details") as mock_add:
+            mock_del.side_effect = lambda independent, fqdn, **_: \
+                runner.add_action(["delete_host", fqdn], ["add_host", fqdn],
+                                  independent=independent)
+            mock_add.side_effect = lambda independent, fqdn, **_: \
+                runner.add_action(["add_host", fqdn], ["delete_host", fqdn],
+                                  independent=independent)
+            runner.update_host(mock.Mock(), old_hwdata)
+
+        batches = [sorted(action[1][0] for action in batch)
+                   for batch in runner._batch_actions(runner.actions)]
+        self.assertEqual(batches, [["delete_host", "delete_host"],
+                                   ["add_host", "add_host"]])
+
+        runner.commit()
+        batches = [sorted(action[1][0] for action in batch)
+                   for batch in runner._batch_actions(
+                       [(cmd_line, args, None, None, None, independent)
+                        for cmd_line, args, independent
+                        in reversed(runner.rollback_list)])]
+        self.assertEqual(batches, [["delete_host", "delete_host"],
+                                   ["add_host", "add_host"]])
+
+    @mock.patch.object(processes, 'DSDB_ENABLED', True)
+    @mock.patch.object(processes, 'run_command')
+    def test_rollback_keeps_queue_order(self, mock_run_command):
+        def fake_run_command(cmd, **_):
+            if cmd[1] == 'fail':
+                raise ProcessException(command=' '.join(cmd), out='boom',
+                                       code=1)
+        mock_run_command.side_effect = fake_run_command
+
+        runner = self.get_runner(4)
+        runner.add_action(['primary'], ['undo_primary'])
+        for name in ['a', 'b', 'fail', 'c']:
+            runner.add_action([name], ['undo_' + name], independent=True)
+
+        self.assertRaises(ProcessException, runner.commit)
+        # Every action of the failing batch was attempted
+        self.assertEqual(sorted(self.issued(mock_run_command)),
+                         ['a', 'b', 'c', 'fail', 'primary'])
+
+        mock_run_command.reset_mock()
+        runner.rollback()
+        issued = self.issued(mock_run_command)
+        self.assertEqual(sorted(issued[:3]), ['undo_a', 'undo_b', 'undo_c'])
+        self.assertEqual(issued[3:], ['undo_primary'])
+
+    @mock.patch.object(processes, 'DSDB_ENABLED', True)
+    @mock.patch.object(processes, 'run_command')
+    def test_ignored_errors_in_batch(self, mock_run_command):
+        def fake_run_command(cmd, **_):
+            if cmd[1] == 'missing':
+                raise ProcessException(command=' '.join(cmd),
+                                       out='not defined', code=1)
+        mock_run_command.side_effect = fake_run_command
+
+        runner = self.get_runner(2)
+        for name in ['a', 'missing', 'b']:
+            runner.add_action([name], ['undo_' + name],
+                              re.compile('not defined'), 'ignored',
+                              independent=True)
+        runner.commit()
+        self.assertEqual([args[0] for _, args, _ in runner.rollback_list],
+                         ['undo_a', 'undo_missing', 'undo_b'])
+
+
+class TestGitClonePool(unittest.TestCase):
+    @staticmethod
+    def fake_getint(section, option):
+        return {'git_clone_pool_size': 2,
+                'git_clone_pool_max_clones': 3}[option]
+
+    @mock.patch.object(processes, 'remove_dir')
+    @mock.patch.object(processes.config, 'getint')
+    def test_release_limits(self, mock_getint, mock_remove_dir):
+        mock_getint.side_effect = self.fake_getint
+        pool = processes.GitClonePool()
+        logger = mock.Mock()
+        for path in ['p1', 'p2', 'p3']:
+            pool._release('king', 'prod', path, logger)
+        # Only two clones are kept per branch
+        mock_remove_dir.assert_called_once_with('p3', logger=logger)
+
+        mock_remove_dir.reset_mock()
+        pool._release('king', 'ny-prod', 'n1', logger)
+        pool._release('king', 'ny-prod', 'n2', logger)
+        # The least recently used clone is evicted above the total limit
+        mock_remove_dir.assert_called_once_with('p1', logger=logger)
+
+        self.assertEqual(pool._acquire('king', 'ny-prod'), 'n2')
+        self.assertEqual(pool._acquire('king', 'unknown'), None)
+
+        mock_remove_dir.reset_mock()
+        pool.discard('prod', logger=logger)
+        mock_remove_dir.assert_called_once_with('p2', logger=logger)
+        self.assertEqual(pool._acquire('king', 'prod'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import mock
+
+from twisted.internet import defer
+
+
+# As these are unit tests, we do not need the full broker capability,
+# we can thus mock the DbFactory in order for it not to try and open
+# the database (which is not required anyway)
+with mock.patch('aquilon.aqdb.db_factory.DbFactory', autospec=True):
+    from aquilon.exceptions_ import NotFoundException
+    from aquilon.worker import resources
+    from aquilon.worker.formats import formatters
+
+
+class TestStreamedErrors(unittest.TestCase):
+    def setUp(self):
+        self.formatter = formatters.ResponseFormatter()
+        self.page = resources.ResponsePage("", self.formatter)
+        self.request = mock.Mock()
+        self.request.streamed = False
+        self.request._disconnected = False
+        self.request.sequence_no = 1
+
+        for target, value in [("NDJSON_CHUNK_SIZE", 20),
+                              ("isInIOThread", mock.Mock(return_value=True))]:
+            patcher = mock.patch.object(formatters, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def render(self, count, error):
+        def records(result, container):
+            for i in range(count):
+                yield "host%d" % i
+            raise error
+
+        # Mimic the callback chain set up by ResponsePage.render()
+        d = defer.Deferred()
+        with mock.patch.object(formatters.ObjectFormatter, "redirect_ndjson",
+                               staticmethod(records)):
+            d.addCallback(lambda _: self.formatter.format("ndjson", [],
+                                                          self.request))
+            d.addCallback(self.page.finishRender, self.request)
+            d.addErrback(self.page.wrapNonInternalError, self.request)
+            d.addErrback(self.page.wrapError, self.request)
+            d.callback(None)
+
+        self.assertTrue(self.request.finish.called)
+        return [call[0][0] for call in self.request.write.call_args_list]
+
+    def test_error_mid_stream(self):
+        chunks = self.render(7, NotFoundException("Host host7 not found."))
+
+        lines = "".join(chunks).splitlines()
+        self.assertEqual(lines[:-1], ['"host%d"' % i for i in range(6)])
+        self.assertEqual(json.loads(lines[-1]),
+                         {formatters.NDJSON_ERROR_KEY: {
+                             "code": 404,
+                             "message": "Host host7 not found."}})
+        self.assertFalse(self.request.setResponseCode.called)
+
+    def test_internal_error_mid_stream(self):
+        chunks = self.render(7, ValueError("Something broke"))
+
+        record = json.loads(chunks[-1])
+        self.assertEqual(record, {formatters.NDJSON_ERROR_KEY: {
+            "code": 500, "message": "Something broke"}})
+        self.assertFalse(self.request.setResponseCode.called)
+
+    def test_error_before_streaming(self):
+        chunks = self.render(1, NotFoundException("Host host1 not found."))
+
+        # Nothing was sent yet, so the error is reported as usual
+        self.assertEqual(chunks, [b"Host host1 not found."])
+        self.request.setResponseCode.assert_called_once_with(404)
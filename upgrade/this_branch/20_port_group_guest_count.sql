@@ -0,0 +1,5 @@
+ALTER TABLE port_group ADD guest_count INTEGER DEFAULT 0 NOT NULL;
+
+-- The counters are initialized by 21_port_group_guest_count.py
+
+QUIT;
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- cpy-indent-level: 4; indent-tabs-mode: nil -*-
+# ex: set expandtab softtabstop=4 shiftwidth=4:
+#
+# Copyright (C) 2019  Contributor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Initialize port_group.guest_count, added by 20_port_group_guest_count.
+
+The counting rules depend on the network type settings of the broker
+configuration, so this is not done in the SQL scripts.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+from optparse import OptionParser
+
+BINDIR = os.path.dirname(os.path.realpath(sys.argv[0]))
+sys.path.append(os.path.join(BINDIR, "..", "..", "lib"))
+
+# Importing the DB factory sets up the module search path for SQLAlchemy
+from aquilon.aqdb.db_factory import DbFactory
+from aquilon.aqdb.model import Base, PortGroup
+from sqlalchemy.orm import joinedload
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--commit", dest="commit", action="store_true",
+                      default=False, help="Commit the changes made")
+    parser.add_option("--debug", dest="debug", action="store_true",
+                      default=False, help="Display SQL statements")
+    opts, _ = parser.parse_args()
+
+    db = DbFactory()
+    if opts.debug:
+        db.engine.echo = True
+    Base.metadata.bind = db.engine
+
+    session = db.Session()
+
+    print("Using database:", str(db.engine.url))
+
+    count = 0
+    q = session.query(PortGroup)
+    q = q.options(joinedload('network'))
+    for dbpg in q:
+        guest_count = dbpg.network.count_guests()
+        if dbpg.guest_count != guest_count:
+            dbpg.guest_count = guest_count
+            count += 1
+
+    print("Updated %d port groups." % count)
+    print("Flushing changes to the database...")
+
+    session.flush()
+
+    if opts.commit:
+        session.commit()
+    else:
+        print("**** WARNING ****")
+        print("The --commit option was not specified, changes are not "
+              "persisted.")
+        session.rollback()
+
+
+if __name__ == '__main__':
+    main()